@@ -8,6 +8,11 @@ incluindo mapas natais, trânsitos e geração de gráficos SVG.
 import asyncio
 import json
 import logging
+import os
+import random
+import sys
+from contextlib import AsyncExitStack, asynccontextmanager
+from pathlib import Path
 from typing import Any, Dict, List, Optional, Literal
 from datetime import datetime
 import httpx
@@ -28,8 +33,45 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("astrology-server")
 
 # URL base da API de astrologia
-API_BASE_URL = "http://localhost:8000"  # Ajuste conforme necessário
-API_KEY = "testapikey"  # Chave de API padrão
+API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")  # Ajuste conforme necessário
+# Chave de API: obrigatória no modo HTTP; no modo em processo, sem API_KEY é usada a
+# chave da própria API (API_KEY_KERYKEION, inclusive a do .env carregado por main.py)
+API_KEY = os.getenv("API_KEY")
+
+# Modo de acesso à API: 'http' (padrão, API em outro processo) ou 'inprocess' (a aplicação
+# FastAPI de main.py é importada e chamada via ASGI, sem rede; exige as dependências da API)
+MCP_TRANSPORT = os.getenv("MCP_TRANSPORT", "http")
+API_ROOT_DIR = Path(__file__).resolve().parent.parent
+
+# Timeouts por endpoint (segundos): consultas de posições respondem rápido, gráficos SVG levam mais
+DEFAULT_TIMEOUT = 30.0
+ENDPOINT_TIMEOUTS = {
+    "/api/v1/natal_chart": 15.0,
+    "/api/v1/current_transits": 10.0,
+    "/api/v1/transits_to_natal": 15.0,
+    "/api/v1/svg_chart": 60.0,
+    "/api/v1/svg_chart_base64": 60.0,
+    "/api/v1/svg_combined_chart": 60.0,
+    "/api/v1/svg_combined_chart_base64": 60.0,
+}
+CONNECT_TIMEOUT = 5.0
+
+# Novas tentativas em 429/5xx e falhas de conexão, com espera exponencial e jitter
+MAX_RETRIES = int(os.getenv("MCP_API_MAX_RETRIES", "3"))
+RETRY_BACKOFF = 0.5
+RETRY_MAX_WAIT = 10.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# HTTP/2 quando o pacote h2 estiver instalado (httpx[http2]) e a API for acessada por https:
+# o httpx só negocia HTTP/2 via TLS (ALPN); em http:// fica HTTP/1.1 com keep-alive
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+def use_http2(base_url: str) -> bool:
+    return HTTP2_AVAILABLE and base_url.startswith("https://")
 
 # Modelo para dados de nascimento/evento
 class NatalData(BaseModel):
@@ -59,24 +101,112 @@ class TransitData(BaseModel):
 # Servidor MCP
 server = Server("astrology-server")
 
+# Cliente HTTP compartilhado por todas as chamadas de ferramentas (criado em main)
+http_client: Optional[httpx.AsyncClient] = None
+
+def load_api_app() -> Any:
+    """Importa a aplicação FastAPI da API (modo em processo)."""
+    # O stdout é o canal do protocolo MCP: os logs da API vão para o stderr
+    os.environ.setdefault("ASTRO_LOG_STREAM", "stderr")
+    if str(API_ROOT_DIR) not in sys.path:
+        sys.path.insert(0, str(API_ROOT_DIR))
+    from main import app
+    return app
+
+def resolve_api_key(transport: str) -> str:
+    """Chave enviada à API: API_KEY ou, no modo em processo, API_KEY_KERYKEION."""
+    api_key = API_KEY or (os.getenv("API_KEY_KERYKEION") if transport == "inprocess" else None)
+    if not api_key:
+        if transport == "inprocess":
+            raise RuntimeError("Defina API_KEY ou API_KEY_KERYKEION: sem chave, todas as ferramentas receberiam 403")
+        raise RuntimeError("Defina API_KEY com uma chave válida da API: sem chave, todas as ferramentas receberiam 403")
+    return api_key
+
+def create_http_client(api_key: str, api_app: Any = None) -> httpx.AsyncClient:
+    """Cria o cliente HTTP com pool de conexões keep-alive para a API, ou ligado à aplicação em processo."""
+    if api_app is not None:
+        return httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=api_app),
+            base_url="http://inprocess",
+            # Sem rede, a compressão das respostas seria apenas custo de CPU
+            headers={"X-API-Key": api_key, "Accept-Encoding": "identity"},
+            timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=CONNECT_TIMEOUT),
+        )
+    return httpx.AsyncClient(
+        base_url=API_BASE_URL,
+        headers={"X-API-Key": api_key},
+        timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60.0),
+        http2=use_http2(API_BASE_URL),
+    )
+
+@asynccontextmanager
+async def api_client(transport: Optional[str] = None):
+    """
+    Mantém o cliente HTTP aberto durante a execução do servidor e o fecha no encerramento.
+
+    No modo 'inprocess', executa também o ciclo de vida da API (consumidor de webhooks,
+    pool de jobs e pools de renderização), como faria o uvicorn.
+    """
+    global http_client
+    transport = transport or MCP_TRANSPORT
+    async with AsyncExitStack() as stack:
+        api_app = None
+        if transport == "inprocess":
+            api_app = load_api_app()
+        # Sem chave válida, falha na inicialização em vez de devolver 403 a cada ferramenta
+        api_key = resolve_api_key(transport)
+        if api_app is not None:
+            await stack.enter_async_context(api_app.router.lifespan_context(api_app))
+        http_client = create_http_client(api_key, api_app)
+        try:
+            yield http_client
+        finally:
+            await http_client.aclose()
+            http_client = None
+
+def retry_delay(attempt: int, response: Optional[httpx.Response] = None) -> float:
+    """Espera antes da próxima tentativa: Retry-After da API ou exponencial com jitter."""
+    if response is not None:
+        retry_after = response.headers.get("retry-after", "")
+        if retry_after.isdigit():
+            return min(float(retry_after), RETRY_MAX_WAIT)
+    return random.uniform(0, min(RETRY_BACKOFF * 2 ** attempt, RETRY_MAX_WAIT))
+
 async def make_api_request(endpoint: str, method: str = "GET", data: Dict = None) -> Dict:
     """Faz requisições à API de astrologia com autenticação."""
-    headers = {"X-API-Key": API_KEY, "Content-Type": "application/json"}
-    
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        url = f"{API_BASE_URL}{endpoint}"
-        
-        if method == "POST":
-            response = await client.post(url, json=data, headers=headers)
-        else:
-            response = await client.get(url, headers=headers)
-            
+    global http_client
+    if http_client is None:
+        # Uso fora de main (por exemplo, importado pelo demo): cria o cliente sob demanda
+        http_client = create_http_client(resolve_api_key("http"))
+
+    timeout = httpx.Timeout(ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT), connect=CONNECT_TIMEOUT)
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            if method == "POST":
+                response = await http_client.post(endpoint, json=data, timeout=timeout)
+            else:
+                response = await http_client.get(endpoint, timeout=timeout)
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError) as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = retry_delay(attempt)
+            logger.warning(f"Falha de conexão em {endpoint} ({e!r}); nova tentativa em {delay:.2f}s")
+            await asyncio.sleep(delay)
+            continue
+
+        if response.status_code in RETRY_STATUS and attempt < MAX_RETRIES:
+            delay = retry_delay(attempt, response)
+            logger.warning(f"API respondeu {response.status_code} em {endpoint}; nova tentativa em {delay:.2f}s")
+            await asyncio.sleep(delay)
+            continue
+
         response.raise_for_status()
-        
+
         # Para responses SVG
         if response.headers.get("content-type", "").startswith("image/svg"):
             return {"svg_content": response.text}
-        
+
         return response.json()
 
 @server.list_tools()
@@ -449,7 +579,10 @@ calculado pelas outras ferramentas deste servidor.
 async def main():
     """Função principal para executar o servidor."""
     logger.info("Iniciando Servidor MCP de Astrologia...")
-    logger.info(f"URL da API: {API_BASE_URL}")
+    if MCP_TRANSPORT == "inprocess":
+        logger.info("API em processo (ASGI, sem rede)")
+    else:
+        logger.info(f"URL da API: {API_BASE_URL} (HTTP/2: {'sim' if use_http2(API_BASE_URL) else 'não'})")
     
     # Importar transport após verificar se mcp está disponível
     try:
@@ -458,7 +591,12 @@ async def main():
         logger.error("MCP não está instalado. Execute: pip install mcp")
         return
     
-    async with stdio_server() as (read_stream, write_stream):
+    if MCP_TRANSPORT != "inprocess" and not API_KEY:
+        # Falha antes de aceitar conexões MCP: sem chave, todas as ferramentas receberiam 403
+        logger.error("API_KEY não definida. Configure uma chave válida da API (ex: a de API_KEY_KERYKEION).")
+        raise SystemExit(1)
+
+    async with api_client(), stdio_server() as (read_stream, write_stream):
         await server.run(
             read_stream,
             write_stream,
@@ -4,12 +4,17 @@ Centraliza o tratamento de exceções e handlers personalizados.
 """
 from fastapi import FastAPI, Request, status
 from fastapi.responses import JSONResponse
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
 
 class AstroAPIException(Exception):
     """Exceção base para erros da API de Astrologia."""
-    def __init__(self, status_code: int, detail: str):
+    def __init__(self, status_code: int, detail: str, headers: Optional[Dict[str, str]] = None):
         self.status_code = status_code
         self.detail = detail
+        self.headers = headers
 
 def add_exception_handlers(app: FastAPI):
     """
@@ -22,13 +27,14 @@ def add_exception_handlers(app: FastAPI):
     async def astro_api_exception_handler(request: Request, exc: AstroAPIException):
         return JSONResponse(
             status_code=exc.status_code,
-            content={"detail": exc.detail}
+            content={"detail": exc.detail},
+            headers=exc.headers
         )
     
     @app.exception_handler(Exception)
     async def general_exception_handler(request: Request, exc: Exception):
-        # Log da exceção para depuração
-        print(f"Erro não tratado: {type(exc).__name__}: {str(exc)}")
+        # Log da exceção para depuração (assíncrono, ver app.utils.structured_logging)
+        logger.error("Erro não tratado", exc_info=exc, extra={"error": f"{type(exc).__name__}: {exc}"})
         
         return JSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1,6 +1,12 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any, Literal
+from pydantic import AliasChoices, BaseModel, Field, field_validator
+from typing import Annotated, Optional, List, Dict, Any, Literal, Union
+from datetime import date
 from enum import Enum
+import logging
+
+from app.svg.chart_assets import chart_assets
+
+logger = logging.getLogger(__name__)
 
 # Modelos existentes (mantidos para referência)
 class HouseSystem(str, Enum):
@@ -17,7 +23,7 @@ HOUSE_SYSTEM_MAP = {
     "koch": "K",
     "regiomontanus": "R",
     "campanus": "C",
-    "equal": "E",
+    "equal": "A",  # Casas iguais a partir do Ascendente ("E" não é aceito pelo Kerykeion)
     "whole_sign": "W"
 }
 
@@ -62,6 +68,9 @@ class SVGCombinedChartRequest(BaseModel):
     """
     natal_chart: NatalChartRequest = Field(..., description="Dados do mapa natal")
     transit_chart: TransitRequest = Field(..., description="Dados do trânsito")
+    compact: bool = Field(True, description="Saída SVG compacta: glifos declarados uma vez como <symbol>, estilos em classes CSS e coordenadas arredondadas")
+    format: Literal["svg", "png", "webp"] = Field("svg", description="Formato de saída: SVG ou imagem raster (PNG/WebP)")
+    width: Optional[int] = Field(None, ge=16, le=4096, description="Largura em pixels da imagem raster (apenas para png/webp)")
     
     class Config:
         schema_extra = {
@@ -93,6 +102,17 @@ class SVGCombinedChartRequest(BaseModel):
             }
         }
 
+class SVGTimelapseRequest(BaseModel):
+    """
+    Modelo para requisição de animação (time-lapse) dos trânsitos sobre o mapa natal.
+    """
+    natal_chart: NatalChartRequest = Field(..., description="Dados do mapa natal")
+    start: TransitRequest = Field(..., description="Data, hora e fuso do primeiro quadro")
+    days: int = Field(30, ge=1, le=366, description="Duração do intervalo animado em dias")
+    step_hours: float = Field(24, gt=0, le=720, description="Intervalo entre quadros em horas")
+    frame_seconds: float = Field(0.2, ge=0.02, le=5, description="Duração de cada quadro na animação em segundos")
+    compact: bool = Field(True, description="Saída SVG compacta: glifos declarados uma vez como <symbol> e estilos em classes CSS")
+
 # -*- coding: utf-8 -*-
 """Modulo de rotas para calculo de mapa astral natal."""
 
@@ -272,9 +292,7 @@ async def create_natal_chart(request: NatalChartRequest):
         return response
 
     except Exception as e:
-        print(f"Erro de cálculo astrológico em natal_chart (Kerykeion ou outro): {type(e).__name__} - {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erro de cálculo astrológico em natal_chart (Kerykeion ou outro)", extra={"error": f"{type(e).__name__}: {e}"})
         raise HTTPException(status_code=400, detail=f"Erro de cálculo astrológico (Kerykeion): {str(e)}")
 
 
@@ -301,11 +319,23 @@ class TransitsToNatalResponse(BaseModel):
     aspects_to_natal: List[TransitAspect]
 
 # Modelos para Gráficos SVG
+class AspectOrbSetting(BaseModel):
+    name: Literal[
+        "conjunction", "semi-sextile", "semi-square", "sextile", "quintile", "square",
+        "trine", "sesquiquadrate", "biquintile", "quincunx", "opposition"
+    ] = Field(..., description="Nome do aspecto no Kerykeion")
+    orb: int = Field(..., ge=0, le=15, description="Orbe máxima em graus")
+
 class SVGChartRequest(BaseModel):
     natal_chart: NatalChartRequest
     transit_chart: Optional[TransitRequest] = None
     chart_type: Literal["natal", "transit", "combined"] = Field(..., description="Tipo de gráfico: natal, trânsito ou combinado")
     theme: str = Field("Kerykeion", description="Tema visual para o gráfico SVG")
+    compact: bool = Field(False, description="Saída SVG compacta: minificada e com as variáveis CSS do tema resolvidas. Reduz o SVG em cerca de um terço, mas a minificação custa dezenas de vezes mais CPU que a renderização; com compressão na resposta o ganho em bytes é pequeno")
+    format: Literal["svg", "png", "webp"] = Field("svg", description="Formato de saída: SVG ou imagem raster (PNG/WebP)")
+    width: Optional[int] = Field(None, ge=16, le=4096, description="Largura em pixels da imagem raster (apenas para png/webp)")
+    layout: Literal["full", "wheel", "aspect_grid"] = Field("full", description="Parte do gráfico: completo, apenas a roda ou apenas a grade de aspectos")
+    active_aspects: Optional[List[AspectOrbSetting]] = Field(None, description="Aspectos e orbes a considerar; padrão do Kerykeion se omitido")
 
     class Config:
         schema_extra = {
@@ -339,3 +369,122 @@ class SVGChartRequest(BaseModel):
             }
         }
 
+
+# Modelos para o pacote de mapa (dados + SVG de um único cálculo)
+class ChartBundleRequest(BaseModel):
+    natal_chart: NatalChartRequest = Field(..., description="Dados do mapa natal")
+    theme: str = Field("Kerykeion", description="Tema visual para o gráfico SVG")
+    compact: bool = Field(False, description="Saída SVG compacta: minificada e com as variáveis CSS do tema resolvidas. Reduz o SVG em cerca de um terço, mas a minificação custa dezenas de vezes mais CPU que a renderização; com compressão na resposta o ganho em bytes é pequeno")
+    svg_encoding: Literal["raw", "base64"] = Field("base64", description="Formato do SVG na resposta: texto puro ou base64")
+
+class ChartBundleResponse(BaseModel):
+    chart: NatalChartResponse
+    svg: Optional[str] = Field(None, description="SVG em texto puro (svg_encoding='raw')")
+    svg_base64: Optional[str] = Field(None, description="SVG em base64 (svg_encoding='base64')")
+    data_uri: Optional[str] = Field(None, description="Data URI do SVG (svg_encoding='base64')")
+
+# Modelos do profiler sob demanda (endpoints de administração)
+class ProfilingConfig(BaseModel):
+    enabled: bool = Field(False, description="Liga o profiler; desligado, nenhuma requisição é perfilada")
+    mode: Literal["sampling", "cprofile"] = Field("sampling", description="'sampling': pilhas amostradas (flamegraph); 'cprofile': estatísticas determinísticas (pstats)")
+    sample_percent: float = Field(0.0, ge=0, le=100, description="Porcentagem aleatória de requisições a perfilar, além das que enviam X-Profile: 1")
+    limit: Optional[int] = Field(None, ge=1, description="Desliga o profiler após capturar este número de perfis")
+
+class ProfileSummary(BaseModel):
+    id: str
+    method: str
+    path: str
+    mode: str
+    status_code: Optional[int] = None
+    duration_ms: Optional[float] = None
+    created_at: float = Field(..., description="Horário da captura (timestamp Unix)")
+    samples: int = Field(0, description="Amostras de pilha coletadas (modo 'sampling')")
+    formats: List[str] = Field(default_factory=list, description="Formatos disponíveis para download: 'pstats' e/ou 'collapsed'")
+    pid: Optional[int] = Field(None, description="Processo (worker) que capturou o perfil")
+
+class WebhookEvent(BaseModel):
+    """
+    Envelope dos eventos recebidos em /webhook: o tipo em 'event' (ou 'type'),
+    um identificador opcional do parceiro e os dados do evento.
+    """
+    event: str = Field(..., validation_alias=AliasChoices("event", "type"), description="Tipo do evento (ex: 'user.signup')")
+    id: Optional[str] = Field(None, description="Identificador do evento no parceiro; usado como chave de idempotência na ausência do cabeçalho Idempotency-Key")
+    data: Dict[str, Any] = Field(default_factory=dict, description="Dados do evento, validados conforme o tipo")
+
+    class Config:
+        extra = "allow"
+
+class WebhookAccepted(BaseModel):
+    status: Literal["accepted", "duplicate"] = Field(..., description="'duplicate' quando a chave de idempotência já foi recebida")
+    event: str
+    idempotency_key: str
+
+class ChartPrecomputeEvent(BaseModel):
+    """
+    Dados dos eventos de webhook que pré-calculam os gráficos de um usuário (ex: 'user.signup').
+    """
+    natal_chart: NatalChartRequest = Field(..., description="Dados de nascimento do usuário")
+    theme: str = Field("Kerykeion", description="Tema do gráfico SVG a pré-renderizar")
+    transit_date: Optional[date] = Field(None, description="Data dos trânsitos a pré-calcular (12:00 no local e fuso de nascimento)")
+
+    @field_validator("theme")
+    @classmethod
+    def validate_theme(cls, theme: str) -> str:
+        # Tema desconhecido recebe 422 no recebimento, em vez de esgotar as tentativas do pré-cálculo
+        chart_assets.resolve_theme(theme)
+        return theme
+
+class UpcomingDatePrecomputeEvent(ChartPrecomputeEvent):
+    """
+    Dados dos eventos de data próxima ('user.birthday_upcoming', 'user.return_upcoming').
+    """
+    transit_date: date = Field(..., description="Data do aniversário ou do retorno (12:00 no local e fuso de nascimento)")
+
+# Modelos da API de jobs (operações longas executadas em segundo plano)
+class TransitScanJob(BaseModel):
+    """
+    Varredura de um intervalo de datas: momentos em que cada aspecto de trânsito ao mapa natal fica exato.
+    """
+    type: Literal["transit_scan"]
+    natal_chart: NatalChartRequest = Field(..., description="Dados do mapa natal")
+    start: TransitRequest = Field(..., description="Data, hora e fuso do início da varredura")
+    days: int = Field(365, ge=1, le=36500, description="Duração do intervalo em dias")
+    step_hours: float = Field(6, gt=0, le=720, description="Passo da varredura em horas")
+
+class BatchNatalJob(BaseModel):
+    """
+    Importação em lote: calcula o mapa natal de cada item da lista.
+    """
+    type: Literal["batch_natal"]
+    charts: List[NatalChartRequest] = Field(..., min_length=1, max_length=10000, description="Mapas natais a calcular")
+
+class ProgressionsJob(BaseModel):
+    """
+    Progressões secundárias (um dia após o nascimento para cada ano de vida).
+    """
+    type: Literal["progressions"]
+    natal_chart: NatalChartRequest = Field(..., description="Dados do mapa natal")
+    years: int = Field(90, ge=1, le=120, description="Anos de vida a progredir")
+
+JobRequest = Annotated[Union[TransitScanJob, BatchNatalJob, ProgressionsJob], Field(discriminator="type")]
+
+class JobStatus(BaseModel):
+    id: str
+    type: str
+    status: Literal["queued", "running", "succeeded", "failed", "cancelled"]
+    progress_done: int = Field(0, description="Unidades de trabalho concluídas")
+    progress_total: int = Field(0, description="Total de unidades de trabalho")
+    result_count: int = Field(0, description="Itens de resultado gravados até o momento")
+    created_at: float = Field(..., description="Criação do job (timestamp Unix)")
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    expires_at: float = Field(..., description="Remoção do job e dos resultados (timestamp Unix)")
+    cancel_requested: bool = False
+    error: Optional[str] = None
+
+class JobResultsPage(BaseModel):
+    items: List[Dict[str, Any]]
+    offset: int
+    limit: int
+    total: int = Field(..., description="Itens de resultado gravados até o momento")
+    next_offset: Optional[int] = Field(None, description="Offset da próxima página; None quando não há mais itens")
@@ -0,0 +1,96 @@
+"""
+Módulo de pré-cálculo de gráficos disparado por webhooks de parceiros.
+
+Quando um parceiro avisa que um usuário se cadastrou ou que um aniversário ou
+retorno se aproxima, o primeiro acesso ao gráfico seria uma requisição fria.
+Os handlers abaixo calculam, em segundo plano, o mapa natal, o gráfico SVG no
+tema pedido e, havendo data, os trânsitos ao mapa natal, gravando os
+resultados nos mesmos caches usados pelas rotas; a primeira requisição
+interativa do usuário passa a ser um acerto de cache.
+
+Eventos:
+    user.signup            dados: ChartPrecomputeEvent (transit_date opcional)
+    user.birthday_upcoming dados: UpcomingDatePrecomputeEvent
+    user.return_upcoming   dados: UpcomingDatePrecomputeEvent
+
+Apenas eventos de parceiros autenticados chegam aos handlers, e cada evento
+custa na cota do parceiro o mesmo que as rotas cujo trabalho executa
+(PRECOMPUTE_COST).
+
+Baixa prioridade: cada etapa só começa com o pool de SVG sem fila e o
+controle de admissão sem requisições aguardando; se o servidor continuar
+ocupado por PRECOMPUTE_MAX_WAIT segundos, o evento e o restante do lote são
+adiados (PRECOMPUTE_RETRY_SECONDS) em vez de disputar recursos com as
+requisições interativas. O trabalho roda no pool de SVG, sem ocupar o event loop.
+"""
+import asyncio
+import logging
+import os
+import time
+
+from app.models import (
+    ChartPrecomputeEvent, SVGChartRequest, TransitRequest, TransitsToNatalRequest, UpcomingDatePrecomputeEvent
+)
+from app.routers.natal_chart_router import get_natal_chart
+from app.routers.svg_chart_router import render_chart_bytes
+from app.routers.transit_router import compute_transits_to_natal
+from app.utils.admission import admission_controller
+from app.utils.render_pool import svg_pool
+from app.utils.quotas import route_cost
+from app.utils.webhook_queue import WebhookDeferred, register_handler
+
+logger = logging.getLogger(__name__)
+
+PRECOMPUTE_MAX_WAIT = float(os.getenv("ASTRO_PRECOMPUTE_MAX_WAIT", "10"))
+PRECOMPUTE_RETRY_SECONDS = float(os.getenv("ASTRO_PRECOMPUTE_RETRY_SECONDS", "60"))
+PRECOMPUTE_IDLE_POLL = 0.25
+# Custo de um evento de pré-cálculo: mapa natal, gráfico SVG e trânsitos ao mapa natal
+PRECOMPUTE_COST = route_cost("/api/v1/natal_chart") + route_cost("/api/v1/svg_chart") + route_cost("/api/v1/transits_to_natal")
+
+async def wait_until_idle(max_wait: float = PRECOMPUTE_MAX_WAIT) -> None:
+    """
+    Aguarda o pool de SVG e a fila de admissão ficarem livres, por no máximo max_wait segundos.
+
+    Raises:
+        WebhookDeferred: servidor ainda ocupado ao fim da espera
+    """
+    deadline = time.monotonic() + max_wait
+    while time.monotonic() < deadline:
+        pool_stats = svg_pool.stats()
+        admission_stats = admission_controller.stats()
+        if pool_stats["queue_depth"] == 0 and pool_stats["running"] < pool_stats["workers"] \
+                and admission_stats["queue_depth"] == 0 and not admission_controller.saturated:
+            return
+        await asyncio.sleep(PRECOMPUTE_IDLE_POLL)
+    raise WebhookDeferred(PRECOMPUTE_RETRY_SECONDS, "servidor ocupado")
+
+async def precompute_charts(data: ChartPrecomputeEvent) -> None:
+    """
+    Pré-calcula o mapa natal, o gráfico SVG padrão e, se houver data, os trânsitos ao mapa natal.
+    """
+    started_at = time.perf_counter()
+
+    await wait_until_idle()
+    await svg_pool.run(get_natal_chart, data.natal_chart)
+
+    # Mesmos padrões da rota /svg_chart (natal, layout completo, não compacto)
+    await wait_until_idle()
+    await render_chart_bytes(SVGChartRequest(natal_chart=data.natal_chart, chart_type="natal", theme=data.theme))
+
+    if data.transit_date is not None:
+        natal = data.natal_chart
+        transit = TransitRequest(
+            year=data.transit_date.year, month=data.transit_date.month, day=data.transit_date.day, hour=12, minute=0,
+            latitude=natal.latitude, longitude=natal.longitude, tz_str=natal.tz_str, house_system=natal.house_system
+        )
+        await wait_until_idle()
+        await svg_pool.run(compute_transits_to_natal, TransitsToNatalRequest(natal_data=natal, transit_data=transit))
+
+    logger.info("Gráficos pré-calculados", extra={
+        "transit_date": data.transit_date.isoformat() if data.transit_date else None,
+        "duration_ms": round((time.perf_counter() - started_at) * 1000, 2),
+    })
+
+register_handler("user.signup", ChartPrecomputeEvent, cost=PRECOMPUTE_COST)(precompute_charts)
+register_handler("user.birthday_upcoming", UpcomingDatePrecomputeEvent, cost=PRECOMPUTE_COST)(precompute_charts)
+register_handler("user.return_upcoming", UpcomingDatePrecomputeEvent, cost=PRECOMPUTE_COST)(precompute_charts)
@@ -0,0 +1,57 @@
+from fastapi import APIRouter, Depends, HTTPException, Response
+from app.models import ProfilingConfig, ProfileSummary
+from app.security import api_key_registry, verify_admin_key
+from app.utils.profiler import SavedProfile, profiler_switch
+from typing import Any, Dict, List
+import asyncio
+
+router = APIRouter(
+    prefix="/api/v1/admin",
+    tags=["Admin"],
+    dependencies=[Depends(verify_admin_key)]
+)
+
+# O armazenamento do profiler pode ser um arquivo SQLite compartilhado: leituras e gravações em uma thread
+async def _get_profile(profile_id: str) -> SavedProfile:
+    profile = await asyncio.to_thread(profiler_switch.get, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Perfil '{profile_id}' não encontrado (são mantidos apenas os ASTRO_PROFILE_KEEP perfis mais recentes).")
+    return profile
+
+@router.get("/profiling", response_model=ProfilingConfig, summary="Configuração atual do profiler")
+async def get_profiling_config():
+    return await asyncio.to_thread(profiler_switch.config)
+
+@router.put("/profiling", response_model=ProfilingConfig, summary="Liga, desliga ou ajusta o profiler",
+            description="Com o profiler ligado, são perfiladas as requisições com o cabeçalho X-Profile: 1 e uma amostra aleatória de sample_percent% das demais, uma por vez. A resposta perfilada traz o cabeçalho X-Profile-Id. Com ASTRO_CACHE_BACKEND=shared a configuração vale para todos os workers do host (em até ASTRO_PROFILE_CONFIG_TTL segundos) e o limite conta as capturas de todos eles.")
+async def set_profiling_config(config: ProfilingConfig):
+    await asyncio.to_thread(profiler_switch.configure, config.enabled, config.mode, config.sample_percent, config.limit)
+    return await asyncio.to_thread(profiler_switch.config)
+
+@router.get("/profiles", response_model=List[ProfileSummary], summary="Perfis capturados (mais recentes primeiro)",
+            description="Perfis de todos os workers do host quando ASTRO_CACHE_BACKEND=shared; 'pid' indica o worker que capturou cada um.")
+async def list_profiles():
+    return await asyncio.to_thread(profiler_switch.list)
+
+@router.get("/profiles/{profile_id}.pstats", summary="Download do perfil no formato pstats",
+            description="Arquivo para pstats.Stats, snakeviz ou gprof2dot. Disponível para perfis no modo 'cprofile'.")
+async def download_profile_pstats(profile_id: str):
+    data = (await _get_profile(profile_id)).pstats_bytes()
+    if data is None:
+        raise HTTPException(status_code=404, detail="Perfil sem estatísticas pstats (capturado no modo 'sampling').")
+    return Response(content=data, media_type="application/octet-stream",
+                    headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.pstats"'})
+
+@router.get("/profiles/{profile_id}.collapsed", summary="Download do perfil em pilhas colapsadas",
+            description="Uma pilha por linha ('raiz;...;folha contagem'), entrada do flamegraph.pl ou speedscope. Disponível para perfis no modo 'sampling'.")
+async def download_profile_collapsed(profile_id: str):
+    data = (await _get_profile(profile_id)).collapsed_stacks()
+    if data is None:
+        raise HTTPException(status_code=404, detail="Perfil sem pilhas amostradas (capturado no modo 'cprofile' ou curto demais).")
+    return Response(content=data, media_type="text/plain",
+                    headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.collapsed"'})
+
+@router.get("/api_keys", response_model=Dict[str, Dict[str, Any]], summary="Cotas das chaves de API",
+            description="Limites e saldo atual (por processo) dos buckets de requisições e de custo de cada chave registrada.")
+async def get_api_key_quotas():
+    return api_key_registry.snapshot()
@@ -0,0 +1,53 @@
+from fastapi import APIRouter, HTTPException, Depends
+from app.exceptions import AstroAPIException
+from app.models import ChartBundleRequest, ChartBundleResponse, SVGChartRequest
+from app.security import verify_api_key
+from app.routers.natal_chart_router import get_natal_chart
+from app.routers.svg_chart_router import render_chart_bytes
+from app.svg.chart_assets import chart_assets
+from app.utils.metrics import TimedRoute
+from app.utils.render_pool import svg_pool
+import base64
+import logging
+
+router = APIRouter(
+    prefix="/api/v1",
+    tags=["Chart Bundle"],
+    dependencies=[Depends(verify_api_key)],
+    route_class=TimedRoute
+)
+
+logger = logging.getLogger(__name__)
+
+@router.post("/chart_bundle", response_model=ChartBundleResponse,
+             summary="Mapa natal e gráfico SVG em uma única requisição",
+             description="Retorna os dados do mapa natal em JSON junto com o gráfico SVG, servidos das mesmas caches de /natal_chart e /svg_chart (e aquecidos pelo pré-cálculo por webhook).")
+async def create_chart_bundle(data: ChartBundleRequest):
+    try:
+        # Tema desconhecido é rejeitado antes do cálculo do mapa
+        chart_assets.resolve_theme(data.theme)
+        
+        # Dados e gráfico das caches de /natal_chart e /svg_chart; em caso de falta, o subject
+        # é calculado e o gráfico renderizado no pool limitado, fora do event loop
+        request = data.natal_chart
+        chart = await svg_pool.run(get_natal_chart, request)
+        svg_bytes, _ = await render_chart_bytes(SVGChartRequest(natal_chart=request, chart_type="natal",
+                                                                theme=data.theme, compact=data.compact))
+        
+        if data.svg_encoding == "raw":
+            return ChartBundleResponse(chart=chart, svg=svg_bytes.decode("utf-8"))
+        
+        # Codificar uma única vez a partir dos bytes em memória
+        svg_base64 = base64.b64encode(svg_bytes).decode("ascii")
+        return ChartBundleResponse(
+            chart=chart,
+            svg_base64=svg_base64,
+            data_uri=f"data:image/svg+xml;base64,{svg_base64}"
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=422, detail=str(ve))
+    except AstroAPIException:
+        raise
+    except Exception as e:
+        logger.exception("Erro ao gerar pacote de mapa", extra={"error": f"{type(e).__name__}: {e}"})
+        raise HTTPException(status_code=400, detail=f"Erro de cálculo astrológico (Kerykeion): {str(e)}")
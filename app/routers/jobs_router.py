@@ -0,0 +1,66 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from app.models import JobRequest, JobResultsPage, JobStatus
+from app.security import charge_quota, verify_api_key
+from app.utils.jobs import job_cost, job_runner, validate_job
+from app.utils.metrics import TimedRoute
+from typing import Any, Dict
+import asyncio
+import logging
+
+router = APIRouter(
+    prefix="/api/v1/jobs",
+    tags=["Jobs"],
+    dependencies=[Depends(verify_api_key)],
+    route_class=TimedRoute
+)
+
+logger = logging.getLogger(__name__)
+
+async def _owned_job(request: Request, job_id: str) -> Dict[str, Any]:
+    # Cada chave de API enxerga apenas os próprios jobs
+    meta = await asyncio.to_thread(job_runner.store.read, job_id)
+    if meta is None or meta.get("owner") != getattr(request.state, "api_key_name", None):
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return meta
+
+@router.post("", status_code=202, response_model=JobStatus,
+             summary="Cria um job para uma operação longa",
+             description="Aceita uma varredura de trânsitos ('transit_scan'), uma importação de mapas natais em lote ('batch_natal') ou progressões secundárias ('progressions') e retorna o id do job; a execução ocorre em um pool de processos separado dos workers HTTP. O job consome a cota de custo da chave em proporção ao trabalho (passos da varredura, mapas do lote ou anos de progressão).")
+async def create_job(job: JobRequest, request: Request):
+    try:
+        validate_job(job)
+    except ValueError as ve:
+        raise HTTPException(status_code=422, detail=str(ve))
+
+    # O trabalho do job é cobrado da cota de custo da chave antes do envio; a requisição em si
+    # já foi contada pela verificação da chave, com custo zero nesta rota
+    cost = job_cost(job)
+    entry = request.state.api_key_entry
+    charge_quota(request, entry, cost, requests=0)
+    try:
+        return await asyncio.to_thread(job_runner.submit, job, entry.name)
+    except Exception:
+        # Job recusado (ex: 429 com a fila cheia): o trabalho não será executado
+        entry.quota.refund(cost)
+        raise
+
+@router.get("/{job_id}", response_model=JobStatus, summary="Estado e progresso do job")
+async def get_job(job_id: str, request: Request):
+    return await _owned_job(request, job_id)
+
+@router.get("/{job_id}/results", response_model=JobResultsPage, summary="Resultados do job, paginados",
+            description="Disponível durante a execução (resultados parciais) e após a conclusão, até o fim da retenção.")
+async def get_job_results(job_id: str, request: Request,
+                          offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000)):
+    meta = await _owned_job(request, job_id)
+    items = await asyncio.to_thread(job_runner.store.read_results, job_id, offset, limit)
+    total = meta["result_count"]
+    next_offset = offset + len(items)
+    return JobResultsPage(items=items, offset=offset, limit=limit, total=max(total, next_offset),
+                          next_offset=next_offset if len(items) == limit else None)
+
+@router.delete("/{job_id}", response_model=JobStatus, summary="Cancela o job",
+               description="Um job na fila é cancelado imediatamente; em execução, o cancelamento ocorre na próxima etapa. Os resultados parciais permanecem disponíveis.")
+async def cancel_job(job_id: str, request: Request):
+    await _owned_job(request, job_id)
+    return await asyncio.to_thread(job_runner.cancel, job_id)
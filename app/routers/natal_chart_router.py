@@ -3,24 +3,42 @@ from kerykeion import AstrologicalSubject
 from app.models import NatalChartRequest, NatalChartResponse, PlanetData, HouseCuspData, AspectData
 from app.security import verify_api_key
 from app.utils.astro_helpers import create_subject, get_planet_data, PLANETS_MAP, HOUSE_NUMBER_TO_NAME_BASE
+from app.utils.cache import chart_fingerprint, make_cache
+from app.utils.compression import mark_cached_body
+from app.utils.metrics import TimedRoute, stage_timer
 from typing import List, Optional, Dict
+import asyncio
 import os
 from dotenv import load_dotenv
+import logging
 
 load_dotenv()
 
 router = APIRouter(
     prefix="/api/v1",
     tags=["Natal Chart"],
-    dependencies=[Depends(verify_api_key)]
+    dependencies=[Depends(verify_api_key)],
+    route_class=TimedRoute
 )
 
-@router.post("/natal_chart", response_model=NatalChartResponse)
-async def create_natal_chart(request: NatalChartRequest):
-    try:
-        # Usar a função utilitária para criar o subject
-        subject = create_subject(request, request.name if request.name else "NatalChart")
+logger = logging.getLogger(__name__)
+
+# Mapas natais já calculados, por dados de nascimento (o nome só aparece em input_data)
+natal_chart_cache = make_cache("natal_charts", max_items=int(os.getenv("ASTRO_NATAL_CACHE_SIZE", "1024")),
+                               model=NatalChartResponse)
+
+def build_natal_chart_response(request: NatalChartRequest, subject: AstrologicalSubject) -> NatalChartResponse:
+    """
+    Monta a resposta do mapa natal a partir de um AstrologicalSubject já calculado.
+    
+    Args:
+        request: Dados da requisição do mapa natal
+        subject: Objeto AstrologicalSubject criado a partir da requisição
         
+    Returns:
+        Objeto NatalChartResponse com planetas, casas e aspectos
+    """
+    with stage_timer("build"):
         # Dicionário para armazenar os planetas
         planets_dict: Dict[str, PlanetData] = {}
         for k_name, api_name in PLANETS_MAP.items():
@@ -38,7 +56,7 @@ async def create_natal_chart(request: NatalChartRequest):
                     house=int(planet_data.house_name.split("_")[0]) if "_" in planet_data.house_name else 1,
                     retrograde=planet_data.retrograde
                 )
-        
+    
         if hasattr(subject, 'chiron') and subject.chiron:
             chiron_data = get_planet_data(subject, 'chiron', 'Chiron')
             if chiron_data:
@@ -53,7 +71,7 @@ async def create_natal_chart(request: NatalChartRequest):
                     house=int(chiron_data.house_name.split("_")[0]) if "_" in chiron_data.house_name else 1,
                     retrograde=chiron_data.retrograde
                 )
-        
+    
         if hasattr(subject, 'lilith') and subject.lilith and subject.lilith.name:
             planets_dict['lilith'] = PlanetData(
                 name="Lilith",
@@ -73,7 +91,7 @@ async def create_natal_chart(request: NatalChartRequest):
             house_name_base = HOUSE_NUMBER_TO_NAME_BASE.get(i)
             if not house_name_base:
                 continue
-            
+        
             house_obj_attr_name = f"{house_name_base}_house"
             house_obj = getattr(subject, house_obj_attr_name)
             houses_dict[str(i)] = HouseCuspData(
@@ -92,7 +110,7 @@ async def create_natal_chart(request: NatalChartRequest):
             sign_num=getattr(subject.first_house, 'sign_num', 1),
             longitude=round(subject.first_house.position, 4)
         )
-        
+    
         midheaven = HouseCuspData(
             number=10,
             sign=subject.tenth_house.sign,
@@ -101,6 +119,7 @@ async def create_natal_chart(request: NatalChartRequest):
             longitude=round(subject.tenth_house.position, 4)
         )
 
+    with stage_timer("aspects"):
         # Lista para armazenar os aspectos
         aspects_list: List[AspectData] = []
         main_planets_for_aspects = [
@@ -130,9 +149,10 @@ async def create_natal_chart(request: NatalChartRequest):
                         applying=False  # Valor padrão, não disponível diretamente
                     ))
                     processed_aspects.add(pair)
-        
-        # Criar o objeto de resposta
-        response = NatalChartResponse(
+    
+    # Criar o objeto de resposta
+    with stage_timer("build"):
+        return NatalChartResponse(
             input_data=request,
             planets=planets_dict,
             houses=houses_dict,
@@ -142,11 +162,37 @@ async def create_natal_chart(request: NatalChartRequest):
             house_system=request.house_system,
             interpretations=None
         )
-        
-        return response
+
+def get_natal_chart(request: NatalChartRequest) -> NatalChartResponse:
+    """
+    Retorna o mapa natal da requisição, calculando-o apenas em caso de falta no cache.
+
+    Args:
+        request: Dados da requisição do mapa natal
+
+    Returns:
+        Objeto NatalChartResponse com input_data da própria requisição
+    """
+    key = chart_fingerprint(request.model_dump(mode="json", exclude={"name"}))
+    with stage_timer("cache"):
+        response = natal_chart_cache.get(key)
+    if response is None:
+        # Usar a função utilitária para criar o subject
+        subject = create_subject(request, request.name if request.name else "NatalChart")
+        response = build_natal_chart_response(request, subject)
+        natal_chart_cache.set(key, response)
+    # Corpo repetido para o mesmo mapa: vale guardar as variantes comprimidas
+    mark_cached_body()
+    return response.model_copy(update={"input_data": request})
+
+@router.post("/natal_chart", response_model=NatalChartResponse)
+async def create_natal_chart(request: NatalChartRequest):
+    try:
+        if natal_chart_cache.blocking:
+            # Cache compartilhado (SQLite): consulta e cálculo fora do event loop
+            return await asyncio.to_thread(get_natal_chart, request)
+        return get_natal_chart(request)
 
     except Exception as e:
-        print(f"Erro de cálculo astrológico em natal_chart (Kerykeion ou outro): {type(e).__name__} - {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erro de cálculo astrológico em natal_chart (Kerykeion ou outro)", extra={"error": f"{type(e).__name__}: {e}"})
         raise HTTPException(status_code=400, detail=f"Erro de cálculo astrológico (Kerykeion): {str(e)}")
@@ -0,0 +1,76 @@
+from fastapi import APIRouter, Depends, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from app.security import verify_stream_api_key
+from app.utils.sky_feed import sky_feed
+import asyncio
+import logging
+
+router = APIRouter(
+    prefix="/api/v1/sky",
+    tags=["Céu em tempo real"],
+    dependencies=[Depends(verify_stream_api_key)]
+)
+
+logger = logging.getLogger(__name__)
+
+# Código de fechamento do WebSocket para o cliente lento descartado ("try again later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+SSE_HEARTBEAT_SECONDS = 15
+
+@router.get("/stream", response_class=StreamingResponse,
+            summary="Feed do céu atual via Server-Sent Events",
+            description="Envia as posições atuais dos planetas a cada tick (evento 'positions'), a mudança de signo da Lua ('moon_sign') e os aspectos entre os planetas que começam ou terminam ('aspect'). A chave pode ir no cabeçalho X-API-KEY ou no parâmetro 'api_key' (este fica registrado nos logs de acesso de proxies; prefira o cabeçalho quando o cliente permitir). Clientes que não acompanham o ritmo são desconectados.")
+async def stream_sky(request: Request):
+    subscriber = sky_feed.subscribe()
+
+    async def events():
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comentário SSE para manter a conexão aberta em proxies
+                    yield b": heartbeat\n\n"
+                    continue
+                if message is None:
+                    return
+                yield message.sse
+        finally:
+            sky_feed.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.websocket("/ws")
+async def websocket_sky(websocket: WebSocket):
+    """
+    Mesmo feed de /stream via WebSocket: cada mensagem é um objeto JSON com o campo 'type'.
+    Chave em X-API-KEY ou no parâmetro 'api_key' (visível nos logs de acesso de proxies).
+    """
+    await websocket.accept()
+    subscriber = sky_feed.subscribe()
+
+    async def wait_disconnect():
+        # O cliente não envia mensagens; apenas detecta o fechamento da conexão
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    disconnected = asyncio.create_task(wait_disconnect())
+    try:
+        while True:
+            next_message = asyncio.create_task(subscriber.queue.get())
+            done, _ = await asyncio.wait({next_message, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                next_message.cancel()
+                return
+            message = next_message.result()
+            if message is None:
+                logger.info("Assinante lento descartado do feed do céu")
+                await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+                return
+            await websocket.send_text(message.text)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        disconnected.cancel()
+        sky_feed.unsubscribe(subscriber)
@@ -0,0 +1,69 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.security import verify_api_key
+from app.startup import startup_state
+from app.utils.admission import admission_controller
+from app.utils.cache import caches
+from app.utils.jobs import job_runner
+from app.utils.metrics import render_metrics
+from app.utils.render_pool import render_pools
+from app.utils.sky_feed import sky_feed
+from app.utils.webhook_queue import webhook_dispatcher
+import asyncio
+from typing import Any, Dict
+
+router = APIRouter(
+    prefix="/api/v1/status",
+    tags=["Status"],
+    dependencies=[Depends(verify_api_key)]
+)
+
+# Sondas de saúde da plataforma: sem chave de API
+health_router = APIRouter(prefix="/health", tags=["Status"])
+
+# Coleta do Prometheus: sem chave de API
+metrics_router = APIRouter(tags=["Status"])
+
+@router.get("/render_pools", response_model=Dict[str, Dict[str, Any]],
+            summary="Ocupação dos pools de renderização",
+            description="Retorna, para cada pool de renderização (SVG e raster), workers, profundidade da fila, requisições rejeitadas e tempos médios de espera e execução.")
+async def get_render_pool_stats():
+    return {name: pool.stats() for name, pool in render_pools.items()}
+
+@router.get("/admission", response_model=Dict[str, Any],
+            summary="Controle de admissão",
+            description="Retorna o limite de concorrência, requisições em execução e na fila, e os contadores de requisições descartadas por fila cheia ou prazo vencido e servidas da cache sob sobrecarga.")
+async def get_admission_stats():
+    return admission_controller.stats()
+
+@router.get("/webhooks", response_model=Dict[str, Any],
+            summary="Fila de webhooks",
+            description="Retorna os eventos no spool por estado (pending, processing, done, dead) e os contadores do consumidor deste worker: recebidos, duplicados, rejeitados com o spool cheio, lotes, despachados, falhas, sem handler, sem parceiro autenticado e adiados.")
+async def get_webhook_stats():
+    return await asyncio.to_thread(webhook_dispatcher.stats)
+
+@router.get("/jobs", response_model=Dict[str, Any],
+            summary="Pool de jobs",
+            description="Retorna, para este worker, os processos do pool de jobs, os jobs na fila ou em execução e os contadores de jobs enviados e rejeitados.")
+async def get_job_stats():
+    return job_runner.stats()
+
+@router.get("/sky_feed", response_model=Dict[str, Any],
+            summary="Feed do céu em tempo real",
+            description="Retorna, para este worker, os assinantes conectados ao feed do céu, o intervalo entre os ticks, os ticks calculados, as mensagens entregues e os assinantes descartados por lentidão.")
+async def get_sky_feed_stats():
+    return sky_feed.stats()
+
+@health_router.get("/live", summary="Sonda de vida do processo")
+async def get_liveness():
+    return {"status": "ok"}
+
+@health_router.get("/ready", summary="Sonda de prontidão",
+                   description="Responde 503 até o fim do aquecimento (mapa e gráficos SVG de exemplo) e 200 depois, com os tempos de importação e aquecimento em milissegundos. Se o aquecimento falhar, continua em 503, com o erro em warmup_error.")
+async def get_readiness():
+    return JSONResponse(status_code=200 if startup_state.ready else 503, content=startup_state.as_dict())
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse, summary="Métricas no formato Prometheus",
+                    description="Histogramas de latência por rota e por etapa (subject, aspects, build, render, cache, serialize), acertos dos caches, ocupação dos pools de renderização e controle de admissão. Valores por processo.")
+async def get_metrics():
+    return PlainTextResponse(render_metrics(caches, render_pools, admission_controller.stats()), media_type="text/plain; version=0.0.4")
@@ -1,23 +1,119 @@
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.responses import Response
-from app.models import SVGChartRequest, NatalChartRequest, TransitRequest
-from kerykeion.charts.kerykeion_chart_svg import KerykeionChartSVG
+from app.models import SVGChartRequest, NatalChartRequest, TransitRequest, AspectOrbSetting
+from kerykeion import AstrologicalSubject
+from app.exceptions import AstroAPIException
 from app.security import verify_api_key
+from app.svg.chart_assets import chart_assets
+from app.svg.svg_generator import SVGChartGenerator
 from app.utils.astro_helpers import create_subject
+from app.utils.cache import chart_fingerprint, make_cache
+from app.utils.compression import mark_cached_body
+from app.utils.metrics import TimedRoute, stage_timer
+from app.utils.raster import RASTER_MEDIA_TYPES, render_raster
+from app.utils.render_pool import svg_pool
 import base64
 import os
-import glob
-from pathlib import Path
-from typing import Dict, Literal
+from typing import Dict, List, Literal, Optional, Tuple
+import logging
 
-router = APIRouter(prefix="/api/v1", tags=["svg_charts"], dependencies=[Depends(verify_api_key)])
+router = APIRouter(prefix="/api/v1", tags=["svg_charts"], dependencies=[Depends(verify_api_key)], route_class=TimedRoute)
+
+logger = logging.getLogger(__name__)
+
+# Cache das partes SVG já renderizadas (gráfico completo, roda e grade de aspectos)
+svg_part_cache = make_cache("svg_parts", max_items=int(os.getenv("ASTRO_SVG_CACHE_SIZE", "512")))
+
+def build_chart_svg(natal_subject: AstrologicalSubject, transit_subject: Optional[AstrologicalSubject],
+                    chart_type: str, theme: str, minify: bool = False, remove_css_variables: bool = False,
+                    layout: str = "full", active_aspects: Optional[List[AspectOrbSetting]] = None) -> str:
+    """
+    Renderiza em memória o gráfico SVG a partir de subjects já calculados.
+
+    Args:
+        natal_subject: Objeto AstrologicalSubject do mapa natal
+        transit_subject: Objeto AstrologicalSubject do trânsito, se houver
+        chart_type: Tipo de gráfico ('natal', 'transit' ou 'combined')
+        theme: Tema visual do gráfico (nome ou alias registrado em chart_assets)
+        minify: Minificar o SVG gerado
+        remove_css_variables: Substituir as variáveis CSS do tema pelos valores resolvidos
+        layout: Parte a renderizar ('full', 'wheel' ou 'aspect_grid')
+        active_aspects: Aspectos e orbes a considerar; None usa o padrão do Kerykeion
+
+    Returns:
+        Documento SVG como string
+    """
+    # Renderização delegada ao backend Kerykeion do SVGChartGenerator (resolvido na importação)
+    generator = SVGChartGenerator(natal_subject, transit_subject)
+    return generator.render(chart_type, theme, minify=minify, remove_css_variables=remove_css_variables,
+                            layout=layout, active_aspects=active_aspects)
+
+def render_svg_chart(data: SVGChartRequest, minify: bool = False, remove_css_variables: bool = False) -> str:
+    """
+    Renderiza em memória o gráfico SVG descrito pela requisição.
+
+    Args:
+        data: Dados da requisição de gráfico SVG
+        minify: Minificar o SVG gerado
+        remove_css_variables: Substituir as variáveis CSS do tema pelos valores resolvidos
+
+    Returns:
+        Documento SVG como string
+    """
+    natal_subject = create_subject(data.natal_chart, "Natal Chart")
+    
+    transit_subject = None
+    if data.transit_chart and (data.chart_type == "transit" or data.chart_type == "combined"):
+        transit_subject = create_subject(data.transit_chart, "Transit")
+    
+    return build_chart_svg(natal_subject, transit_subject, data.chart_type, data.theme, minify, remove_css_variables,
+                           layout=data.layout, active_aspects=data.active_aspects)
+
+async def render_chart_bytes(data: SVGChartRequest) -> Tuple[bytes, str]:
+    """
+    Gera o conteúdo do gráfico no formato pedido (SVG ou raster).
+
+    Args:
+        data: Dados da requisição de gráfico SVG
+
+    Returns:
+        Tupla (bytes do conteúdo, media type)
+    """
+    # Tema desconhecido é rejeitado antes de qualquer cálculo
+    theme = chart_assets.resolve_theme(data.theme)
+
+    # Cada parte (layout) tem sua própria entrada de cache; os orbes entram na chave
+    # porque alteram tanto a grade quanto as linhas de aspecto da roda
+    fingerprint = chart_fingerprint(data.natal_chart, data.transit_chart, data.chart_type, data.active_aspects)
+
+    if data.format in RASTER_MEDIA_TYPES:
+        # Imagem raster: as variáveis CSS precisam estar resolvidas para o rasterizador
+        image = await render_raster(
+            f"{fingerprint}:{data.layout}", theme, data.format, data.width,
+            lambda: render_svg_chart(data, minify=False, remove_css_variables=True)
+        )
+        return image, RASTER_MEDIA_TYPES[data.format]
+
+    # No modo compacto (opcional) o Kerykeion minifica a saída com o scour e substitui
+    # as variáveis CSS do tema pelos valores resolvidos; a minificação custa cerca de
+    # 40x o tempo da renderização, por isso fica desligada por padrão
+    key = (fingerprint, theme, data.layout, data.compact)
+    with stage_timer("cache"):
+        svg_content = await svg_part_cache.aget(key)
+    if svg_content is None:
+        # Renderização no pool limitado: com a fila cheia, falha com 429 sem ocupar o event loop
+        svg_content = await svg_pool.run(render_svg_chart, data, minify=data.compact, remove_css_variables=data.compact)
+        svg_content = svg_content.encode("utf-8")
+        await svg_part_cache.aset(key, svg_content)
+    mark_cached_body()
+    return svg_content, "image/svg+xml"
 
 @router.post("/svg_chart", 
              response_class=Response, 
              responses={
                  200: {
-                     "content": {"image/svg+xml": {}},
-                     "description": "Retorna o gráfico SVG diretamente."
+                     "content": {"image/svg+xml": {}, "image/png": {}, "image/webp": {}},
+                     "description": "Retorna o gráfico SVG diretamente, ou a imagem PNG/WebP quando 'format' for raster."
                  },
                  422: {"description": "Erro de validação nos dados de entrada."},
                  500: {"description": "Erro interno ao gerar o gráfico."}
@@ -25,91 +121,25 @@ router = APIRouter(prefix="/api/v1", tags=["svg_charts"], dependencies=[Depends(
 async def generate_svg_chart(data: SVGChartRequest):
     """Gera um gráfico SVG para um mapa natal, trânsito ou combinação."""
     try:
-        natal_subject = create_subject(data.natal_chart, "Natal Chart")
-        
-        transit_subject = None
-        if data.transit_chart and (data.chart_type == "transit" or data.chart_type == "combined"):
-            transit_subject = create_subject(data.transit_chart, "Transit")
-        
-        # Mapear o tipo de gráfico para o formato esperado pelo KerykeionChartSVG
-        chart_type_map = {
-            "natal": "Natal",
-            "transit": "Transit",
-            "combined": "Synastry"
-        }
-        
-        # Criar um diretório temporário para salvar o SVG
-        temp_dir = Path("/tmp/astro_svg")
-        temp_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Limpar arquivos SVG anteriores para evitar confusão
-        for old_file in temp_dir.glob("*.svg"):
-            try:
-                old_file.unlink()
-            except:
-                pass
-        
-        # Nome do arquivo temporário
+        # Nome usado no Content-Disposition
         chart_name = data.natal_chart.name or "chart"
-        
-        # Gerar o gráfico SVG com base no tipo
-        if data.chart_type == "natal":
-            chart = KerykeionChartSVG(natal_subject, chart_type=chart_type_map[data.chart_type])
-        elif data.chart_type == "transit" and transit_subject:
-            chart = KerykeionChartSVG(transit_subject, chart_type=chart_type_map[data.chart_type])
-        elif data.chart_type == "combined" and transit_subject:
-            # Kerykeion usa 'Synastry' para gráficos combinados natal+trânsito
-            chart = KerykeionChartSVG(natal_subject, chart_type=chart_type_map[data.chart_type], second_subject=transit_subject)
-        else:
-            # Caso onde transit_chart é necessário mas não fornecido
-            if data.chart_type in ["transit", "combined"] and not transit_subject:
-                 raise ValueError(f"Dados de trânsito ('transit_chart') são necessários para o tipo de gráfico '{data.chart_type}'.")
-            raise ValueError("Configuração de tipo de gráfico inválida ou dados ausentes.")
-
-        # Configurar tema (usando método disponível na versão atual)
-        try:
-            chart.set_up_theme(data.theme)
-        except Exception as theme_err:
-             print(f"Aviso: Não foi possível aplicar o tema '{data.theme}': {theme_err}")
-
-        # Configurar o diretório de saída para o SVG - usando Path
-        chart.output_directory = temp_dir
-        
-        # Gerar o SVG - este método salva o arquivo em disco
-        chart.makeSVG()
-        
-        # Encontrar o arquivo SVG gerado mais recente no diretório
-        svg_files = list(temp_dir.glob("*.svg"))
-        if not svg_files:
-            raise FileNotFoundError("Nenhum arquivo SVG foi gerado")
-        
-        # Ordenar por data de modificação (mais recente primeiro)
-        svg_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-        svg_file_path = svg_files[0]
-        
-        # Ler o conteúdo do arquivo SVG gerado
-        with open(svg_file_path, 'r') as svg_file:
-            svg_content = svg_file.read()
-            
-        # Remover o arquivo temporário após leitura
-        try:
-            os.remove(svg_file_path)
-        except:
-            pass  # Ignorar erros na remoção do arquivo temporário
-
-        # Retornar o SVG como resposta
+        extension = data.format if data.format in RASTER_MEDIA_TYPES else "svg"
+
+        content, media_type = await render_chart_bytes(data)
+
+        # Retornar o gráfico como resposta
         return Response(
-            content=svg_content,
-            media_type="image/svg+xml",
-            headers={"Content-Disposition": f"inline; filename=chart_{chart_name}.svg"} # Usar inline para visualização
+            content=content,
+            media_type=media_type,
+            headers={"Content-Disposition": f"inline; filename=chart_{chart_name}.{extension}"} # Usar inline para visualização
         )
     except ValueError as ve:
          raise HTTPException(status_code=422, detail=str(ve))
+    except AstroAPIException:
+        raise
     except Exception as e:
         # Logar o erro real no servidor para depuração
-        print(f"Erro detalhado ao gerar SVG: {type(e).__name__}: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erro detalhado ao gerar SVG", extra={"error": f"{type(e).__name__}: {e}"})
         raise HTTPException(status_code=500, detail=f"Erro interno ao gerar gráfico SVG: {type(e).__name__}")
 
 @router.post("/svg_chart_base64", 
@@ -121,30 +151,22 @@ async def generate_svg_chart_base64(data: SVGChartRequest):
     Gera um gráfico SVG e retorna como string base64.
     """
     try:
-        # Reutilizar a lógica do endpoint anterior para obter a Response SVG
-        svg_response = await generate_svg_chart(data)
-        
-        # Verificar se a resposta foi bem-sucedida antes de acessar o body
-        if svg_response.status_code != 200:
-             # Se generate_svg_chart levantou HTTPException, ela será propagada
-             # Este check é uma segurança adicional
-             raise HTTPException(status_code=svg_response.status_code, detail="Falha ao gerar SVG base.")
-
-        svg_content_bytes = svg_response.body
-        
-        # Converter para base64
-        base64_svg = base64.b64encode(svg_content_bytes).decode("utf-8")
+        # Gerar o conteúdo em memória e codificar uma única vez
+        content, media_type = await render_chart_bytes(data)
+        base64_svg = base64.b64encode(content).decode("ascii")
         
         # Retornar como JSON
         return {
             "svg_base64": base64_svg,
-            "data_uri": f"data:image/svg+xml;base64,{base64_svg}"
+            "data_uri": f"data:{media_type};base64,{base64_svg}"
         }
     # Capturar exceções específicas ou genéricas que podem ocorrer
-    except HTTPException as http_exc:
+    except ValueError as ve:
+        raise HTTPException(status_code=422, detail=str(ve))
+    except (HTTPException, AstroAPIException) as http_exc:
         # Re-levantar HTTPExceptions para manter o status code e detalhes originais
         raise http_exc
     except Exception as e:
         # Logar o erro real no servidor para depuração
-        print(f"Erro detalhado ao gerar SVG base64: {type(e).__name__}: {e}")
+        logger.error("Erro detalhado ao gerar SVG base64", extra={"error": f"{type(e).__name__}: {e}"})
         raise HTTPException(status_code=500, detail=f"Erro interno ao gerar gráfico SVG em base64: {type(e).__name__}")
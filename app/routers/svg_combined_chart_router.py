@@ -1,16 +1,25 @@
 from fastapi import APIRouter, HTTPException, Depends, Response
-from fastapi.responses import FileResponse
-from app.models import SVGCombinedChartRequest
+from fastapi.responses import StreamingResponse
+from kerykeion import AstrologicalSubject
+from app.exceptions import AstroAPIException
+from app.models import SVGCombinedChartRequest, SVGTimelapseRequest
 from app.security import verify_api_key
 from app.utils.astro_helpers import create_subject
-from app.utils.svg_combined_chart import generate_combined_chart
-from pathlib import Path
+from app.utils.cache import chart_fingerprint
+from app.utils.metrics import TimedRoute, stage_timer
+from app.utils.raster import RASTER_MEDIA_TYPES, render_raster
+from app.utils.render_pool import svg_pool
+from app.utils.svg_combined_chart import iter_combined_chart_svg, render_combined_chart_svg
+from app.utils.svg_timelapse import MAX_TIMELAPSE_FRAMES, compute_transit_longitudes, iter_timelapse_svg
 import base64
-import os
 import re
-from typing import Dict
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, Tuple
+import logging
 
-router = APIRouter(prefix="/api/v1", tags=["svg_charts"], dependencies=[Depends(verify_api_key)])
+router = APIRouter(prefix="/api/v1", tags=["svg_charts"], dependencies=[Depends(verify_api_key)], route_class=TimedRoute)
+
+logger = logging.getLogger(__name__)
 
 # Função para sanitizar nomes de arquivos
 def sanitize_filename(filename):
@@ -18,12 +27,52 @@ def sanitize_filename(filename):
     sanitized = re.sub(r'[^\w\-_]', '_', filename)
     return sanitized
 
+def _create_subjects(data: SVGCombinedChartRequest) -> Tuple[AstrologicalSubject, AstrologicalSubject]:
+    # Objetos astrológicos do mapa natal e do trânsito
+    natal_subject = create_subject(data.natal_chart, data.natal_chart.name or "Natal Chart")
+    transit_subject = create_subject(data.transit_chart, data.transit_chart.name or "Transit Chart")
+    return natal_subject, transit_subject
+
+def iter_timelapse_chunks(data: SVGTimelapseRequest, frames: int) -> Iterator[str]:
+    """
+    Calcula os subjects e as longitudes dos quadros e gera o time-lapse em fragmentos (executado no pool de SVG).
+    """
+    natal_subject = create_subject(data.natal_chart, data.natal_chart.name or "Natal Chart")
+    # O subject do primeiro quadro fornece o dia juliano (UT) já convertido do fuso informado
+    start_subject = create_subject(data.start, data.start.name or "Transit Chart")
+    longitudes = compute_transit_longitudes(start_subject.julian_day, data.step_hours, frames)
+
+    # Rótulos no horário local do início da animação
+    start_time = datetime(data.start.year, data.start.month, data.start.day, data.start.hour, data.start.minute)
+    label_format = "%d/%m/%Y" if data.step_hours % 24 == 0 else "%d/%m/%Y %H:%M"
+    frame_labels = [(start_time + timedelta(hours=i * data.step_hours)).strftime(label_format) for i in range(frames)]
+
+    with stage_timer("render"):
+        yield from iter_timelapse_svg(natal_subject, longitudes, frame_labels,
+                                      frame_seconds=data.frame_seconds, compact=data.compact)
+
+def iter_combined_chunks(data: SVGCombinedChartRequest) -> Iterator[str]:
+    """
+    Calcula os subjects e gera o gráfico combinado em fragmentos (executado no pool de SVG).
+    """
+    natal_subject, transit_subject = _create_subjects(data)
+    with stage_timer("render"):
+        yield from iter_combined_chart_svg(natal_subject, transit_subject, compact=data.compact)
+
+def render_combined_bytes(data: SVGCombinedChartRequest) -> bytes:
+    """
+    Calcula os subjects e renderiza o gráfico combinado como um único documento (executado no pool de SVG).
+    """
+    natal_subject, transit_subject = _create_subjects(data)
+    with stage_timer("render"):
+        return render_combined_chart_svg(natal_subject, transit_subject, compact=data.compact).encode("utf-8")
+
 @router.post("/svg_combined_chart", 
              response_class=Response, 
              responses={
                  200: {
-                     "content": {"image/svg+xml": {}},
-                     "description": "Retorna o gráfico SVG combinado diretamente."
+                     "content": {"image/svg+xml": {}, "image/png": {}, "image/webp": {}},
+                     "description": "Retorna o gráfico SVG combinado diretamente, ou a imagem PNG/WebP quando 'format' for raster."
                  },
                  422: {"description": "Erro de validação nos dados de entrada."},
                  500: {"description": "Erro interno ao gerar o gráfico."}
@@ -36,37 +85,34 @@ async def generate_svg_combined_chart(data: SVGCombinedChartRequest):
     os planetas em trânsito, com linhas coloridas representando os aspectos entre eles.
     """
     try:
-        # Criar os objetos astrológicos
-        natal_subject = create_subject(data.natal_chart, data.natal_chart.name or "Natal Chart")
-        transit_subject = create_subject(data.transit_chart, data.transit_chart.name or "Transit Chart")
-        
-        # Criar um diretório temporário para salvar o SVG
-        temp_dir = Path("/tmp/astro_svg")
-        temp_dir.mkdir(parents=True, exist_ok=True)
+        if data.format in RASTER_MEDIA_TYPES:
+            # Imagem raster: servida do cache ou gerada no pool de rasterização
+            fingerprint = chart_fingerprint(data.natal_chart, data.transit_chart, "combined")
+            image = await render_raster(
+                fingerprint, None, data.format, data.width,
+                lambda: render_combined_chart_svg(*_create_subjects(data))
+            )
+            return Response(
+                content=image,
+                media_type=RASTER_MEDIA_TYPES[data.format],
+                headers={"Content-Disposition": f"inline; filename=combined_chart.{data.format}"}
+            )
         
-        # Limpar arquivos SVG anteriores para evitar confusão
-        for old_file in temp_dir.glob("*.svg"):
-            try:
-                old_file.unlink()
-            except:
-                pass
-        
-        # Gerar o SVG combinado
-        svg_path = generate_combined_chart(natal_subject, transit_subject, temp_dir)
-        
-        # Retornar o SVG como resposta
-        return FileResponse(
-            path=svg_path,
+        # Cálculo e renderização no pool limitado (429 com a fila cheia); cada fragmento do
+        # escritor SVG é enviado assim que é gerado, sem montar um único documento
+        chunks = await svg_pool.stream(lambda: iter_combined_chunks(data))
+        return StreamingResponse(
+            chunks,
             media_type="image/svg+xml",
-            headers={"Content-Disposition": f"inline; filename=combined_chart.svg"}
+            headers={"Content-Disposition": "inline; filename=combined_chart.svg"}
         )
     except ValueError as ve:
         raise HTTPException(status_code=422, detail=str(ve))
+    except AstroAPIException:
+        raise
     except Exception as e:
         # Logar o erro real no servidor para depuração
-        print(f"Erro detalhado ao gerar SVG combinado: {type(e).__name__}: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erro detalhado ao gerar SVG combinado", extra={"error": f"{type(e).__name__}: {e}"})
         raise HTTPException(status_code=500, detail=f"Erro interno ao gerar gráfico SVG combinado: {type(e).__name__}")
 
 @router.post("/svg_combined_chart_base64", 
@@ -78,16 +124,8 @@ async def generate_svg_combined_chart_base64(data: SVGCombinedChartRequest):
     Gera um gráfico SVG combinado e retorna como string base64.
     """
     try:
-        # Reutilizar a lógica do endpoint anterior para obter a Response SVG
-        svg_response = await generate_svg_combined_chart(data)
-        
-        # Verificar se a resposta foi bem-sucedida
-        if not isinstance(svg_response, FileResponse):
-            raise HTTPException(status_code=500, detail="Falha ao gerar SVG base.")
-
-        # Ler o conteúdo do arquivo SVG
-        with open(svg_response.path, 'rb') as f:
-            svg_content = f.read()
+        # Renderizar o SVG em memória, no pool limitado (429 com a fila cheia)
+        svg_content = await svg_pool.run(render_combined_bytes, data)
         
         # Converter para base64
         base64_svg = base64.b64encode(svg_content).decode("utf-8")
@@ -97,10 +135,53 @@ async def generate_svg_combined_chart_base64(data: SVGCombinedChartRequest):
             "svg_base64": base64_svg,
             "data_uri": f"data:image/svg+xml;base64,{base64_svg}"
         }
+    except ValueError as ve:
+        raise HTTPException(status_code=422, detail=str(ve))
     except HTTPException as http_exc:
         # Re-levantar HTTPExceptions para manter o status code e detalhes originais
         raise http_exc
+    except AstroAPIException:
+        raise
     except Exception as e:
         # Logar o erro real no servidor para depuração
-        print(f"Erro detalhado ao gerar SVG base64 combinado: {type(e).__name__}: {e}")
+        logger.error("Erro detalhado ao gerar SVG base64 combinado", extra={"error": f"{type(e).__name__}: {e}"})
         raise HTTPException(status_code=500, detail=f"Erro interno ao gerar gráfico SVG combinado em base64: {type(e).__name__}")
+
+@router.post("/svg_timelapse", 
+             response_class=Response, 
+             responses={
+                 200: {
+                     "content": {"image/svg+xml": {}},
+                     "description": "Retorna um único SVG animado com o movimento dos planetas em trânsito."
+                 },
+                 422: {"description": "Erro de validação nos dados de entrada."},
+                 500: {"description": "Erro interno ao gerar a animação."}
+             })
+async def generate_svg_timelapse(data: SVGTimelapseRequest):
+    """
+    Gera uma animação SVG (SMIL) dos trânsitos sobre o mapa natal em um intervalo de datas.
+    
+    A roda zodiacal e os planetas natais são desenhados uma vez; apenas as posições
+    dos planetas em trânsito são animadas, quadro a quadro, a cada 'step_hours'.
+    """
+    try:
+        frames = int(data.days * 24 / data.step_hours) + 1
+        if frames > MAX_TIMELAPSE_FRAMES:
+            raise ValueError(f"A animação teria {frames} quadros; o máximo é {MAX_TIMELAPSE_FRAMES}. Aumente 'step_hours' ou reduza 'days'.")
+        
+        # Subjects, longitudes de cada quadro e o SVG animado calculados no pool limitado (429 com a
+        # fila cheia); cada fragmento é enviado assim que é gerado
+        chunks = await svg_pool.stream(lambda: iter_timelapse_chunks(data, frames))
+        return StreamingResponse(
+            chunks,
+            media_type="image/svg+xml",
+            headers={"Content-Disposition": "inline; filename=transit_timelapse.svg"}
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=422, detail=str(ve))
+    except AstroAPIException:
+        raise
+    except Exception as e:
+        # Logar o erro real no servidor para depuração
+        logger.exception("Erro detalhado ao gerar time-lapse SVG", extra={"error": f"{type(e).__name__}: {e}"})
+        raise HTTPException(status_code=500, detail=f"Erro interno ao gerar animação SVG: {type(e).__name__}")
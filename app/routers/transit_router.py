@@ -7,14 +7,100 @@ from app.models import (
 )
 from app.security import verify_api_key
 from app.utils.astro_helpers import create_subject, get_planet_data, PLANETS_MAP
+from app.utils.cache import chart_fingerprint, make_cache
+from app.utils.compression import mark_cached_body
+from app.utils.metrics import TimedRoute, stage_timer
 from typing import List, Optional
+import asyncio
+import logging
+import os
 
 router = APIRouter(
     prefix="/api/v1",
     tags=["Transits"],
-    dependencies=[Depends(verify_api_key)]
+    dependencies=[Depends(verify_api_key)],
+    route_class=TimedRoute
 )
 
+logger = logging.getLogger(__name__)
+
+# Trânsitos ao mapa natal já calculados, por dados de nascimento e do trânsito (sem os nomes)
+transits_to_natal_cache = make_cache("transits_to_natal", max_items=int(os.getenv("ASTRO_TRANSITS_CACHE_SIZE", "1024")),
+                                     model=TransitsToNatalResponse)
+
+# Aspectos verificados entre trânsitos e mapa natal e suas orbes
+TRANSIT_ASPECT_TYPES = {
+    "Conjunction": (0, 8),    # (graus, orbe máxima)
+    "Opposition": (180, 8),
+    "Trine": (120, 8),
+    "Square": (90, 7),
+    "Sextile": (60, 6),
+    "Quincunx": (150, 5),
+    "Semi-Sextile": (30, 3),
+    "Semi-Square": (45, 3),
+    "Sesqui-Square": (135, 3),
+    "Quintile": (72, 2),
+    "Bi-Quintile": (144, 2)
+}
+
+def find_transit_aspects(natal_subject: AstrologicalSubject, transit_subject: AstrologicalSubject) -> List[TransitAspect]:
+    """
+    Calcula os aspectos entre os planetas em trânsito e os planetas natais.
+
+    Args:
+        natal_subject: Objeto AstrologicalSubject do mapa natal
+        transit_subject: Objeto AstrologicalSubject do trânsito
+
+    Returns:
+        Lista de aspectos dentro das orbes de TRANSIT_ASPECT_TYPES
+    """
+    # Calcular aspectos manualmente já que get_aspects_to não está disponível na versão atual
+    aspects_to_natal: List[TransitAspect] = []
+
+    # Planetas natais para verificar aspectos
+    natal_planets = [
+        natal_subject.sun, natal_subject.moon, natal_subject.mercury, 
+        natal_subject.venus, natal_subject.mars, natal_subject.jupiter, 
+        natal_subject.saturn, natal_subject.uranus, natal_subject.neptune, 
+        natal_subject.pluto
+    ]
+
+    # Planetas de trânsito para verificar aspectos
+    transit_planets = [
+        transit_subject.sun, transit_subject.moon, transit_subject.mercury, 
+        transit_subject.venus, transit_subject.mars, transit_subject.jupiter, 
+        transit_subject.saturn, transit_subject.uranus, transit_subject.neptune, 
+        transit_subject.pluto
+    ]
+
+
+    # Calcular aspectos entre planetas natais e de trânsito
+    for natal_planet in natal_planets:
+        if not natal_planet or not hasattr(natal_planet, 'abs_pos'):
+            continue
+
+        for transit_planet in transit_planets:
+            if not transit_planet or not hasattr(transit_planet, 'abs_pos'):
+                continue
+
+            # Calcular diferença entre posições
+            diff = abs(natal_planet.abs_pos - transit_planet.abs_pos)
+            if diff > 180:
+                diff = 360 - diff
+
+            # Verificar se forma algum aspecto
+            for aspect_name, (aspect_angle, max_orb) in TRANSIT_ASPECT_TYPES.items():
+                orb = abs(diff - aspect_angle)
+                if orb <= max_orb:
+                    aspects_to_natal.append(TransitAspect(
+                        transit_planet=transit_planet.name,
+                        natal_planet_or_point=natal_planet.name,
+                        aspect_name=aspect_name,
+                        orbit=round(orb, 4)
+                    ))
+
+    return aspects_to_natal
+
 @router.post("/current_transits", response_model=CurrentTransitsResponse)
 async def get_current_transits(request: TransitRequest):
     try:
@@ -42,14 +128,25 @@ async def get_current_transits(request: TransitRequest):
         return CurrentTransitsResponse(input_data=request, planets=transit_planets)
 
     except Exception as e:
-        print(f"Erro de cálculo astrológico em current_transits (Kerykeion ou outro): {type(e).__name__} - {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erro de cálculo astrológico em current_transits (Kerykeion ou outro)", extra={"error": f"{type(e).__name__}: {e}"})
         raise HTTPException(status_code=400, detail=f"Erro de cálculo astrológico (Kerykeion): {str(e)}")
 
-@router.post("/transits_to_natal", response_model=TransitsToNatalResponse)
-async def get_transits_to_natal(request: TransitsToNatalRequest):
-    try:
+def compute_transits_to_natal(request: TransitsToNatalRequest) -> TransitsToNatalResponse:
+    """
+    Retorna as posições em trânsito e os aspectos ao mapa natal, calculando-os
+    apenas em caso de falta no cache.
+
+    Args:
+        request: Dados natais e do trânsito
+
+    Returns:
+        Objeto TransitsToNatalResponse com os dados de entrada da própria requisição
+    """
+    key = chart_fingerprint(request.natal_data.model_dump(mode="json", exclude={"name"}),
+                            request.transit_data.model_dump(mode="json", exclude={"name"}))
+    with stage_timer("cache"):
+        response = transits_to_natal_cache.get(key)
+    if response is None:
         # Usar a função utilitária para criar os subjects
         natal_subject = create_subject(request.natal_data, 
                                       request.natal_data.name if request.natal_data.name else "NatalChart")
@@ -65,74 +162,28 @@ async def get_transits_to_natal(request: TransitsToNatalRequest):
             chiron_data = get_planet_data(transit_subject, 'chiron', 'Chiron')
             if chiron_data: transit_planets_positions.append(chiron_data)
         
-        # Calcular aspectos manualmente já que get_aspects_to não está disponível na versão atual
-        aspects_to_natal: List[TransitAspect] = []
-        
-        # Planetas natais para verificar aspectos
-        natal_planets = [
-            natal_subject.sun, natal_subject.moon, natal_subject.mercury, 
-            natal_subject.venus, natal_subject.mars, natal_subject.jupiter, 
-            natal_subject.saturn, natal_subject.uranus, natal_subject.neptune, 
-            natal_subject.pluto
-        ]
-        
-        # Planetas de trânsito para verificar aspectos
-        transit_planets = [
-            transit_subject.sun, transit_subject.moon, transit_subject.mercury, 
-            transit_subject.venus, transit_subject.mars, transit_subject.jupiter, 
-            transit_subject.saturn, transit_subject.uranus, transit_subject.neptune, 
-            transit_subject.pluto
-        ]
-        
-        # Definir aspectos e suas orbes
-        aspect_types = {
-            "Conjunction": (0, 8),    # (graus, orbe máxima)
-            "Opposition": (180, 8),
-            "Trine": (120, 8),
-            "Square": (90, 7),
-            "Sextile": (60, 6),
-            "Quincunx": (150, 5),
-            "Semi-Sextile": (30, 3),
-            "Semi-Square": (45, 3),
-            "Sesqui-Square": (135, 3),
-            "Quintile": (72, 2),
-            "Bi-Quintile": (144, 2)
-        }
-        
-        # Calcular aspectos entre planetas natais e de trânsito
-        for natal_planet in natal_planets:
-            if not natal_planet or not hasattr(natal_planet, 'abs_pos'):
-                continue
-                
-            for transit_planet in transit_planets:
-                if not transit_planet or not hasattr(transit_planet, 'abs_pos'):
-                    continue
-                    
-                # Calcular diferença entre posições
-                diff = abs(natal_planet.abs_pos - transit_planet.abs_pos)
-                if diff > 180:
-                    diff = 360 - diff
-                
-                # Verificar se forma algum aspecto
-                for aspect_name, (aspect_angle, max_orb) in aspect_types.items():
-                    orb = abs(diff - aspect_angle)
-                    if orb <= max_orb:
-                        aspects_to_natal.append(TransitAspect(
-                            transit_planet=transit_planet.name,
-                            natal_planet_or_point=natal_planet.name,
-                            aspect_name=aspect_name,
-                            orbit=round(orb, 4)
-                        ))
-
-        return TransitsToNatalResponse(
+        with stage_timer("aspects"):
+            aspects_to_natal = find_transit_aspects(natal_subject, transit_subject)
+
+        response = TransitsToNatalResponse(
             natal_input=request.natal_data,
             transit_input=request.transit_data,
             transit_planets_positions=transit_planets_positions,
             aspects_to_natal=aspects_to_natal
         )
+        transits_to_natal_cache.set(key, response)
+    # Corpo repetido para o mesmo par de mapas: vale guardar as variantes comprimidas
+    mark_cached_body()
+    return response.model_copy(update={"natal_input": request.natal_data, "transit_input": request.transit_data})
+
+@router.post("/transits_to_natal", response_model=TransitsToNatalResponse)
+async def get_transits_to_natal(request: TransitsToNatalRequest):
+    try:
+        if transits_to_natal_cache.blocking:
+            # Cache compartilhado (SQLite): consulta e cálculo fora do event loop
+            return await asyncio.to_thread(compute_transits_to_natal, request)
+        return compute_transits_to_natal(request)
 
     except Exception as e:
-        print(f"Erro de cálculo astrológico em transits_to_natal (Kerykeion ou outro): {type(e).__name__} - {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erro de cálculo astrológico em transits_to_natal (Kerykeion ou outro)", extra={"error": f"{type(e).__name__}: {e}"})
         raise HTTPException(status_code=400, detail=f"Erro de cálculo astrológico (Kerykeion): {str(e)}")
@@ -1,24 +1,78 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Header, HTTPException, Request
+from pydantic import ValidationError
+from app.models import WebhookAccepted, WebhookEvent
+from app.security import authenticate_webhook, charge_quota
+from app.utils.quotas import route_cost
+from app.utils.webhook_queue import (PARTNER_FIELD, partner_idempotency_key, webhook_dispatcher, webhook_event_costs,
+                                     webhook_handlers)
+from typing import Optional
+import hashlib
+import json
 import logging
+import os
 
 router = APIRouter(
     prefix="/webhook",
     tags=["Webhook"],
 )
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Logging configurado em app.utils.structured_logging (JSON, assíncrono)
 logger = logging.getLogger(__name__)
 
-@router.post("/", status_code=200)
-async def handle_webhook(request: Request):
+WEBHOOK_MAX_BODY_BYTES = int(os.getenv("ASTRO_WEBHOOK_MAX_BODY_BYTES", str(64 * 1024)))
+
+async def _read_body(request: Request) -> bytes:
+    # Corpo limitado a WEBHOOK_MAX_BODY_BYTES, sem confiar apenas no Content-Length
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > WEBHOOK_MAX_BODY_BYTES:
+        raise HTTPException(status_code=413, detail="Corpo do webhook muito grande")
+    body = b""
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > WEBHOOK_MAX_BODY_BYTES:
+            raise HTTPException(status_code=413, detail="Corpo do webhook muito grande")
+    return body
+
+@router.post("/", status_code=202, response_model=WebhookAccepted,
+             summary="Recebe eventos de parceiros",
+             description="Autentica o parceiro (assinatura HMAC em X-Webhook-Signature e X-Webhook-Timestamp, ou chave de API em X-API-KEY), valida o envelope do evento, grava-o no spool durável e responde 202; o processamento ocorre em segundo plano. Reenvios com a mesma chave de idempotência (cabeçalho Idempotency-Key, 'id' do evento ou hash do corpo) do mesmo parceiro são aceitos sem novo processamento nem nova cobrança. Cada evento consome a cota do parceiro; corpo acima do limite recebe 413 e, com o spool cheio, 503.")
+async def handle_webhook(request: Request, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
     """
     Handles incoming webhook requests.
-    Accepts any JSON payload.
+    Validates and enqueues the event; processing happens in the background.
     """
-    payload = await request.json()
-    logger.info(f"Received webhook payload: {payload}")
-    # In a real application, you would process the payload here.
-    # For example, based on the event type, you might update a database,
-    # send a notification, or trigger other actions.
-    return {"status": "success", "message": "Webhook received successfully"}
+    body = await _read_body(request)
+    partner = authenticate_webhook(request, body)
+    try:
+        payload = json.loads(body)
+        event = WebhookEvent.model_validate(payload)
+        # Dados validados já no recebimento para os tipos com modelo registrado
+        model, _ = webhook_handlers.get(event.event, (None, None))
+        if model is not None:
+            model.model_validate(event.data)
+    except ValueError as e:
+        # json.JSONDecodeError e ValidationError são ValueError
+        detail = e.errors(include_url=False, include_context=False) if isinstance(e, ValidationError) else "Corpo JSON inválido"
+        raise HTTPException(status_code=422, detail=detail)
+
+    key = idempotency_key or event.id or hashlib.sha256(body).hexdigest()
+    # Idempotência no escopo do parceiro; um reenvio já recebido não é cobrado de novo
+    spool_key = partner_idempotency_key(partner.name, key)
+    if await webhook_dispatcher.is_duplicate(spool_key):
+        result = "duplicate"
+    else:
+        # Eventos que disparam cálculos (pré-cálculo de gráficos) custam o trabalho que executam
+        cost = webhook_event_costs.get(event.event, route_cost("/webhook/"))
+        charge_quota(request, partner, cost)
+        result = await webhook_dispatcher.enqueue(spool_key, event.event, {**payload, PARTNER_FIELD: partner.name})
+        if result == "full":
+            # Evento recusado com o spool cheio: o cálculo não será executado, então o custo é devolvido
+            partner.quota.refund(cost)
+    if result == "full":
+        raise HTTPException(status_code=503, detail="Fila de webhooks cheia. Tente novamente mais tarde.",
+                            headers={"Retry-After": "30"})
+    # Payload completo apenas em DEBUG; em INFO, só o tipo de evento e as chaves
+    logger.info("Webhook recebido", extra={"event": event.event, "partner": partner.name, "idempotency_key": key,
+                                            "duplicate": result == "duplicate"})
+    logger.debug("Payload do webhook", extra={"payload": payload})
+    return WebhookAccepted(status="accepted" if result == "created" else "duplicate", event=event.event, idempotency_key=key)
@@ -1,20 +1,199 @@
-from fastapi import HTTPException, status, Security
+from fastapi import Header, HTTPException, Query, Request, WebSocketException, status, Security
 from fastapi.security import APIKeyHeader
+from starlette.requests import HTTPConnection
 from dotenv import load_dotenv
+from app.exceptions import AstroAPIException
+from app.utils.quotas import DEFAULT_LIMITS, KeyQuota, route_cost
+from typing import Any, Dict, List, Optional
+import hashlib
+import hmac
+import json
+import math
 import os
+import time
 
 load_dotenv()
 
 API_KEY = os.getenv("API_KEY_KERYKEION")
 API_KEY_NAME = "X-API-KEY"
 
+# Arquivo JSON com as chaves dos clientes e seus limites (ver ApiKeyRegistry)
+API_KEYS_FILE = os.getenv("API_KEYS_FILE")
+
+# Chave administrativa (profiler e demais operações internas); sem ela os endpoints de admin ficam desativados
+ADMIN_API_KEY = os.getenv("API_KEY_ADMIN")
+ADMIN_API_KEY_NAME = "X-ADMIN-KEY"
+
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=True)
+admin_api_key_header = APIKeyHeader(name=ADMIN_API_KEY_NAME, auto_error=True)
+
+def _digest(api_key: str) -> bytes:
+    return hashlib.sha256(api_key.encode()).digest()
+
+class ApiKeyEntry:
+    """
+    Chave registrada: nome do cliente, hash SHA-256 da chave e cotas.
+    """
+
+    def __init__(self, name: str, digest: bytes, quota: KeyQuota) -> None:
+        self.name = name
+        self.digest = digest
+        self.quota = quota
+
+class ApiKeyRegistry:
+    """
+    Registro das chaves de API, carregado em memória na inicialização.
+
+    Fontes:
+        API_KEY_KERYKEION: chave única (cliente 'default'), com os limites padrão;
+        API_KEYS_FILE: lista JSON de chaves, por exemplo
+            [{"name": "cliente-a", "key_sha256": "<hex>", "requests_per_second": 5,
+              "burst": 10, "cost_per_minute": 300, "cost_burst": 60}]
+        ("key" com a chave em texto também é aceito; os limites omitidos usam os padrões).
+    """
+
+    def __init__(self, entries: List[ApiKeyEntry]) -> None:
+        self._by_digest = {entry.digest: entry for entry in entries}
+
+    @classmethod
+    def load(cls, default_key: Optional[str] = API_KEY, keys_file: Optional[str] = API_KEYS_FILE) -> "ApiKeyRegistry":
+        entries = []
+        if default_key:
+            entries.append(ApiKeyEntry("default", _digest(default_key), KeyQuota(**DEFAULT_LIMITS)))
+        if keys_file:
+            with open(keys_file, encoding="utf-8") as file:
+                for item in json.load(file):
+                    digest = bytes.fromhex(item["key_sha256"]) if "key_sha256" in item else _digest(item["key"])
+                    limits = {name: item.get(name, default) for name, default in DEFAULT_LIMITS.items()}
+                    entries.append(ApiKeyEntry(item["name"], digest, KeyQuota(**limits)))
+        return cls(entries)
+
+    def lookup(self, api_key: str) -> Optional[ApiKeyEntry]:
+        """
+        Localiza a chave pelo hash e confirma em tempo constante.
+        """
+        digest = _digest(api_key)
+        entry = self._by_digest.get(digest)
+        if entry is not None and hmac.compare_digest(entry.digest, digest):
+            return entry
+        return None
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {entry.name: entry.quota.snapshot() for entry in self._by_digest.values()}
+
+api_key_registry = ApiKeyRegistry.load()
+
+def api_key_client(api_key: Optional[str]) -> Optional[str]:
+    """
+    Nome do cliente da chave, sem consumir cota (ex: respostas da cache no modo degradado); None se inválida.
+    """
+    entry = api_key_registry.lookup(api_key) if api_key else None
+    return entry.name if entry is not None else None
+
+async def verify_api_key(request: Request, api_key: str = Security(api_key_header)):
+    return _authorize(request, api_key)
+
+async def verify_stream_api_key(connection: HTTPConnection,
+                                header_key: Optional[str] = Header(None, alias=API_KEY_NAME),
+                                query_key: Optional[str] = Query(None, alias="api_key")):
+    """
+    Verificação das rotas de streaming (SSE e WebSocket): chave no cabeçalho X-API-KEY ou no parâmetro 'api_key',
+    já que o EventSource e o WebSocket do navegador não enviam cabeçalhos próprios.
+
+    A chave na URL aparece nos logs de acesso de proxies e balanceadores; a captura de
+    tráfego a remove, mas clientes que podem enviar cabeçalhos devem preferir X-API-KEY.
+    """
+    api_key = header_key or query_key
+    try:
+        if not api_key:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authenticated")
+        return _authorize(connection, api_key)
+    except HTTPException as e:
+        if connection.scope["type"] != "websocket":
+            raise
+        # Antes do aceite, o fechamento com violação de política é respondido com 403 no handshake
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=str(e.detail))
 
-async def verify_api_key(api_key: str = Security(api_key_header)):
-    if api_key == API_KEY:
+def _authorize(request: HTTPConnection, api_key: str) -> str:
+    # Valida a chave e consome as cotas da rota (requisição HTTP ou conexão WebSocket)
+    entry = api_key_registry.lookup(api_key)
+    if entry is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Could not validate API Key"
+        )
+    route = request.scope.get("route")
+    charge_quota(request, entry, route_cost(getattr(route, "path", None)))
+    return api_key
+
+def charge_quota(request: HTTPConnection, entry: ApiKeyEntry, cost: float, requests: int = 1) -> None:
+    """
+    Consome `requests` requisições e `cost` do orçamento da chave; 429 com Retry-After se a cota estiver esgotada.
+    """
+    allowed, wait, quota_headers = entry.quota.charge(cost, requests)
+    request.state.api_key_name = entry.name
+    request.state.api_key_entry = entry
+    request.state.quota_headers = quota_headers
+    if not allowed:
+        raise AstroAPIException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Cota da chave '{entry.name}' esgotada. Tente novamente em instantes.",
+            headers={**quota_headers, "Retry-After": str(max(1, math.ceil(min(wait, 3600))))}
+        )
+
+# Webhooks de parceiros: assinatura HMAC-SHA256 com segredo compartilhado (WEBHOOK_SECRET)
+# ou uma chave do registro em X-API-KEY
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_SIGNATURE_HEADER = "X-Webhook-Signature"
+WEBHOOK_TIMESTAMP_HEADER = "X-Webhook-Timestamp"
+WEBHOOK_TOLERANCE_SECONDS = int(os.getenv("WEBHOOK_TOLERANCE_SECONDS", "300"))
+# Cotas do parceiro que assina com WEBHOOK_SECRET (as chaves do registro usam as próprias)
+webhook_partner = ApiKeyEntry(os.getenv("WEBHOOK_PARTNER_NAME", "webhook-partner"), b"", KeyQuota(**DEFAULT_LIMITS))
+
+def webhook_signature(secret: str, timestamp: str, body: bytes) -> str:
+    """
+    Assinatura esperada: 'sha256=' + HMAC-SHA256 hexadecimal de '<timestamp>.<corpo>'.
+    """
+    digest = hmac.new(secret.encode(), timestamp.encode() + b"." + body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+def authenticate_webhook(request: Request, body: bytes) -> ApiKeyEntry:
+    """
+    Identifica o parceiro que enviou o webhook, pela assinatura do corpo ou pela chave de API.
+
+    Returns:
+        Entrada do parceiro, cujas cotas pagam o evento
+
+    Raises:
+        HTTPException 403 sem credencial válida ou com a assinatura vencida
+    """
+    signature = request.headers.get(WEBHOOK_SIGNATURE_HEADER)
+    if signature and WEBHOOK_SECRET:
+        timestamp = request.headers.get(WEBHOOK_TIMESTAMP_HEADER, "")
+        fresh = timestamp.isdigit() and abs(time.time() - int(timestamp)) <= WEBHOOK_TOLERANCE_SECONDS
+        if fresh and hmac.compare_digest(signature, webhook_signature(WEBHOOK_SECRET, timestamp, body)):
+            return webhook_partner
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Assinatura do webhook inválida ou vencida")
+
+    api_key = request.headers.get(API_KEY_NAME)
+    entry = api_key_registry.lookup(api_key) if api_key else None
+    if entry is None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Could not validate webhook credentials")
+    return entry
+
+def is_admin_key(api_key: Optional[str]) -> bool:
+    """
+    Verifica a chave administrativa em tempo constante. Sem API_KEY_ADMIN configurada, nenhuma chave é aceita.
+    """
+    if not ADMIN_API_KEY or not api_key:
+        return False
+    return hmac.compare_digest(api_key.encode(), ADMIN_API_KEY.encode())
+
+async def verify_admin_key(api_key: str = Security(admin_api_key_header)):
+    if is_admin_key(api_key):
         return api_key
     else:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
-            detail="Could not validate API Key"
+            detail="Could not validate admin API Key"
         )
@@ -0,0 +1,120 @@
+"""
+Módulo de inicialização da API: ciclo de vida (lifespan), aquecimento e prontidão.
+
+Instâncias recém-criadas pagam no primeiro gráfico a carga das efemérides do
+Swiss Ephemeris, do banco de fusos horários e dos caminhos de renderização do
+Kerykeion. O aquecimento executa um mapa e os gráficos SVG de exemplo logo
+após a inicialização; até ele terminar, o endpoint de prontidão responde 503.
+"""
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from fastapi import FastAPI
+
+from app.models import NatalChartRequest, TransitRequest
+from app.routers.svg_chart_router import build_chart_svg
+from app.utils.astro_helpers import create_subject
+from app.utils.jobs import job_runner
+from app.utils.profiler import profiler_switch
+from app.utils.render_pool import render_pools, svg_pool
+from app.utils.sky_feed import sky_feed
+from app.utils.svg_combined_chart import render_combined_chart_svg
+from app.utils.webhook_queue import webhook_dispatcher
+
+logger = logging.getLogger(__name__)
+
+# Mapa usado no aquecimento (mesmo exemplo da documentação dos modelos)
+WARMUP_NATAL = NatalChartRequest(
+    name="Warmup", year=1997, month=10, day=13, hour=22, minute=0,
+    latitude=-3.7172, longitude=-38.5247, tz_str="America/Fortaleza"
+)
+WARMUP_TRANSIT = TransitRequest(
+    name="Warmup Transit", year=2025, month=6, day=2, hour=12, minute=0,
+    latitude=-3.7172, longitude=-38.5247, tz_str="America/Fortaleza"
+)
+
+class StartupState:
+    """
+    Estado de prontidão do processo e tempos (ms) de importação e aquecimento.
+    """
+
+    def __init__(self) -> None:
+        self.ready = False
+        self.timings_ms: Dict[str, float] = {}
+        self.warmup_error: Optional[str] = None
+
+    def record(self, step: str, seconds: float) -> None:
+        self.timings_ms[step] = round(seconds * 1000, 2)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "timings_ms": dict(self.timings_ms), "warmup_error": self.warmup_error}
+
+startup_state = StartupState()
+
+def _timed(step: str, func, *args, **kwargs) -> Any:
+    started_at = time.perf_counter()
+    result = func(*args, **kwargs)
+    startup_state.record(step, time.perf_counter() - started_at)
+    return result
+
+def run_warmup() -> None:
+    """
+    Calcula um mapa de exemplo e renderiza os gráficos SVG nos modos usados pela API.
+    """
+    natal_subject = _timed("warmup_subject", create_subject, WARMUP_NATAL, "Warmup")
+    transit_subject = _timed("warmup_transit_subject", create_subject, WARMUP_TRANSIT, "Warmup Transit")
+    _timed("warmup_svg", build_chart_svg, natal_subject, None, "natal", "Kerykeion")
+    _timed("warmup_svg_compact", build_chart_svg, natal_subject, None, "natal", "Kerykeion",
+           minify=True, remove_css_variables=True)
+    _timed("warmup_combined_svg", render_combined_chart_svg, natal_subject, transit_subject, compact=True)
+
+async def warm_up() -> None:
+    """
+    Executa o aquecimento no pool de SVG e marca o processo como pronto ao final.
+    Com uma falha no aquecimento o processo não fica pronto: a sonda de prontidão
+    responde 503 com warmup_error e o orquestrador não envia tráfego a ele.
+    """
+    started_at = time.perf_counter()
+    try:
+        await svg_pool.run(run_warmup)
+    except Exception as e:
+        startup_state.warmup_error = f"{type(e).__name__}: {e}"
+        startup_state.record("warmup_total", time.perf_counter() - started_at)
+        logger.exception("Erro no aquecimento da API", extra={"error": startup_state.warmup_error})
+        return
+    startup_state.record("warmup_total", time.perf_counter() - started_at)
+    startup_state.ready = True
+    logger.info("API pronta", extra={"startup_timings_ms": startup_state.timings_ms})
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Ciclo de vida da aplicação: dispara o aquecimento e o consumidor de
+    webhooks em segundo plano, recupera os jobs interrompidos e encerra tudo,
+    inclusive os pools de renderização e de jobs, no desligamento.
+
+    Com ASTRO_WARMUP=0 o aquecimento é ignorado e o processo fica pronto imediatamente.
+    """
+    webhook_dispatcher.start()
+    await job_runner.start()
+    # Configuração do profiler compartilhada entre os workers: relida em segundo plano
+    profiler_task = asyncio.create_task(profiler_switch.run_refresh()) if profiler_switch.shared else None
+    warmup_task = None
+    if os.getenv("ASTRO_WARMUP", "1") == "0":
+        startup_state.ready = True
+    else:
+        warmup_task = asyncio.create_task(warm_up())
+    yield
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
+    if profiler_task:
+        profiler_task.cancel()
+    await webhook_dispatcher.stop()
+    await sky_feed.stop()
+    job_runner.shutdown()
+    for pool in render_pools.values():
+        pool.shutdown()
@@ -0,0 +1,119 @@
+"""
+Módulo de registro dos recursos de gráficos do Kerykeion.
+
+Temas CSS, templates XML e configurações (KerykeionSettingsModel) são lidos
+uma única vez por processo e entregues aos renderizadores, em vez de serem
+relidos do disco a cada instância de KerykeionChartSVG.
+
+PreloadedChartSVG substitui métodos internos do KerykeionChartSVG (tema,
+templates e minificação), por isso o Kerykeion está fixado em
+requirements.txt; ao atualizá-lo, tests/test_chart_assets.py confirma que a
+saída continua idêntica à da classe original.
+"""
+from pathlib import Path
+from string import Template
+from typing import Any, Dict, Optional
+
+from kerykeion import KerykeionChartSVG
+from kerykeion.charts import kerykeion_chart_svg
+from kerykeion.charts.charts_utils import draw_aspect_grid, draw_transit_aspect_grid
+from kerykeion.kr_types.settings_models import KerykeionSettingsModel
+from kerykeion.settings.kerykeion_settings import get_settings
+from kerykeion.utilities import inline_css_variables_in_svg
+from scour.scour import scourString
+
+# Diretório de recursos dos gráficos do Kerykeion
+KERYKEION_CHARTS_DIR = Path(kerykeion_chart_svg.__file__).parent
+
+# Nomes de tema aceitos pela API além dos temas do Kerykeion
+THEME_ALIASES = {
+    "Kerykeion": "classic",  # Valor padrão histórico da API; corresponde ao tema padrão do Kerykeion
+}
+
+class ChartAssets:
+    """
+    Recursos dos gráficos carregados em memória: temas, templates e configurações.
+    """
+
+    def __init__(self, themes: Dict[str, str], templates: Dict[str, str], settings: KerykeionSettingsModel) -> None:
+        self.themes = themes
+        self.templates = templates
+        self.settings = settings
+
+    @classmethod
+    def load(cls, charts_dir: Path = KERYKEION_CHARTS_DIR) -> "ChartAssets":
+        """
+        Lê todos os temas (*.css), templates (*.xml) e as configurações do Kerykeion.
+        """
+        themes = {path.stem: path.read_text() for path in sorted((charts_dir / "themes").glob("*.css"))}
+        templates = {
+            path.name: path.read_text(encoding="utf-8", errors="ignore")
+            for path in sorted((charts_dir / "templates").glob("*.xml"))
+        }
+        return cls(themes, templates, get_settings())
+
+    def resolve_theme(self, theme: Optional[str]) -> Optional[str]:
+        """
+        Valida o nome de um tema e retorna o nome do tema do Kerykeion correspondente.
+
+        Args:
+            theme: Nome do tema (ou alias) pedido; None para nenhum tema
+
+        Returns:
+            Nome do tema carregado, ou None
+
+        Raises:
+            ValueError: Se o tema não existir
+        """
+        if theme is None:
+            return None
+        resolved = THEME_ALIASES.get(theme, theme)
+        if resolved not in self.themes:
+            available = ", ".join(sorted([*self.themes, *THEME_ALIASES]))
+            raise ValueError(f"Tema inválido: '{theme}'. Temas disponíveis: {available}")
+        return resolved
+
+# Registro único do processo, carregado na importação do módulo
+chart_assets = ChartAssets.load()
+
+class PreloadedChartSVG(KerykeionChartSVG):
+    """
+    KerykeionChartSVG que usa os recursos do registro em vez de ler arquivos.
+
+    O tema deve ser um nome já validado por chart_assets.resolve_theme.
+    """
+
+    def __init__(self, first_obj: Any, chart_type: str = "Natal", second_obj: Any = None,
+                 theme: Optional[str] = "classic", **kwargs: Any) -> None:
+        kwargs.setdefault("new_settings_file", chart_assets.settings)
+        # theme=None evita a leitura do CSS no construtor; o tema é aplicado em seguida pelo registro
+        super().__init__(first_obj, chart_type=chart_type, second_obj=second_obj, theme=None, **kwargs)
+        self.set_up_theme(theme)
+
+    def set_up_theme(self, theme: Optional[str] = None) -> None:
+        self.color_style_tag = chart_assets.themes[theme] if theme else ""
+
+    def _render_template(self, template_name: str, template_dict: Dict[str, Any],
+                         minify: bool, remove_css_variables: bool) -> str:
+        template = Template(chart_assets.templates[template_name]).substitute(template_dict)
+
+        if remove_css_variables:
+            template = inline_css_variables_in_svg(template)
+
+        if minify:
+            return scourString(template).replace('"', "'").replace("\n", "").replace("\t", "").replace("    ", "").replace("  ", "")
+        return template.replace('"', "'")
+
+    def makeTemplate(self, minify: bool = False, remove_css_variables: bool = False) -> str:
+        return self._render_template("chart.xml", self._create_template_dictionary(), minify, remove_css_variables)
+
+    def makeWheelOnlyTemplate(self, minify: bool = False, remove_css_variables: bool = False) -> str:
+        return self._render_template("wheel_only.xml", self._create_template_dictionary(), minify, remove_css_variables)
+
+    def makeAspectGridOnlyTemplate(self, minify: bool = False, remove_css_variables: bool = False) -> str:
+        if self.chart_type in ["Transit", "Synastry"]:
+            aspects_grid = draw_transit_aspect_grid(self.chart_colors_settings['paper_0'], self.available_planets_setting, self.aspects_list)
+        else:
+            aspects_grid = draw_aspect_grid(self.chart_colors_settings['paper_0'], self.available_planets_setting, self.aspects_list, x_start=50, y_start=250)
+        template_dict = {**self._create_template_dictionary(), "makeAspectGrid": aspects_grid}
+        return self._render_template("aspect_grid_only.xml", template_dict, minify, remove_css_variables)
@@ -1,69 +1,129 @@
 """
 Módulo para geração de gráficos SVG astrológicos.
 
-Este módulo contém a classe SVGChartGenerator que encapsula toda a lógica
-de geração de gráficos SVG usando o Kerykeion.
+Este módulo contém a classe SVGChartGenerator e o registro de backends de
+renderização. Os métodos de renderização em memória ficam ligados diretamente
+aos backends, sem introspecção nem diretórios temporários por chamada. Renderizadores próprios (como o gráfico combinado de
+app.utils.svg_combined_chart) são registrados com @register_backend.
 """
-from kerykeion import AstrologicalSubject, KerykeionChartSVG
-from typing import Optional, Dict, Any, Tuple, Union
-import os
-import tempfile
-from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from kerykeion import AstrologicalSubject
+from app.svg.chart_assets import PreloadedChartSVG, chart_assets
+from app.utils.metrics import stage_timer
+from app.utils.svg_combined_chart import render_combined_chart_svg
+
+# Assinatura dos backends:
+# (natal, trânsito, tipo, tema, minify, remove_css_variables, layout, active_aspects) -> SVG
+RenderBackend = Callable[..., str]
+
+_BACKENDS: Dict[str, RenderBackend] = {}
+
+def register_backend(name: str) -> Callable[[RenderBackend], RenderBackend]:
+    """
+    Registra uma função de renderização como backend do SVGChartGenerator.
+
+    Args:
+        name: Nome do backend (ex: 'kerykeion', 'combined')
+    """
+    def decorator(backend: RenderBackend) -> RenderBackend:
+        _BACKENDS[name] = backend
+        return backend
+    return decorator
+
+def get_backend(name: str) -> RenderBackend:
+    """
+    Retorna o backend registrado com o nome dado.
+
+    Raises:
+        ValueError: Se o backend não existir
+    """
+    try:
+        return _BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Backend de renderização inválido: {name}. Disponíveis: {', '.join(sorted(_BACKENDS))}")
+
+# Tipo de gráfico da API -> tipo do KerykeionChartSVG; o combinado (natal + trânsito
+# sobrepostos) é o 'Synastry' do Kerykeion
+KERYKEION_CHART_TYPES = {
+    "natal": "Natal",
+    "transit": "Transit",
+    "combined": "Synastry",
+}
+
+# Métodos de renderização em memória de cada parte do gráfico, ligados na importação
+KERYKEION_LAYOUT_RENDERERS = {
+    "full": PreloadedChartSVG.makeTemplate,
+    "wheel": PreloadedChartSVG.makeWheelOnlyTemplate,
+    "aspect_grid": PreloadedChartSVG.makeAspectGridOnlyTemplate,
+}
+
+@register_backend("kerykeion")
+def render_kerykeion_chart(natal_subject: AstrologicalSubject, transit_subject: Optional[AstrologicalSubject],
+                           chart_type: str, theme: Optional[str], minify: bool = False,
+                           remove_css_variables: bool = False, layout: str = "full",
+                           active_aspects: Optional[List[Any]] = None) -> str:
+    """
+    Renderiza o gráfico com o KerykeionChartSVG, usando os recursos pré-carregados.
+
+    Args:
+        natal_subject: Objeto AstrologicalSubject do mapa natal
+        transit_subject: Objeto AstrologicalSubject do trânsito, se houver
+        chart_type: Tipo de gráfico ('natal', 'transit' ou 'combined')
+        theme: Tema visual do gráfico (nome ou alias registrado em chart_assets)
+        minify: Minificar o SVG gerado
+        remove_css_variables: Substituir as variáveis CSS do tema pelos valores resolvidos
+        layout: Parte a renderizar ('full', 'wheel' ou 'aspect_grid')
+        active_aspects: Aspectos e orbes (AspectOrbSetting); None usa o padrão do Kerykeion
+
+    Returns:
+        Documento SVG como string
+    """
+    chart_options: Dict[str, Any] = {"theme": chart_assets.resolve_theme(theme)}
+    if active_aspects is not None:
+        chart_options["active_aspects"] = [aspect.model_dump() for aspect in active_aspects]
+    if chart_type != "natal":
+        # Trânsito e combinado desenham o mapa natal com o segundo subject por fora
+        chart_options["second_obj"] = transit_subject
+
+    chart = PreloadedChartSVG(natal_subject, chart_type=KERYKEION_CHART_TYPES[chart_type], **chart_options)
+    return KERYKEION_LAYOUT_RENDERERS[layout](chart, minify=minify, remove_css_variables=remove_css_variables)
+
+@register_backend("combined")
+def render_combined_chart(natal_subject: AstrologicalSubject, transit_subject: Optional[AstrologicalSubject],
+                          chart_type: str, theme: Optional[str], minify: bool = False,
+                          remove_css_variables: bool = False, layout: str = "full",
+                          active_aspects: Optional[List[Any]] = None) -> str:
+    """
+    Renderiza o gráfico combinado próprio (natal + trânsitos com linhas de aspecto).
+
+    Tema, layout e orbes não se aplicam a este renderizador; minify ativa a saída compacta.
+    """
+    if layout != "full":
+        raise ValueError("O renderizador 'combined' gera apenas o gráfico completo.")
+    return render_combined_chart_svg(natal_subject, transit_subject, compact=minify)
 
 class SVGChartGenerator:
     """
     Gerador de gráficos SVG com suporte a diferentes tipos de mapas e customizações.
     """
 
-    CHART_TYPES = {
-        "natal": "Natal",
-        "transit": "Transit",
-        "combined": "Composite"  # ou "Combined", dependendo da versão do Kerykeion
-    }
+    CHART_TYPES = KERYKEION_CHART_TYPES
 
-    def __init__(self, natal_subject: AstrologicalSubject, transit_subject: Optional[AstrologicalSubject] = None) -> None:
+    def __init__(self, natal_subject: AstrologicalSubject, transit_subject: Optional[AstrologicalSubject] = None,
+                 backend: str = "kerykeion") -> None:
         self.natal_subject = natal_subject
         self.transit_subject = transit_subject
+        self._render = get_backend(backend)
 
-    def get_svg_content(self, chart: Any, temp_file: str) -> str:
-        """
-        Tenta obter o conteúdo SVG do gráfico usando diferentes métodos disponíveis.
+    def render(self, chart_type: str = "natal", theme: Optional[str] = "classic", minify: bool = False,
+               remove_css_variables: bool = False, layout: str = "full",
+               active_aspects: Optional[List[Any]] = None) -> str:
         """
-        # Tenta obter diretamente da instância primeiro
-        if hasattr(chart, 'svg_string') and getattr(chart, 'svg_string'):
-            return getattr(chart, 'svg_string')
-        if hasattr(chart, 'svg') and getattr(chart, 'svg'):
-            return getattr(chart, 'svg')
-
-        # Tenta métodos específicos para obter o SVG
-        if hasattr(chart, 'makeTemplate') and callable(getattr(chart, 'makeTemplate')):
-            return getattr(chart, 'makeTemplate')()
-        if hasattr(chart, 'get_svg_string') and callable(getattr(chart, 'get_svg_string')):
-            return getattr(chart, 'get_svg_string')()
-        if hasattr(chart, 'get_svg') and callable(getattr(chart, 'get_svg')):
-            return getattr(chart, 'get_svg')()
-
-        # Tenta ler do arquivo temporário como último recurso
-        try:
-            if os.path.exists(temp_file):
-                with open(temp_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    if content:
-                        return content
-        except Exception as e:
-            raise Exception(f"Erro ao ler arquivo SVG: {str(e)}")
-            
-        raise Exception("Não foi possível obter o conteúdo SVG por nenhum método disponível")
-
-    def generate_svg(
-        self,
-        chart_type: str = "natal",
-        show_aspects: bool = True,
-        language: str = "pt",
-        theme: str = "light"
-    ) -> str:
-        """
-        Gera um gráfico SVG com as configurações especificadas.
+        Renderiza o gráfico em memória com o backend configurado.
+
+        Raises:
+            ValueError: Tipo de gráfico inválido ou dados de trânsito ausentes
         """
         # Validar o tipo de gráfico
         if chart_type not in self.CHART_TYPES:
@@ -71,41 +131,16 @@ class SVGChartGenerator:
 
         # Validar se temos os dados necessários para o tipo de gráfico
         if chart_type in ["transit", "combined"] and not self.transit_subject:
-            raise ValueError(f"Dados de trânsito são necessários para gráficos do tipo {chart_type}")
-
-        # Criar um diretório temporário para salvar o SVG
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Definir o nome do arquivo temporário
-            temp_file = os.path.join(temp_dir, "chart.svg")
-
-            # Definir parâmetros do gráfico
-            chart_params = {}
-            if chart_type in ["transit", "combined"] and self.transit_subject:
-                chart_params["second_obj"] = self.transit_subject
-
-            # Criar o gerador de gráficos SVG
-            chart_svg_generator = KerykeionChartSVG(
-                self.natal_subject,
-                chart_type=self.CHART_TYPES[chart_type],
-                **chart_params
-            )
-
-            # Configurar diretório de saída
-            if hasattr(chart_svg_generator, 'set_output_directory') and callable(getattr(chart_svg_generator, 'set_output_directory')):
-                getattr(chart_svg_generator, 'set_output_directory')(Path(temp_dir))
-
-            # Configurar tema se suportado
-            if hasattr(chart_svg_generator, 'set_up_theme') and callable(getattr(chart_svg_generator, 'set_up_theme')) and theme == "dark":
-                getattr(chart_svg_generator, 'set_up_theme')("dark")
-
-            # Gerar SVG
-            try:
-                if hasattr(chart_svg_generator, 'makeSVG') and callable(getattr(chart_svg_generator, 'makeSVG')):
-                    getattr(chart_svg_generator, 'makeSVG')()
-
-                # Obter o conteúdo SVG
-                svg_content = self.get_svg_content(chart_svg_generator, temp_file)
-                return svg_content
-
-            except Exception as e:
-                raise Exception(f"Erro ao gerar gráfico SVG: {str(e)}")
+            raise ValueError(f"Dados de trânsito ('transit_chart') são necessários para o tipo de gráfico '{chart_type}'.")
+
+        with stage_timer("render"):
+            return self._render(self.natal_subject, self.transit_subject, chart_type, theme, minify,
+                                remove_css_variables, layout, active_aspects)
+
+    def generate_svg(self, chart_type: str = "natal", theme: str = "light", compact: bool = False) -> str:
+        """
+        Gera um gráfico SVG com as configurações especificadas.
+
+        compact ativa a saída minificada e com variáveis CSS resolvidas, bem mais cara em CPU.
+        """
+        return self.render(chart_type, theme, minify=compact, remove_css_variables=compact)
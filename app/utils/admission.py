@@ -0,0 +1,306 @@
+"""
+Módulo de controle de admissão: limite global de concorrência, prazos por
+requisição e resposta obsoleta (stale) sob sobrecarga.
+
+Cada requisição /api/v1/* recebe um prazo, do cabeçalho X-Request-Deadline-Ms
+(orçamento em ms a partir da chegada) ou do padrão da rota (ROUTE_DEADLINES_MS).
+No máximo ASTRO_MAX_CONCURRENCY requisições executam ao mesmo tempo; as demais
+aguardam em uma fila limitada (ASTRO_ADMISSION_QUEUE) e são descartadas com 503
+se o prazo vencer antes da admissão. O prazo acompanha a requisição até os pools
+de renderização, que também descartam tarefas vencidas antes de começar.
+
+Modo degradado: com todas as vagas ocupadas, uma requisição idêntica (mesma
+chave de API, rota e corpo) já respondida com sucesso é servida da cache de
+respostas, com os cabeçalhos Warning: 110 e Age, em vez de entrar na fila para
+ser recalculada. Apenas as rotas de cálculo de gráficos (STALE_ROUTES), puras e
+idempotentes, passam pela cache; rotas de administração, status e jobs nunca.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from app.utils.cache import make_cache
+from app.utils.metrics import record_stage
+from app.utils.render_pool import request_deadline
+
+API_PREFIX = "/api/v1/"
+DEADLINE_HEADER = b"x-request-deadline-ms"
+# Conexões longas (feed do céu) não ocupam vagas de concorrência nem passam pela cache de respostas
+EXEMPT_PREFIXES = ("/api/v1/sky/",)
+
+MAX_CONCURRENCY = int(os.getenv("ASTRO_MAX_CONCURRENCY", "32"))
+ADMISSION_QUEUE = int(os.getenv("ASTRO_ADMISSION_QUEUE", "64"))
+DEFAULT_DEADLINE_MS = float(os.getenv("ASTRO_DEFAULT_DEADLINE_MS", "10000"))
+MAX_DEADLINE_MS = float(os.getenv("ASTRO_MAX_DEADLINE_MS", "60000"))
+
+# Prazos padrão por rota (ms); rotas não listadas usam ASTRO_DEFAULT_DEADLINE_MS
+ROUTE_DEADLINES_MS: Dict[str, float] = {
+    "/api/v1/current_transits": 3000,
+    "/api/v1/natal_chart": 5000,
+    "/api/v1/transits_to_natal": 5000,
+    "/api/v1/svg_chart": 15000,
+    "/api/v1/svg_chart_base64": 15000,
+    "/api/v1/chart_bundle": 15000,
+    "/api/v1/svg_timelapse": 30000,
+}
+
+# Rotas servidas da cache de respostas no modo degradado: resultado depende só do corpo da requisição
+STALE_ROUTES = frozenset({
+    "/api/v1/natal_chart",
+    "/api/v1/current_transits",
+    "/api/v1/transits_to_natal",
+    "/api/v1/svg_chart",
+    "/api/v1/svg_chart_base64",
+    "/api/v1/svg_combined_chart",
+    "/api/v1/svg_combined_chart_base64",
+    "/api/v1/chart_bundle",
+    "/api/v1/svg_timelapse",
+})
+
+# Corpo máximo das rotas de STALE_ROUTES, lido antes da admissão para identificar a requisição na cache
+STALE_MAX_BODY_BYTES = int(os.getenv("ASTRO_STALE_MAX_BODY_BYTES", str(256 * 1024)))
+
+# Respostas guardadas para o modo degradado: apenas sucessos até STALE_MAX_BYTES
+STALE_MAX_BYTES = int(os.getenv("ASTRO_STALE_MAX_BYTES", str(512 * 1024)))
+stale_response_cache = make_cache("stale_responses", int(os.getenv("ASTRO_STALE_CACHE_SIZE", "128")), backend="memory")
+
+class AdmissionRejected(Exception):
+    """Requisição descartada pelo controle de admissão (fila cheia ou prazo vencido)."""
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(reason)
+        self.reason = reason
+
+class AdmissionController:
+    """
+    Limitador de concorrência com fila FIFO limitada e espera sujeita ao prazo.
+    """
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, max_queue: int = ADMISSION_QUEUE) -> None:
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.queued = 0
+        self.shed: Dict[str, int] = {"queue_full": 0, "deadline": 0}
+        self.served_stale = 0
+
+    @property
+    def saturated(self) -> bool:
+        return self.active >= self.max_concurrency
+
+    async def acquire(self, deadline: float) -> None:
+        """
+        Ocupa uma vaga, aguardando na fila até o prazo se necessário.
+
+        Raises:
+            AdmissionRejected: Fila cheia ou prazo vencido antes da admissão
+        """
+        if not self.saturated and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.shed["queue_full"] += 1
+            raise AdmissionRejected("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        try:
+            # A vaga é transferida por release(); wait_for devolve o resultado se ela chegar junto com o prazo
+            await asyncio.wait_for(waiter, timeout=max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            self.shed["deadline"] += 1
+            raise AdmissionRejected("deadline")
+        except asyncio.CancelledError:
+            # Cliente desconectou: devolve a vaga se ela já tinha sido transferida
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if not waiter.done() or waiter.cancelled():
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+        self.admitted += 1
+
+    def release(self) -> None:
+        # Passa a vaga ao primeiro da fila ainda à espera; sem fila, libera a vaga
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queue_depth": len(self._waiters),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed_queue_full": self.shed["queue_full"],
+            "shed_deadline": self.shed["deadline"],
+            "served_stale": self.served_stale,
+        }
+
+admission_controller = AdmissionController()
+
+def deadline_for(path: str, header_value: Optional[bytes], arrived_at: float) -> float:
+    """
+    Calcula o prazo (time.monotonic) a partir do cabeçalho ou do padrão da rota.
+    """
+    budget_ms = ROUTE_DEADLINES_MS.get(path, DEFAULT_DEADLINE_MS)
+    if header_value:
+        try:
+            value = float(header_value)
+        except ValueError:
+            value = math.nan
+        # Valores não finitos (nan, inf) são ignorados, como os inválidos
+        if math.isfinite(value):
+            budget_ms = min(value, MAX_DEADLINE_MS)
+    return arrived_at + budget_ms / 1000
+
+async def _send_json(send: Callable, status: int, content: Dict[str, Any], headers: List[Tuple[bytes, bytes]]) -> None:
+    body = json.dumps(content, ensure_ascii=False).encode()
+    await send({"type": "http.response.start", "status": status, "headers": [
+        (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *headers
+    ]})
+    await send({"type": "http.response.body", "body": body})
+
+class AdmissionMiddleware:
+    """
+    Middleware ASGI do controle de admissão das rotas /api/v1/*.
+
+    Args:
+        app: Aplicação ASGI
+        controller: Limitador de concorrência
+        identify: Função que retorna o nome do cliente da chave de API (cabeçalho
+            X-API-KEY), ou None se a chave for inválida; as respostas da cache
+            são separadas por cliente
+    """
+
+    def __init__(self, app: Any, controller: AdmissionController = admission_controller,
+                 identify: Optional[Callable[[Optional[str]], Optional[str]]] = None) -> None:
+        self.app = app
+        self.controller = controller
+        self.identify = identify or (lambda api_key: None)
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(API_PREFIX) or scope["path"].startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        arrived_at = time.monotonic()
+        headers = dict(scope["headers"])
+        deadline = deadline_for(scope["path"], headers.get(DEADLINE_HEADER), arrived_at)
+
+        cacheable = scope["path"] in STALE_ROUTES
+        body: Optional[bytes] = None
+        if cacheable:
+            # Corpo lido antes da admissão, até STALE_MAX_BODY_BYTES: identifica a requisição na cache de respostas
+            body = await self._read_body(receive, headers)
+            if body is None:
+                await _send_json(send, 413, {"detail": "Corpo da requisição muito grande."}, [])
+                return
+            body_digest = hashlib.sha256(body).hexdigest()
+
+        if cacheable and self.controller.saturated:
+            api_key = headers.get(b"x-api-key")
+            client = self.identify(api_key.decode("latin-1") if api_key else None)
+            stale = stale_response_cache.get(self._stale_key(client, scope, body_digest)) if client else None
+            if stale is not None:
+                self.controller.served_stale += 1
+                await self._send_stale(send, stale)
+                return
+
+        try:
+            await self.controller.acquire(deadline)
+        except AdmissionRejected as rejected:
+            detail = ("Servidor sobrecarregado: fila de admissão cheia." if rejected.reason == "queue_full"
+                      else "Prazo da requisição esgotado antes do processamento.")
+            await _send_json(send, 503, {"detail": detail}, [(b"retry-after", b"1"), (b"x-shed-reason", rejected.reason.encode())])
+            return
+        record_stage("admission", time.monotonic() - arrived_at)
+
+        body_sent = False
+
+        async def replay_receive() -> Dict[str, Any]:
+            nonlocal body_sent
+            if body_sent or body is None:
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        response: Dict[str, Any] = {"status": None, "headers": [], "chunks": [], "size": 0}
+
+        async def capture_send(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = message.get("headers", [])
+            elif cacheable and message["type"] == "http.response.body" and response["status"] == 200:
+                response["size"] += len(message.get("body", b""))
+                if response["size"] <= STALE_MAX_BYTES:
+                    response["chunks"].append(message.get("body", b""))
+            await send(message)
+
+        token = request_deadline.set(deadline)
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        finally:
+            request_deadline.reset(token)
+            self.controller.release()
+
+        # Cliente identificado pela autenticação da rota (request.state.api_key_name)
+        client = scope.get("state", {}).get("api_key_name")
+        if cacheable and client and response["status"] == 200 and response["size"] <= STALE_MAX_BYTES:
+            stale_response_cache.set(self._stale_key(client, scope, body_digest),
+                                     (time.time(), response["headers"], b"".join(response["chunks"])))
+
+    @staticmethod
+    async def _read_body(receive: Callable, headers: Dict[bytes, bytes]) -> Optional[bytes]:
+        """
+        Lê o corpo inteiro da requisição; None se passar de STALE_MAX_BODY_BYTES.
+        """
+        declared = headers.get(b"content-length", b"")
+        if declared.isdigit() and int(declared) > STALE_MAX_BODY_BYTES:
+            return None
+        chunks: List[bytes] = []
+        size = 0
+        while True:
+            message = await receive()
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > STALE_MAX_BODY_BYTES:
+                return None
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                return b"".join(chunks)
+
+    @staticmethod
+    def _stale_key(client: str, scope: Dict[str, Any], body_digest: str) -> Tuple[str, str, str, bytes, str]:
+        return (client, scope["method"], scope["path"], scope.get("query_string", b""), body_digest)
+
+    async def _send_stale(self, send: Callable, stale: Tuple[float, List[Tuple[bytes, bytes]], bytes]) -> None:
+        stored_at, headers, body = stale
+        age = max(0, int(time.time() - stored_at))
+        # Cabeçalhos por resposta (tempos, id, cotas) não são reaproveitados
+        skip = {b"server-timing", b"x-request-id", b"content-length"}
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            *((name, value) for name, value in headers if name.lower() not in skip and not name.lower().startswith(b"x-")),
+            (b"content-length", str(len(body)).encode()),
+            (b"age", str(age).encode()),
+            (b"warning", b'110 - "Response is Stale"'),
+            (b"x-served-stale", b"1"),
+        ]})
+        await send({"type": "http.response.body", "body": body})
@@ -4,6 +4,7 @@ Centraliza funções auxiliares para evitar duplicação de código e facilitar
 """
 from typing import Optional, Dict, Any, List
 from kerykeion import AstrologicalSubject
+from app.utils.metrics import stage_timer
 from app.models import (
     NatalChartRequest, TransitRequest, PlanetPosition,
     HOUSE_SYSTEM_MAP
@@ -21,18 +22,19 @@ def create_subject(data: NatalChartRequest | TransitRequest, default_name: str)
         Objeto AstrologicalSubject configurado
     """
     house_system_code = HOUSE_SYSTEM_MAP.get(data.house_system, "P")
-    return AstrologicalSubject(
-        name=getattr(data, 'name', default_name) or default_name,
-        year=data.year,
-        month=data.month,
-        day=data.day,
-        hour=data.hour,
-        minute=data.minute,
-        lng=data.longitude,
-        lat=data.latitude,
-        tz_str=data.tz_str,
-        houses_system_identifier=house_system_code
-    )
+    with stage_timer("subject"):
+        return AstrologicalSubject(
+            name=getattr(data, 'name', default_name) or default_name,
+            year=data.year,
+            month=data.month,
+            day=data.day,
+            hour=data.hour,
+            minute=data.minute,
+            lng=data.longitude,
+            lat=data.latitude,
+            tz_str=data.tz_str,
+            houses_system_identifier=house_system_code
+        )
 
 def get_planet_data(subject: AstrologicalSubject, planet_name_kerykeion: str, api_planet_name: str) -> Optional[PlanetPosition]:
     """
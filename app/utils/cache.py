@@ -0,0 +1,284 @@
+"""
+Módulo de cache para resultados de cálculos e renderizações.
+
+Centraliza o cache LRU usado pelos routers, o cache compartilhado entre os
+workers de um mesmo host (SQLite em memória compartilhada) e a geração de
+chaves (fingerprints) a partir dos modelos de requisição.
+
+Os dois backends têm a mesma interface: get/set síncronos (para código que já
+roda fora do event loop, como os pools de renderização e os jobs) e aget/aset
+para as rotas assíncronas. `blocking` indica se as consultas fazem E/S (cache
+compartilhado): nesse caso aget/aset e as rotas que usam o cache dentro de um
+cálculo síncrono executam a consulta em uma thread, nunca no event loop.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import stat
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from importlib.metadata import PackageNotFoundError, version
+from typing import Any, Dict, Hashable, Optional, Type, Union
+
+from pydantic import BaseModel
+
+class LRUCache:
+    """
+    Cache LRU thread-safe com limite de itens e contadores de acertos/erros.
+
+    `model` existe pela interface comum com o SharedCache; em memória os valores são guardados como estão.
+    """
+
+    # Consultas em memória: podem rodar no event loop
+    blocking = False
+
+    def __init__(self, name: str, max_items: int = 256, model: Optional[Type[BaseModel]] = None) -> None:
+        self.name = name
+        self.max_items = max_items
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Retorna o valor associado à chave ou None, marcando-o como usado recentemente.
+        """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Armazena o valor, descartando o item menos usado se o limite for atingido.
+        """
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    async def aget(self, key: Hashable) -> Optional[Any]:
+        return self.get(key)
+
+    async def aset(self, key: Hashable, value: Any) -> None:
+        self.set(key, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Retorna tamanho atual, acertos e erros do cache.
+        """
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+def _kerykeion_version() -> str:
+    try:
+        return version("kerykeion")
+    except PackageNotFoundError:
+        return "unknown"
+
+# Prefixo das chaves do cache compartilhado: entradas de outra versão (deploy anterior ainda
+# em /dev/shm, outro Kerykeion) nunca são servidas e saem pelo descarte LRU
+CACHE_NAMESPACE = f"{os.getenv('ASTRO_RELEASE', 'dev')}:kerykeion-{_kerykeion_version()}"
+
+# Um acerto só regrava o horário de acesso (ordem LRU) se o anterior for mais antigo que isso:
+# a ordem fica aproximada, mas acertos repetidos não viram escritas serializadas entre os workers
+SHARED_CACHE_TOUCH_SECONDS = float(os.getenv("ASTRO_SHARED_CACHE_TOUCH_SECONDS", "60"))
+
+def _private_cache_dir(base: Optional[str] = None) -> str:
+    """
+    Diretório privado (0700) do usuário para o cache compartilhado, em /dev/shm (memória) quando disponível.
+
+    Um diretório com o mesmo nome criado por outro usuário, ou com permissões abertas, é recusado.
+    """
+    if base is None:
+        base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    path = os.path.join(base, f"astro_api_cache-{os.getuid()}")
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise RuntimeError(f"Diretório do cache compartilhado inseguro: {path} (esperado diretório 0700 do usuário)")
+    return path
+
+class SharedCache:
+    """
+    Cache LRU compartilhado entre processos por um arquivo SQLite em memória compartilhada.
+
+    Todos os workers do host (ex: Gunicorn com vários workers) enxergam as mesmas
+    entradas: um gráfico gerado por um worker é um acerto nos demais. As conexões
+    são abertas por thread e por processo, nunca herdadas através de um fork.
+    Mesma interface do LRUCache; os contadores de acertos/erros são do processo.
+
+    Os valores são gravados como bytes, sem pickle: bytes (SVG, PNG, variantes
+    comprimidas) como estão e, com `model`, o JSON do modelo pydantic. O arquivo
+    fica em um diretório privado do usuário (ASTRO_SHARED_CACHE_PATH o substitui).
+
+    Toda consulta é E/S bloqueante (`blocking`): no event loop, use aget/aset.
+    """
+
+    blocking = True
+
+    def __init__(self, name: str, max_items: int = 256, model: Optional[Type[BaseModel]] = None,
+                 path: Optional[str] = None) -> None:
+        self.name = name
+        self.max_items = max_items
+        self.model = model
+        self.path = path or os.getenv("ASTRO_SHARED_CACHE_PATH")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            if self.path is None:
+                self.path = os.path.join(_private_cache_dir(), "astro_api_cache.sqlite3")
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "name TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, accessed REAL NOT NULL, "
+                "PRIMARY KEY (name, key))"
+            )
+            # Descarte LRU por cache sem varrer a tabela
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS cache_entries_accessed ON cache_entries (name, accessed)"
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @staticmethod
+    def _key(key: Hashable) -> str:
+        return f"{CACHE_NAMESPACE}|{key!r}"
+
+    def _encode(self, value: Any) -> bytes:
+        if self.model is not None:
+            return value.model_dump_json().encode("utf-8")
+        if not isinstance(value, bytes):
+            raise TypeError(f"Cache compartilhado '{self.name}' aceita apenas bytes (ou um modelo declarado)")
+        return value
+
+    def _decode(self, value: bytes) -> Any:
+        return self.model.model_validate_json(value) if self.model is not None else bytes(value)
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Retorna o valor associado à chave ou None, marcando-o como usado recentemente.
+        """
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT value, accessed FROM cache_entries WHERE name = ? AND key = ?", (self.name, self._key(key))
+        ).fetchone()
+        self._count(row is not None)
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[1] > SHARED_CACHE_TOUCH_SECONDS:
+            connection.execute(
+                "UPDATE cache_entries SET accessed = ? WHERE name = ? AND key = ?", (now, self.name, self._key(key))
+            )
+        return self._decode(row[0])
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Armazena o valor, descartando os itens menos usados se o limite for atingido.
+        """
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO cache_entries (name, key, value, accessed) VALUES (?, ?, ?, ?)",
+            (self.name, self._key(key), self._encode(value), time.time())
+        )
+        connection.execute(
+            "DELETE FROM cache_entries WHERE name = ? AND key IN ("
+            "SELECT key FROM cache_entries WHERE name = ? ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.name, self.name, self.max_items)
+        )
+
+    async def aget(self, key: Hashable) -> Optional[Any]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: Hashable, value: Any) -> None:
+        await asyncio.to_thread(self.set, key, value)
+
+    def clear(self) -> None:
+        self._connection().execute("DELETE FROM cache_entries WHERE name = ?", (self.name,))
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Retorna tamanho atual (compartilhado), acertos e erros (deste processo) do cache.
+        """
+        size = self._connection().execute(
+            "SELECT COUNT(*) FROM cache_entries WHERE name = ?", (self.name,)
+        ).fetchone()[0]
+        with self._lock:
+            return {"size": size, "hits": self.hits, "misses": self.misses}
+
+# Caches criados por make_cache, por nome (expostos nas métricas)
+caches: Dict[str, Union[LRUCache, SharedCache]] = {}
+
+def make_cache(name: str, max_items: int = 256, backend: Optional[str] = None,
+               model: Optional[Type[BaseModel]] = None) -> Union[LRUCache, SharedCache]:
+    """
+    Cria o cache conforme ASTRO_CACHE_BACKEND: 'memory' (padrão, por processo) ou
+    'shared' (compartilhado entre os workers do host).
+
+    Args:
+        name: Nome do cache (exposto nas métricas)
+        max_items: Limite de itens
+        backend: Força o backend ('memory' ou 'shared'), ignorando ASTRO_CACHE_BACKEND
+        model: Modelo pydantic dos valores; sem ele, o cache compartilhado aceita apenas bytes
+    """
+    if (backend or os.getenv("ASTRO_CACHE_BACKEND", "memory")) == "shared":
+        cache = SharedCache(name, max_items, model=model)
+    else:
+        cache = LRUCache(name, max_items, model=model)
+    caches[name] = cache
+    return cache
+
+def _to_jsonable(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (list, tuple)):
+        return [_to_jsonable(item) for item in value]
+    return value
+
+def chart_fingerprint(*parts: Any) -> str:
+    """
+    Gera uma chave estável (SHA-256) a partir dos dados que definem um mapa.
+
+    Args:
+        *parts: Modelos pydantic ou valores JSON-serializáveis (ex: dados natais,
+            dados de trânsito, tipo de gráfico)
+
+    Returns:
+        Hash hexadecimal que identifica a combinação de dados
+    """
+    payload = json.dumps([_to_jsonable(part) for part in parts], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
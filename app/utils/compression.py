@@ -0,0 +1,238 @@
+"""
+Módulo de compressão das respostas negociada por Accept-Encoding.
+
+Codificações suportadas: gzip (biblioteca padrão), br (pacote opcional
+'brotli') e zstd (pacote opcional 'zstandard'); as ausentes simplesmente não
+são oferecidas. Entre as aceitas pelo cliente com o maior peso (q), a ordem de
+preferência é zstd, br, gzip.
+
+Apenas media types textuais (JSON, SVG, texto) acima de ASTRO_COMPRESS_MIN_BYTES
+são comprimidos; imagens raster já são comprimidas. As variantes comprimidas
+das respostas 200 cujo corpo veio de um cache de gráficos (marcadas pela rota
+com mark_cached_body()) ficam em cache na memória do processo (chave:
+codificação + hash SHA-256 do corpo), de modo que um gráfico repetido nunca é
+recomprimido; respostas avulsas, como o JSON de um cálculo, não ocupam o cache.
+Respostas em streaming são comprimidas bloco a bloco, com flush a cada bloco
+para não atrasar o envio.
+"""
+import asyncio
+import gzip
+import hashlib
+import os
+import time
+import zlib
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.utils.cache import make_cache
+from app.utils.metrics import record_stage
+
+COMPRESS_MIN_BYTES = int(os.getenv("ASTRO_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("ASTRO_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("ASTRO_BROTLI_QUALITY", "5"))
+ZSTD_LEVEL = int(os.getenv("ASTRO_ZSTD_LEVEL", "6"))
+
+# Corpos maiores que isso são comprimidos fora do event loop
+COMPRESS_THREAD_BYTES = 64 * 1024
+
+COMPRESSIBLE_TYPES = ("application/json", "image/svg+xml", "text/")
+# Server-Sent Events seguem sem compressão: o proxy e o cliente precisam de cada evento assim que é enviado
+UNCOMPRESSED_TYPES = ("text/event-stream",)
+
+# Variantes comprimidas já geradas: (codificação, sha256 do corpo) -> bytes. Sempre
+# em memória: o cache compartilhado (SQLite) faria E/S bloqueante no event loop
+compressed_cache = make_cache("compressed", max_items=int(os.getenv("ASTRO_COMPRESSED_CACHE_SIZE", "512")),
+                              backend="memory")
+
+# Marcador da requisição atual: {'cached': True} quando o corpo veio de um cache de gráficos
+cached_body: ContextVar[Optional[Dict[str, bool]]] = ContextVar("cached_body", default=None)
+
+def mark_cached_body() -> None:
+    """
+    Indica que o corpo da resposta atual vem de um cache de gráficos e se repete,
+    então suas variantes comprimidas valem a pena guardar.
+    """
+    marker = cached_body.get()
+    if marker is not None:
+        marker["cached"] = True
+
+class GzipStream:
+    def __init__(self) -> None:
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+# Codificação -> (compressão de um corpo inteiro, fábrica do compressor em streaming)
+ENCODERS: Dict[str, Tuple[Callable[[bytes], bytes], Callable[[], Any]]] = {
+    "gzip": (lambda data: gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0), GzipStream),
+}
+
+try:
+    import brotli
+
+    class BrotliStream:
+        def __init__(self) -> None:
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+        def chunk(self, data: bytes) -> bytes:
+            return self._compressor.process(data) + self._compressor.flush()
+
+        def finish(self) -> bytes:
+            return self._compressor.finish()
+
+    ENCODERS["br"] = (lambda data: brotli.compress(data, quality=BROTLI_QUALITY), BrotliStream)
+except ImportError:
+    pass
+
+try:
+    import zstandard
+
+    class ZstdStream:
+        def __init__(self) -> None:
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+        def chunk(self, data: bytes) -> bytes:
+            return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+        def finish(self) -> bytes:
+            return self._compressor.flush()
+
+    ENCODERS["zstd"] = (lambda data: zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data), ZstdStream)
+except ImportError:
+    pass
+
+# Preferência do servidor entre codificações com o mesmo peso
+PREFERENCE = ("zstd", "br", "gzip")
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """
+    Escolhe a codificação a partir do cabeçalho Accept-Encoding.
+
+    Args:
+        accept_encoding: Valor do cabeçalho, ex: "gzip, br;q=0.9, *;q=0.1"
+
+    Returns:
+        'zstd', 'br', 'gzip' ou None (sem compressão)
+    """
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name] = weight
+
+    candidates = [
+        (weights.get(encoding, weights.get("*", 0.0)), -index, encoding)
+        for index, encoding in enumerate(PREFERENCE) if encoding in ENCODERS
+    ]
+    candidates = [candidate for candidate in candidates if candidate[0] > 0]
+    return max(candidates)[2] if candidates else None
+
+def _is_compressible(headers: List[Tuple[bytes, bytes]]) -> bool:
+    content_type = b""
+    for name, value in headers:
+        name = name.lower()
+        if name == b"content-encoding":
+            return False
+        if name == b"content-type":
+            content_type = value
+    content_type = content_type.decode("latin-1")
+    return content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith(UNCOMPRESSED_TYPES)
+
+async def compress_body(encoding: str, body: bytes, cacheable: bool) -> bytes:
+    """
+    Comprime um corpo inteiro, reaproveitando a variante do cache quando existir.
+    """
+    started_at = time.perf_counter()
+    key = (encoding, hashlib.sha256(body).hexdigest()) if cacheable else None
+    compressed = compressed_cache.get(key) if key else None
+    if compressed is None:
+        compress = ENCODERS[encoding][0]
+        compressed = await asyncio.to_thread(compress, body) if len(body) > COMPRESS_THREAD_BYTES else compress(body)
+        if key:
+            compressed_cache.set(key, compressed)
+    record_stage("compress", time.perf_counter() - started_at)
+    return compressed
+
+class CompressionMiddleware:
+    """
+    Middleware ASGI que comprime as respostas conforme o Accept-Encoding do cliente.
+    """
+
+    def __init__(self, app: Any, min_size: int = COMPRESS_MIN_BYTES) -> None:
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = b""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value
+        encoding = negotiate(accept_encoding.decode("latin-1"))
+
+        start: Dict[str, Any] = {}
+        marker: Dict[str, bool] = {}
+        stream: Optional[Any] = None
+        passthrough = False
+
+        async def compress_send(message: Dict[str, Any]) -> None:
+            nonlocal stream, passthrough
+            if message["type"] == "http.response.start":
+                # O início só é enviado junto com o primeiro bloco do corpo, quando o tamanho é conhecido
+                start.update(message)
+                compressible = _is_compressible(message.get("headers", []))
+                passthrough = encoding is None or not compressible
+                if passthrough:
+                    if compressible:
+                        # A resposta varia com Accept-Encoding mesmo quando este cliente não pede compressão
+                        message["headers"] = [*message.get("headers", []), (b"vary", b"Accept-Encoding")]
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if stream is None and not more_body:
+                # Corpo inteiro em uma única mensagem; abaixo do limite segue sem compressão
+                headers = [*start.get("headers", []), (b"vary", b"Accept-Encoding")]
+                if len(body) >= self.min_size:
+                    body = await compress_body(encoding, body, cacheable=start["status"] == 200 and marker.get("cached", False))
+                    headers = [(name, value) for name, value in headers if name.lower() != b"content-length"]
+                    headers += [(b"content-encoding", encoding.encode()), (b"content-length", str(len(body)).encode())]
+                await send({**start, "headers": headers})
+                await send({"type": "http.response.body", "body": body})
+                return
+
+            if stream is None:
+                # Streaming: tamanho final desconhecido, comprime bloco a bloco
+                stream = ENCODERS[encoding][1]()
+                headers = [(name, value) for name, value in start.get("headers", []) if name.lower() != b"content-length"]
+                headers += [(b"vary", b"Accept-Encoding"), (b"content-encoding", encoding.encode())]
+                await send({**start, "headers": headers})
+            data = stream.chunk(body) if body else b""
+            if not more_body:
+                data += stream.finish()
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        token = cached_body.set(marker)
+        try:
+            await self.app(scope, receive, compress_send)
+        finally:
+            cached_body.reset(token)
@@ -0,0 +1,489 @@
+"""
+Módulo de jobs: operações longas executadas fora dos workers HTTP.
+
+POST /api/v1/jobs grava o job em disco (ASTRO_JOBS_DIR/<id>/) e o envia a um
+pool local de processos (ASTRO_JOB_WORKERS), de modo que varreduras longas não
+disputam o GIL com as requisições. O processo do job atualiza o progresso em
+meta.json e grava os resultados em results.jsonl à medida que são produzidos;
+qualquer worker HTTP do host lê esses arquivos para responder sobre o job.
+
+Cancelamento: um arquivo 'cancel' no diretório do job, verificado pelo
+processo a cada etapa (um job ainda na fila é cancelado imediatamente).
+Retenção: jobs concluídos são removidos após ASTRO_JOB_RETENTION_HOURS.
+
+Reinícios: cada processo servidor tem um token aleatório e mantém um arquivo de
+batimento (servers/<token>) atualizado a cada JOB_HEARTBEAT_SECONDS; jobs na
+fila ou em execução cujo servidor parou de bater são marcados como falhos na
+inicialização e periodicamente. O PID não basta: em contêineres os PIDs dos
+workers se repetem entre reinícios.
+
+Tipos de job:
+    transit_scan  momentos em que cada aspecto de trânsito ao mapa natal fica exato
+    batch_natal   mapa natal de cada item de uma lista
+    progressions  progressões secundárias ano a ano
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import re
+import secrets
+import shutil
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import swisseph as swe
+from pydantic import BaseModel, TypeAdapter
+
+from app.models import BatchNatalJob, JobRequest, ProgressionsJob, TransitScanJob
+from app.exceptions import AstroAPIException
+from app.utils.astro_helpers import create_subject
+from app.utils.quotas import route_cost
+from app.utils.structured_logging import setup_logging
+from app.utils.svg_combined_chart import SIGN_SYMBOLS
+from app.utils.svg_timelapse import MAX_TIMELAPSE_FRAMES, TIMELAPSE_PLANETS, compute_transit_longitudes
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = os.getenv("ASTRO_JOBS_DIR", "jobs_data")
+JOB_WORKERS = int(os.getenv("ASTRO_JOB_WORKERS", "1"))
+JOB_MAX_PENDING = int(os.getenv("ASTRO_JOB_MAX_PENDING", "100"))
+JOB_RETENTION_SECONDS = float(os.getenv("ASTRO_JOB_RETENTION_HOURS", "24")) * 3600
+JOB_PURGE_INTERVAL = 600
+JOB_HEARTBEAT_SECONDS = 30
+# Sem batimento por este período, o servidor é considerado encerrado
+JOB_SERVER_TIMEOUT = 3 * JOB_HEARTBEAT_SECONDS
+
+# Limite de passos de uma varredura de trânsitos
+MAX_SCAN_STEPS = 50000
+SCAN_CHUNK_STEPS = 500
+
+# Custo de cada passo de varredura na cota da chave: o de um quadro do time-lapse, que faz o mesmo cálculo
+SCAN_STEP_COST = float(os.getenv("ASTRO_JOB_SCAN_STEP_COST", str(route_cost("/api/v1/svg_timelapse") / MAX_TIMELAPSE_FRAMES)))
+
+TERMINAL_STATUSES = {"succeeded", "failed", "cancelled"}
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+_job_request_adapter = TypeAdapter(JobRequest)
+
+class JobCancelled(Exception):
+    """Cancelamento pedido durante a execução do job."""
+
+# (pid, token) do processo servidor atual; recriado após um fork (workers do Gunicorn com preload)
+_server_token: Tuple[int, str] = (0, "")
+
+def server_token() -> str:
+    """
+    Token aleatório deste processo servidor, que identifica os jobs que ele enviou ao pool.
+    """
+    global _server_token
+    if _server_token[0] != os.getpid():
+        _server_token = (os.getpid(), secrets.token_hex(8))
+    return _server_token[1]
+
+class JobStore:
+    """
+    Jobs em disco: meta.json (estado e progresso), request.json, results.jsonl e o marcador 'cancel'.
+    """
+
+    def __init__(self, root: str = JOBS_DIR) -> None:
+        self.root = root
+
+    def path(self, job_id: str, name: str = "") -> str:
+        if not _JOB_ID.match(job_id):
+            raise KeyError(job_id)
+        return os.path.join(self.root, job_id, name)
+
+    def create(self, job: BaseModel, owner: Optional[str]) -> Dict[str, Any]:
+        job_id = secrets.token_hex(16)
+        os.makedirs(self.path(job_id), exist_ok=True)
+        with open(self.path(job_id, "request.json"), "w", encoding="utf-8") as request_file:
+            request_file.write(job.model_dump_json())
+        now = time.time()
+        meta = {
+            "id": job_id, "type": job.type, "status": "queued", "owner": owner,
+            "server_pid": os.getpid(), "server_token": server_token(),
+            "progress_done": 0, "progress_total": 0, "result_count": 0,
+            "created_at": now, "started_at": None, "finished_at": None,
+            "expires_at": now + JOB_RETENTION_SECONDS, "error": None,
+        }
+        self.write(job_id, meta)
+        return meta
+
+    def read(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path(job_id, "meta.json"), encoding="utf-8") as meta_file:
+                meta = json.load(meta_file)
+        except (KeyError, OSError, ValueError):
+            return None
+        meta["cancel_requested"] = self.cancel_requested(job_id)
+        return meta
+
+    def write(self, job_id: str, meta: Dict[str, Any]) -> None:
+        # Escrita atômica: leitores nunca veem um meta.json pela metade
+        temporary = self.path(job_id, f"meta.json.{os.getpid()}.tmp")
+        with open(temporary, "w", encoding="utf-8") as meta_file:
+            json.dump({key: value for key, value in meta.items() if key != "cancel_requested"}, meta_file)
+        os.replace(temporary, self.path(job_id, "meta.json"))
+
+    def update(self, job_id: str, **changes: Any) -> Dict[str, Any]:
+        meta = self.read(job_id) or {}
+        meta.update(changes)
+        if changes.get("status") in TERMINAL_STATUSES:
+            meta["finished_at"] = time.time()
+            meta["expires_at"] = meta["finished_at"] + JOB_RETENTION_SECONDS
+        self.write(job_id, meta)
+        return meta
+
+    def load_request(self, job_id: str) -> BaseModel:
+        with open(self.path(job_id, "request.json"), encoding="utf-8") as request_file:
+            return _job_request_adapter.validate_json(request_file.read())
+
+    def request_cancel(self, job_id: str) -> None:
+        open(self.path(job_id, "cancel"), "a").close()
+
+    def cancel_requested(self, job_id: str) -> bool:
+        return os.path.exists(self.path(job_id, "cancel"))
+
+    def append_results(self, job_id: str, items: List[Dict[str, Any]]) -> None:
+        with open(self.path(job_id, "results.jsonl"), "a", encoding="utf-8") as results_file:
+            results_file.writelines(json.dumps(item, ensure_ascii=False) + "\n" for item in items)
+
+    def read_results(self, job_id: str, offset: int, limit: int) -> List[Dict[str, Any]]:
+        try:
+            with open(self.path(job_id, "results.jsonl"), encoding="utf-8") as results_file:
+                return [json.loads(line) for line in islice(results_file, offset, offset + limit)]
+        except FileNotFoundError:
+            return []
+
+    def job_ids(self) -> List[str]:
+        try:
+            return [name for name in os.listdir(self.root) if _JOB_ID.match(name)]
+        except FileNotFoundError:
+            return []
+
+    def purge(self) -> int:
+        """
+        Remove os jobs concluídos cujo prazo de retenção venceu.
+        """
+        removed = 0
+        now = time.time()
+        for job_id in self.job_ids():
+            meta = self.read(job_id)
+            if meta and meta["status"] in TERMINAL_STATUSES and meta["expires_at"] < now:
+                shutil.rmtree(self.path(job_id), ignore_errors=True)
+                removed += 1
+        return removed
+
+    def _server_path(self, token: str) -> str:
+        return os.path.join(self.root, "servers", token)
+
+    def heartbeat(self, token: str) -> None:
+        """
+        Registra que o processo servidor do token continua vivo.
+        """
+        os.makedirs(os.path.join(self.root, "servers"), exist_ok=True)
+        with open(self._server_path(token), "w", encoding="utf-8") as heartbeat_file:
+            heartbeat_file.write(str(os.getpid()))
+
+    def remove_heartbeat(self, token: str) -> None:
+        try:
+            os.remove(self._server_path(token))
+        except FileNotFoundError:
+            pass
+
+    def server_alive(self, token: Optional[str]) -> bool:
+        if not token or not re.fullmatch(r"[0-9a-f]+", token):
+            return False
+        try:
+            return time.time() - os.path.getmtime(self._server_path(token)) < JOB_SERVER_TIMEOUT
+        except OSError:
+            return False
+
+    def recover(self) -> int:
+        """
+        Marca como falhos os jobs na fila ou em execução cujo servidor parou de bater (reinício ou falha),
+        e remove os batimentos antigos.
+        """
+        recovered = 0
+        for job_id in self.job_ids():
+            meta = self.read(job_id)
+            if meta and meta["status"] not in TERMINAL_STATUSES and not self.server_alive(meta.get("server_token")):
+                self.update(job_id, status="failed", error="Job interrompido pelo reinício do servidor")
+                recovered += 1
+        try:
+            tokens = os.listdir(os.path.join(self.root, "servers"))
+        except FileNotFoundError:
+            tokens = []
+        for token in tokens:
+            if not self.server_alive(token):
+                self.remove_heartbeat(token)
+        return recovered
+
+class JobContext:
+    """
+    Interface do job em execução com o disco: progresso, resultados e cancelamento.
+    """
+
+    def __init__(self, store: JobStore, job_id: str) -> None:
+        self.store = store
+        self.job_id = job_id
+        self.result_count = 0
+        self._last_write = 0.0
+
+    def emit(self, items: List[Dict[str, Any]]) -> None:
+        if items:
+            self.store.append_results(self.job_id, items)
+            self.result_count += len(items)
+
+    def progress(self, done: int, total: int) -> None:
+        """
+        Registra o progresso (no máximo a cada 0,5 s) e interrompe o job se o cancelamento foi pedido.
+        """
+        if self.store.cancel_requested(self.job_id):
+            raise JobCancelled()
+        now = time.monotonic()
+        if now - self._last_write >= 0.5 or done == total:
+            self.store.update(self.job_id, progress_done=done, progress_total=total, result_count=self.result_count)
+            self._last_write = now
+
+def _julian_day_to_iso(julian_day: float) -> str:
+    year, month, day, hours = swe.revjul(julian_day)
+    moment = datetime(year, month, day) + timedelta(hours=hours)
+    return moment.replace(microsecond=0).isoformat() + "Z"
+
+def _sign(longitude: float) -> str:
+    return list(SIGN_SYMBOLS)[int(longitude // 30) % 12]
+
+def scan_steps(job: TransitScanJob) -> int:
+    return int(job.days * 24 / job.step_hours) + 1
+
+def run_transit_scan(job: TransitScanJob, context: JobContext) -> None:
+    """
+    Registra cada mínimo local de orbe (dentro da orbe máxima) entre planetas em trânsito e natais.
+    """
+    from app.routers.transit_router import TRANSIT_ASPECT_TYPES
+
+    natal_subject = create_subject(job.natal_chart, job.natal_chart.name or "Natal Chart")
+    natal_positions = [(name, getattr(natal_subject, name.lower()).abs_pos) for name in TIMELAPSE_PLANETS]
+    start_julian_day = create_subject(job.start, job.start.name or "Transit Chart").julian_day
+    aspects = list(TRANSIT_ASPECT_TYPES.items())
+    total = scan_steps(job)
+
+    # Últimas duas orbes de cada (planeta em trânsito, planeta natal, aspecto)
+    previous: Dict[tuple, tuple] = {}
+    for chunk_start in range(0, total, SCAN_CHUNK_STEPS):
+        frames = min(SCAN_CHUNK_STEPS, total - chunk_start)
+        chunk_julian_day = start_julian_day + chunk_start * job.step_hours / 24
+        longitudes = compute_transit_longitudes(chunk_julian_day, job.step_hours, frames)
+        hits = []
+        for frame in range(frames):
+            for transit_name, transit_longitudes in longitudes.items():
+                transit_longitude = transit_longitudes[frame]
+                for natal_name, natal_longitude in natal_positions:
+                    diff = abs(natal_longitude - transit_longitude)
+                    if diff > 180:
+                        diff = 360 - diff
+                    for aspect_name, (aspect_angle, max_orb) in aspects:
+                        key = (transit_name, natal_name, aspect_name)
+                        orb = abs(diff - aspect_angle)
+                        before, last = previous.get(key, (None, None))
+                        if last is not None and before is not None and last <= max_orb and last <= before and last < orb:
+                            step = chunk_start + frame - 1
+                            hits.append({
+                                "datetime_utc": _julian_day_to_iso(start_julian_day + step * job.step_hours / 24),
+                                "transit_planet": transit_name, "natal_planet": natal_name,
+                                "aspect": aspect_name, "orbit": round(last, 4),
+                            })
+                        previous[key] = (last, orb)
+        context.emit(hits)
+        context.progress(chunk_start + frames, total)
+
+def run_batch_natal(job: BatchNatalJob, context: JobContext) -> None:
+    from app.routers.natal_chart_router import get_natal_chart
+
+    total = len(job.charts)
+    batch = []
+    for index, chart in enumerate(job.charts):
+        try:
+            batch.append({"index": index, "result": get_natal_chart(chart).model_dump(mode="json")})
+        except Exception as e:
+            batch.append({"index": index, "error": f"{type(e).__name__}: {e}"})
+        if len(batch) >= 50 or index == total - 1:
+            context.emit(batch)
+            batch = []
+            context.progress(index + 1, total)
+
+def run_progressions(job: ProgressionsJob, context: JobContext) -> None:
+    """
+    Progressões secundárias: as posições de N dias após o nascimento correspondem aos N anos de idade.
+    """
+    natal_subject = create_subject(job.natal_chart, job.natal_chart.name or "Natal Chart")
+    previous_signs: Dict[str, str] = {}
+    for age in range(job.years + 1):
+        julian_day = natal_subject.julian_day + age
+        planets = {}
+        for name, planet_id in TIMELAPSE_PLANETS.items():
+            longitude = swe.calc_ut(julian_day, planet_id, swe.FLG_SWIEPH)[0][0]
+            planets[name] = {"longitude": round(longitude, 4), "sign": _sign(longitude)}
+        sign_changes = [
+            {"planet": name, "from": previous_signs[name], "to": planet["sign"]}
+            for name, planet in planets.items() if name in previous_signs and previous_signs[name] != planet["sign"]
+        ]
+        previous_signs = {name: planet["sign"] for name, planet in planets.items()}
+        context.emit([{"age": age, "year": job.natal_chart.year + age, "progressed_date_utc": _julian_day_to_iso(julian_day),
+                       "planets": planets, "sign_changes": sign_changes}])
+        context.progress(age + 1, job.years + 1)
+
+JOB_RUNNERS: Dict[str, Callable[[Any, JobContext], None]] = {
+    "transit_scan": run_transit_scan,
+    "batch_natal": run_batch_natal,
+    "progressions": run_progressions,
+}
+
+def run_job(root: str, job_id: str) -> None:
+    """
+    Executa um job no processo do pool, registrando o estado final em disco.
+    """
+    store = JobStore(root)
+    if store.cancel_requested(job_id):
+        store.update(job_id, status="cancelled")
+        return
+    store.update(job_id, status="running", started_at=time.time())
+    context = JobContext(store, job_id)
+    try:
+        job = store.load_request(job_id)
+        JOB_RUNNERS[job.type](job, context)
+    except JobCancelled:
+        store.update(job_id, status="cancelled", result_count=context.result_count)
+        return
+    except Exception as e:
+        logger.exception("Erro na execução do job", extra={"job_id": job_id, "error": f"{type(e).__name__}: {e}"})
+        store.update(job_id, status="failed", error=f"{type(e).__name__}: {e}", result_count=context.result_count)
+        return
+    store.update(job_id, status="succeeded", result_count=context.result_count)
+
+def validate_job(job: BaseModel) -> None:
+    """
+    Verificações que dependem de mais de um campo.
+
+    Raises:
+        ValueError: Job grande demais
+    """
+    if isinstance(job, TransitScanJob) and scan_steps(job) > MAX_SCAN_STEPS:
+        raise ValueError(f"A varredura teria {scan_steps(job)} passos; o máximo é {MAX_SCAN_STEPS}. "
+                         "Aumente 'step_hours' ou reduza 'days'.")
+
+def job_cost(job: BaseModel) -> float:
+    """
+    Custo do trabalho do job na cota da chave, proporcional ao número de cálculos.
+    """
+    if isinstance(job, TransitScanJob):
+        return scan_steps(job) * SCAN_STEP_COST
+    if isinstance(job, BatchNatalJob):
+        return len(job.charts) * route_cost("/api/v1/natal_chart")
+    if isinstance(job, ProgressionsJob):
+        return (job.years + 1) * route_cost("/api/v1/natal_chart")
+    return 0.0
+
+class JobRunner:
+    """
+    Pool local de processos (spawn) que executa os jobs deste worker HTTP.
+    """
+
+    def __init__(self, store: JobStore = JobStore(), workers: int = JOB_WORKERS, max_pending: int = JOB_MAX_PENDING) -> None:
+        self.store = store
+        self.workers = workers
+        self.max_pending = max_pending
+        self.submitted = 0
+        self.rejected = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._futures: Dict[str, Future] = {}
+        self._purge_task: Optional[asyncio.Task] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Criado no primeiro job: sem jobs, nenhum processo extra
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=setup_logging
+            )
+        return self._executor
+
+    def submit(self, job: BaseModel, owner: Optional[str]) -> Dict[str, Any]:
+        """
+        Registra o job em disco e o envia ao pool.
+
+        Raises:
+            ValueError: Job inválido (ver validate_job)
+            AstroAPIException: 429 se houver JOB_MAX_PENDING jobs na fila ou em execução neste worker
+        """
+        validate_job(job)
+        if len(self._futures) >= self.max_pending:
+            self.rejected += 1
+            raise AstroAPIException(status_code=429, detail="Fila de jobs cheia. Tente novamente mais tarde.",
+                                    headers={"Retry-After": "30"})
+        meta = self.store.create(job, owner)
+        future = self._get_executor().submit(run_job, self.store.root, meta["id"])
+        self._futures[meta["id"]] = future
+        future.add_done_callback(lambda done, job_id=meta["id"]: self._finished(job_id, done))
+        self.submitted += 1
+        return meta
+
+    def _finished(self, job_id: str, future: Future) -> None:
+        self._futures.pop(job_id, None)
+        if not future.cancelled() and future.exception() is not None:
+            # Falha do próprio pool (ex: processo encerrado), não do job
+            error = future.exception()
+            self.store.update(job_id, status="failed", error=f"{type(error).__name__}: {error}")
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        meta = self.store.read(job_id)
+        if meta is None or meta["status"] in TERMINAL_STATUSES:
+            return meta
+        self.store.request_cancel(job_id)
+        future = self._futures.get(job_id)
+        if future is not None and future.cancel():
+            return self.store.update(job_id, status="cancelled")
+        return self.store.read(job_id)
+
+    async def _maintenance_loop(self) -> None:
+        last_purge = time.monotonic()
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            try:
+                await asyncio.to_thread(self.store.heartbeat, server_token())
+                # Jobs de outro worker que morreu sem reiniciar este também são encerrados
+                await asyncio.to_thread(self.store.recover)
+                if time.monotonic() - last_purge >= JOB_PURGE_INTERVAL:
+                    removed = await asyncio.to_thread(self.store.purge)
+                    last_purge = time.monotonic()
+                    if removed:
+                        logger.info("Jobs expirados removidos", extra={"removed": removed})
+            except Exception as e:
+                logger.exception("Erro na manutenção dos jobs", extra={"error": f"{type(e).__name__}: {e}"})
+
+    async def start(self) -> None:
+        await asyncio.to_thread(self.store.heartbeat, server_token())
+        await asyncio.to_thread(self.store.recover)
+        await asyncio.to_thread(self.store.purge)
+        self._purge_task = asyncio.create_task(self._maintenance_loop())
+
+    def shutdown(self) -> None:
+        if self._purge_task is not None:
+            self._purge_task.cancel()
+            self._purge_task = None
+        # Encerramento limpo: os jobs deste servidor são recuperados sem esperar JOB_SERVER_TIMEOUT
+        self.store.remove_heartbeat(server_token())
+        if self._executor is not None:
+            # O próximo job de um novo ciclo de vida cria outro executor
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": self.workers, "max_pending": self.max_pending, "pending": len(self._futures),
+                "submitted": self.submitted, "rejected": self.rejected}
+
+job_runner = JobRunner()
@@ -0,0 +1,245 @@
+"""
+Módulo de métricas da API: histogramas por rota e por etapa, formato Prometheus
+e cabeçalho Server-Timing.
+
+Cada requisição recebe um dicionário de tempos por etapa (ContextVar). As
+etapas são medidas com stage_timer() nos pontos de cálculo: montagem do
+subject ('subject'), aspectos ('aspects'), montagem dos modelos de resposta
+('build'), renderização ('render'), consulta a cache ('cache') e serialização
+da resposta ('serialize', medida pela TimedRoute).
+"""
+import functools
+import inspect
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+
+from app.utils.structured_logging import dropped_records, log_context
+
+# Limites (segundos) dos buckets dos histogramas de latência
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Tempos por etapa da requisição atual (segundos, acumulados por etapa)
+request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+class Histogram:
+    """
+    Histograma Prometheus com rótulos, thread-safe.
+    """
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str],
+                 buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            # Contagens por bucket, seguidas de soma e contagem total
+            series = self._series.setdefault(labels, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+        for labels, series in items:
+            base = ",".join(f'{name}="{_escape_label(value)}"' for name, value in zip(self.labelnames, labels))
+            separator = "," if base else ""
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{base}{separator}le="{bound}"}} {count:g}')
+            lines.append(f'{self.name}_bucket{{{base}{separator}le="+Inf"}} {series[-1]:g}')
+            lines.append(f"{self.name}_sum{{{base}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{base}}} {series[-1]:g}")
+        return lines
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+REQUEST_DURATION = Histogram(
+    "astro_request_duration_seconds", "Duração das requisições por rota.", ("method", "route", "status")
+)
+STAGE_DURATION = Histogram(
+    "astro_stage_duration_seconds", "Duração de cada etapa do processamento por rota.", ("route", "stage")
+)
+
+def record_stage(stage: str, seconds: float) -> None:
+    """
+    Soma a duração de uma etapa aos tempos da requisição atual, se houver.
+    """
+    timings = request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """
+    Mede o bloco e o registra como etapa da requisição atual.
+
+    Fora de uma requisição (ex: aquecimento) a medição é descartada.
+    """
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started_at)
+
+def server_timing_header(timings: Dict[str, float], total: float) -> str:
+    """
+    Monta o valor do cabeçalho Server-Timing (durações em ms).
+    """
+    entries = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items() if not stage.startswith("_")]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+def _route_label(request: Request) -> str:
+    # Caminho do template da rota, para não criar uma série por URL
+    route = request.scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+async def metrics_middleware(request: Request, call_next: Callable) -> Response:
+    """
+    Middleware HTTP: inicia os tempos e o contexto de log da requisição,
+    registra os histogramas por rota e etapa e adiciona os cabeçalhos
+    Server-Timing e X-Request-ID.
+    """
+    timings: Dict[str, float] = {}
+    request_id = request.headers.get("x-request-id", "")[:64] or uuid.uuid4().hex
+    token = request_timings.set(timings)
+    context_token = log_context.set({
+        "request_id": request_id, "method": request.method, "path": request.url.path, "timings": timings
+    })
+    started_at = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        request_timings.reset(token)
+        log_context.reset(context_token)
+    total = time.perf_counter() - started_at
+
+    route = _route_label(request)
+    REQUEST_DURATION.observe(total, request.method, route, str(response.status_code))
+    for stage, seconds in timings.items():
+        if not stage.startswith("_"):
+            STAGE_DURATION.observe(seconds, route, stage)
+    response.headers["Server-Timing"] = server_timing_header(timings, total)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+def _mark_endpoint_end() -> None:
+    timings = request_timings.get()
+    if timings is not None:
+        timings["_endpoint_end"] = time.perf_counter()
+
+def _timed_endpoint(endpoint: Callable) -> Callable:
+    # Marca o fim do endpoint para que a TimedRoute meça a serialização que vem depois
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                _mark_endpoint_end()
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def sync_wrapper(*args: Any, **kwargs: Any) -> Any:
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            _mark_endpoint_end()
+    return sync_wrapper
+
+class TimedRoute(APIRoute):
+    """
+    Rota que registra como etapa 'serialize' o tempo entre o retorno do endpoint
+    e a resposta pronta (validação do response_model e codificação JSON).
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs: Any) -> None:
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def timed_handler(request: Request) -> Response:
+            context = log_context.get()
+            if context is not None:
+                context["route"] = self.path
+            response = await handler(request)
+            timings = request_timings.get()
+            if timings is not None and "_endpoint_end" in timings:
+                record_stage("serialize", time.perf_counter() - timings.pop("_endpoint_end"))
+            return response
+
+        return timed_handler
+
+def _gauge(name: str, help_text: str, metric_type: str, samples: List[Tuple[str, float]]) -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    lines.extend(f"{name}{{{labels}}} {value:g}" for labels, value in samples)
+    return lines
+
+def render_metrics(caches: Dict[str, Any], pools: Dict[str, Any], admission: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Gera o texto no formato de exposição do Prometheus.
+
+    Args:
+        caches: Caches por nome (objetos com stats() -> size/hits/misses)
+        pools: Pools de renderização por nome (objetos com stats())
+        admission: Estatísticas do controle de admissão (AdmissionController.stats())
+
+    Returns:
+        Métricas em texto (text/plain; version=0.0.4)
+    """
+    lines = REQUEST_DURATION.render() + STAGE_DURATION.render()
+
+    cache_stats = {name: cache.stats() for name, cache in caches.items()}
+    lines += _gauge("astro_cache_hits_total", "Acertos de cache (por processo).", "counter",
+                    [(f'cache="{name}"', stats["hits"]) for name, stats in cache_stats.items()])
+    lines += _gauge("astro_cache_misses_total", "Faltas de cache (por processo).", "counter",
+                    [(f'cache="{name}"', stats["misses"]) for name, stats in cache_stats.items()])
+    lines += _gauge("astro_cache_hit_ratio", "Taxa de acertos de cache (por processo).", "gauge",
+                    [(f'cache="{name}"', stats["hits"] / ((stats["hits"] + stats["misses"]) or 1))
+                     for name, stats in cache_stats.items()])
+    lines += _gauge("astro_cache_items", "Itens armazenados no cache.", "gauge",
+                    [(f'cache="{name}"', stats["size"]) for name, stats in cache_stats.items()])
+
+    pool_stats = {name: pool.stats() for name, pool in pools.items()}
+    lines += _gauge("astro_render_pool_queue_depth", "Tarefas aguardando na fila do pool.", "gauge",
+                    [(f'pool="{name}"', stats["queue_depth"]) for name, stats in pool_stats.items()])
+    lines += _gauge("astro_render_pool_running", "Tarefas em execução no pool.", "gauge",
+                    [(f'pool="{name}"', stats["running"]) for name, stats in pool_stats.items()])
+    lines += _gauge("astro_render_pool_rejected_total", "Tarefas rejeitadas com 429 (fila cheia).", "counter",
+                    [(f'pool="{name}"', stats["rejected"]) for name, stats in pool_stats.items()])
+    lines += _gauge("astro_render_pool_wait_seconds", "Média móvel da espera na fila do pool.", "gauge",
+                    [(f'pool="{name}"', stats["avg_wait_ms"] / 1000) for name, stats in pool_stats.items()])
+    lines += _gauge("astro_render_pool_expired_total", "Tarefas descartadas com prazo vencido antes de começar.", "counter",
+                    [(f'pool="{name}"', stats["expired"]) for name, stats in pool_stats.items()])
+    if admission is not None:
+        lines += _gauge("astro_admission_active", "Requisições admitidas em execução.", "gauge",
+                        [("", admission["active"])])
+        lines += _gauge("astro_admission_queue_depth", "Requisições aguardando admissão.", "gauge",
+                        [("", admission["queue_depth"])])
+        lines += _gauge("astro_admission_queued_total", "Requisições que aguardaram na fila de admissão.", "counter",
+                        [("", admission["queued"])])
+        lines += _gauge("astro_admission_shed_total", "Requisições descartadas com 503 pelo controle de admissão.", "counter",
+                        [('reason="queue_full"', admission["shed_queue_full"]),
+                         ('reason="deadline"', admission["shed_deadline"])])
+        lines += _gauge("astro_admission_served_stale_total", "Respostas servidas da cache sob sobrecarga.", "counter",
+                        [("", admission["served_stale"])])
+    lines += _gauge("astro_log_dropped_total", "Registros de log descartados por fila cheia.", "counter",
+                    [("", dropped_records())])
+    return "\n".join(lines) + "\n"
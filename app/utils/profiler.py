@@ -0,0 +1,495 @@
+"""
+Módulo do profiler sob demanda de requisições em produção.
+
+Um administrador liga o profiler (endpoint /api/v1/admin/profiling) e escolhe
+o modo: 'sampling' (amostragem estatística das pilhas com sys._current_frames)
+ou 'cprofile' (cProfile determinístico). Com ele ligado, são perfiladas as
+requisições com o cabeçalho X-Profile: 1 e uma amostra aleatória de
+sample_percent% das demais. O perfil cobre o handler no event loop e as
+tarefas que ele envia aos pools de renderização (inclusive o Kerykeion) e fica
+disponível para download em pstats ou em pilhas colapsadas (flamegraph).
+
+A configuração e os perfis concluídos ficam no armazenamento do profiler: na
+memória do processo ou, com ASTRO_CACHE_BACKEND=shared (Gunicorn com vários
+workers), em um arquivo SQLite no diretório privado do cache compartilhado, de
+modo que o switch e os downloads valem para todos os workers do host.
+
+A configuração é relida do armazenamento por uma tarefa em segundo plano, em
+uma thread; com o profiler desligado, o middleware apenas consulta um valor em
+memória e repassa a requisição.
+"""
+import asyncio
+import cProfile
+import json
+import logging
+import marshal
+import os
+import pstats
+import random
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Union
+
+from app.utils.cache import _private_cache_dir
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+
+# Perfis mantidos no armazenamento, intervalo da amostragem e validade da configuração lida
+PROFILE_KEEP = int(os.getenv("ASTRO_PROFILE_KEEP", "20"))
+PROFILE_CONFIG_TTL = float(os.getenv("ASTRO_PROFILE_CONFIG_TTL", "1"))
+SAMPLING_INTERVAL = float(os.getenv("ASTRO_PROFILE_INTERVAL_MS", "5")) / 1000
+
+DEFAULT_CONFIG: Dict[str, Any] = {"enabled": False, "mode": "sampling", "sample_percent": 0.0, "limit": None}
+
+# Perfil da requisição atual; acompanha as tarefas enviadas aos pools de renderização
+active_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("active_profile", default=None)
+
+def _frame_label(code: Any) -> str:
+    # Caminho relativo ao site-packages ou ao diretório da API, para rótulos curtos
+    filename = code.co_filename
+    marker = "site-packages" + os.sep
+    if marker in filename:
+        filename = filename.split(marker, 1)[1]
+    elif filename.startswith(os.getcwd()):
+        filename = os.path.relpath(filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+class RequestProfile:
+    """
+    Perfil de uma requisição: estatísticas do cProfile ou pilhas amostradas.
+    """
+
+    def __init__(self, method: str, path: str, mode: str) -> None:
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.mode = mode
+        self.created_at = time.time()
+        self.status_code: Optional[int] = None
+        self.duration_ms: Optional[float] = None
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stats: Optional[pstats.Stats] = None
+        self._threads: Set[int] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def add_thread(self, ident: int) -> None:
+        with self._lock:
+            self._threads.add(ident)
+
+    def remove_thread(self, ident: int) -> None:
+        with self._lock:
+            self._threads.discard(ident)
+
+    def add_cprofile(self, profiler: cProfile.Profile) -> None:
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profiler)
+            else:
+                self._stats.add(profiler)
+
+    def start_sampling(self) -> None:
+        self._sampler = threading.Thread(target=self._sample_loop, name=f"profiler-{self.id}", daemon=True)
+        self._sampler.start()
+
+    def stop_sampling(self) -> None:
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join(timeout=1)
+
+    def _sample_loop(self) -> None:
+        while not self._stop.wait(SAMPLING_INTERVAL):
+            frames = sys._current_frames()
+            with self._lock:
+                threads = list(self._threads)
+            for ident in threads:
+                frame = frames.get(ident)
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                if labels:
+                    with self._lock:
+                        self.stacks[";".join(reversed(labels))] += 1
+                        self.samples += 1
+
+    def pstats_bytes(self) -> Optional[bytes]:
+        """
+        Estatísticas no formato do pstats (mesmo conteúdo de Stats.dump_stats), ou None.
+        """
+        with self._lock:
+            return marshal.dumps(self._stats.stats) if self._stats is not None else None
+
+    def collapsed_stacks(self) -> Optional[str]:
+        """
+        Pilhas colapsadas ('raiz;...;folha contagem' por linha), entrada do flamegraph.pl/speedscope, ou None.
+        """
+        with self._lock:
+            if not self.stacks:
+                return None
+            return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def formats(self) -> List[str]:
+        with self._lock:
+            available = []
+            if self._stats is not None:
+                available.append("pstats")
+            if self.stacks:
+                available.append("collapsed")
+            return available
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "mode": self.mode,
+            "status_code": self.status_code,
+            "duration_ms": self.duration_ms,
+            "created_at": self.created_at,
+            "samples": self.samples,
+            "formats": self.formats(),
+        }
+
+class SavedProfile:
+    """
+    Perfil concluído, pronto para listagem e download: resumo, pstats e pilhas colapsadas.
+    """
+
+    __slots__ = ("info", "pstats", "collapsed")
+
+    def __init__(self, info: Dict[str, Any], pstats: Optional[bytes], collapsed: Optional[str]) -> None:
+        self.info = info
+        self.pstats = pstats
+        self.collapsed = collapsed
+
+    @classmethod
+    def from_profile(cls, profile: RequestProfile) -> "SavedProfile":
+        return cls({**profile.summary(), "pid": os.getpid()}, profile.pstats_bytes(), profile.collapsed_stacks())
+
+    @property
+    def id(self) -> str:
+        return self.info["id"]
+
+    def pstats_bytes(self) -> Optional[bytes]:
+        return self.pstats
+
+    def collapsed_stacks(self) -> Optional[str]:
+        return self.collapsed
+
+    def summary(self) -> Dict[str, Any]:
+        return self.info
+
+class MemoryProfileStore:
+    """
+    Configuração e perfis do profiler na memória do processo (um único worker).
+    """
+
+    def __init__(self, keep: int = PROFILE_KEEP) -> None:
+        self._config = dict(DEFAULT_CONFIG)
+        self._profiles: Deque[SavedProfile] = deque(maxlen=keep)
+        self._lock = threading.Lock()
+
+    def load_config(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._config)
+
+    def save_config(self, config: Dict[str, Any]) -> None:
+        with self._lock:
+            self._config = dict(config)
+
+    def add(self, profile: SavedProfile) -> Dict[str, Any]:
+        """
+        Guarda o perfil e desconta uma captura do limite; retorna a configuração resultante.
+        """
+        with self._lock:
+            self._profiles.append(profile)
+            self._config = _consume_limit(self._config)
+            return dict(self._config)
+
+    def get(self, profile_id: str) -> Optional[SavedProfile]:
+        with self._lock:
+            return next((profile for profile in self._profiles if profile.id == profile_id), None)
+
+    def list(self) -> List[SavedProfile]:
+        with self._lock:
+            return list(reversed(self._profiles))
+
+class SharedProfileStore:
+    """
+    Configuração e perfis do profiler em um arquivo SQLite no diretório privado do
+    cache compartilhado, visível a todos os workers do host.
+
+    Com o Gunicorn em vários workers, o PUT do administrador atende em um worker
+    e as requisições perfiladas, o GET dos perfis e o download em outros: todos
+    leem a mesma configuração e os mesmos perfis. O limite de capturas é
+    descontado numa transação, de modo que vale para o host e não por worker.
+    """
+
+    def __init__(self, keep: int = PROFILE_KEEP, path: Optional[str] = None) -> None:
+        self.keep = keep
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            if self.path is None:
+                self.path = os.path.join(_private_cache_dir(), "astro_api_profiler.sqlite3")
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS profiler_config ("
+                "id INTEGER PRIMARY KEY CHECK (id = 1), config TEXT NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS profiles ("
+                "id TEXT PRIMARY KEY, created_at REAL NOT NULL, summary TEXT NOT NULL, pstats BLOB, collapsed TEXT)"
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @staticmethod
+    def _read_config(connection: sqlite3.Connection) -> Dict[str, Any]:
+        row = connection.execute("SELECT config FROM profiler_config WHERE id = 1").fetchone()
+        return {**DEFAULT_CONFIG, **json.loads(row[0])} if row else dict(DEFAULT_CONFIG)
+
+    @staticmethod
+    def _write_config(connection: sqlite3.Connection, config: Dict[str, Any]) -> None:
+        connection.execute("INSERT OR REPLACE INTO profiler_config (id, config) VALUES (1, ?)", (json.dumps(config),))
+
+    def load_config(self) -> Dict[str, Any]:
+        return self._read_config(self._connection())
+
+    def save_config(self, config: Dict[str, Any]) -> None:
+        self._write_config(self._connection(), config)
+
+    def add(self, profile: SavedProfile) -> Dict[str, Any]:
+        """
+        Guarda o perfil, descarta os mais antigos além de `keep` e desconta uma captura do limite.
+        """
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO profiles (id, created_at, summary, pstats, collapsed) VALUES (?, ?, ?, ?, ?)",
+                (profile.id, profile.info["created_at"], json.dumps(profile.info), profile.pstats, profile.collapsed)
+            )
+            connection.execute(
+                "DELETE FROM profiles WHERE id IN (SELECT id FROM profiles ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.keep,)
+            )
+            config = _consume_limit(self._read_config(connection))
+            self._write_config(connection, config)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return config
+
+    def get(self, profile_id: str) -> Optional[SavedProfile]:
+        row = self._connection().execute(
+            "SELECT summary, pstats, collapsed FROM profiles WHERE id = ?", (profile_id,)
+        ).fetchone()
+        return SavedProfile(json.loads(row[0]), row[1], row[2]) if row else None
+
+    def list(self) -> List[SavedProfile]:
+        rows = self._connection().execute(
+            "SELECT summary, pstats, collapsed FROM profiles ORDER BY created_at DESC"
+        ).fetchall()
+        return [SavedProfile(json.loads(summary), pstats_data, collapsed) for summary, pstats_data, collapsed in rows]
+
+def _consume_limit(config: Dict[str, Any]) -> Dict[str, Any]:
+    # Uma captura a menos; ao esgotar o limite, o profiler é desligado
+    if config["limit"] is None:
+        return config
+    remaining = config["limit"] - 1
+    if remaining <= 0:
+        return {**config, "enabled": False, "limit": None}
+    return {**config, "limit": remaining}
+
+def make_profile_store(backend: Optional[str] = None) -> Union[MemoryProfileStore, SharedProfileStore]:
+    """
+    Cria o armazenamento do profiler conforme ASTRO_CACHE_BACKEND ('shared' com vários workers).
+    """
+    if (backend or os.getenv("ASTRO_CACHE_BACKEND", "memory")) == "shared":
+        return SharedProfileStore()
+    return MemoryProfileStore()
+
+class ProfilerSwitch:
+    """
+    Estado do profiler: configuração e perfis no armazenamento (do processo ou
+    compartilhado entre os workers) e o perfil em andamento neste processo.
+
+    Apenas uma requisição é perfilada por vez em cada processo; as demais seguem
+    sem perfil. As verificações por requisição leem apenas a configuração em
+    memória; com o armazenamento compartilhado, run_refresh a relê em uma thread
+    a cada ASTRO_PROFILE_CONFIG_TTL segundos, então uma alteração feita em outro
+    worker vale em todos dentro desse intervalo (e, com limite, cada worker pode
+    fazer uma captura a mais nesse intervalo).
+    """
+
+    def __init__(self, store: Optional[Union[MemoryProfileStore, SharedProfileStore]] = None,
+                 config_ttl: float = PROFILE_CONFIG_TTL) -> None:
+        self.store = store if store is not None else make_profile_store()
+        self.config_ttl = config_ttl
+        self._config: Dict[str, Any] = dict(DEFAULT_CONFIG)
+        self._current: Optional[RequestProfile] = None
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self) -> bool:
+        return isinstance(self.store, SharedProfileStore)
+
+    @property
+    def enabled(self) -> bool:
+        return self._config["enabled"]
+
+    def refresh(self) -> Dict[str, Any]:
+        """
+        Relê a configuração do armazenamento (I/O bloqueante: fora do event loop).
+        """
+        self._config = self.store.load_config()
+        return dict(self._config)
+
+    async def run_refresh(self) -> None:
+        """
+        Relê a configuração a cada config_ttl segundos, em uma thread, até ser cancelada.
+        """
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                logger.warning("Falha ao reler a configuração do profiler", extra={"error": f"{type(e).__name__}: {e}"})
+            await asyncio.sleep(max(self.config_ttl, 0.1))
+
+    def configure(self, enabled: bool, mode: str, sample_percent: float, limit: Optional[int] = None) -> None:
+        config = {"enabled": enabled, "mode": mode, "sample_percent": sample_percent, "limit": limit}
+        self.store.save_config(config)
+        self._config = config
+
+    def config(self) -> Dict[str, Any]:
+        # Leitura direta do armazenamento: o administrador vê o estado atual do host
+        return self.refresh()
+
+    def should_profile(self, header_value: Optional[bytes]) -> bool:
+        if header_value == b"1":
+            return True
+        sample_percent = self._config["sample_percent"]
+        return sample_percent > 0 and random.random() * 100 < sample_percent
+
+    def begin(self, method: str, path: str) -> Optional[RequestProfile]:
+        config = self._config
+        with self._lock:
+            if not config["enabled"] or self._current is not None:
+                return None
+            self._current = RequestProfile(method, path, config["mode"])
+            return self._current
+
+    def finish(self, profile: RequestProfile) -> None:
+        """
+        Guarda o perfil concluído e desconta o limite (I/O bloqueante: fora do event loop).
+        """
+        saved = SavedProfile.from_profile(profile)
+        with self._lock:
+            self._current = None
+        self._config = self.store.add(saved)
+
+    def get(self, profile_id: str) -> Optional[SavedProfile]:
+        return self.store.get(profile_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [profile.summary() for profile in self.store.list()]
+
+profiler_switch = ProfilerSwitch()
+
+def run_profiled(func: Callable[[], Any]) -> Any:
+    """
+    Executa func na thread atual, incluindo-a no perfil da requisição, se houver.
+
+    Usado pelos pools de renderização: o ContextVar do perfil acompanha a tarefa até o worker.
+    """
+    profile = active_profile.get()
+    if profile is None:
+        return func()
+
+    ident = threading.get_ident()
+    if profile.mode == "sampling":
+        profile.add_thread(ident)
+        try:
+            return func()
+        finally:
+            profile.remove_thread(ident)
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Outra ferramenta de profiling já ativa nesta thread
+        return func()
+    try:
+        return func()
+    finally:
+        profiler.disable()
+        profile.add_cprofile(profiler)
+
+class ProfilerMiddleware:
+    """
+    Middleware ASGI que perfila as requisições selecionadas pelo profiler_switch.
+
+    A resposta perfilada recebe o cabeçalho X-Profile-Id com o id para download.
+    Como o event loop é compartilhado, o perfil da thread do loop pode incluir
+    trechos de outras requisições concorrentes.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if not profiler_switch.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        header_value = dict(scope["headers"]).get(PROFILE_HEADER)
+        profile = profiler_switch.begin(scope["method"], scope["path"]) if profiler_switch.should_profile(header_value) else None
+        if profile is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_profile_id(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        token = active_profile.set(profile)
+        started_at = time.perf_counter()
+        profiler = None
+        if profile.mode == "sampling":
+            profile.add_thread(threading.get_ident())
+            profile.start_sampling()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profile.add_cprofile(profiler)
+            else:
+                profile.stop_sampling()
+            active_profile.reset(token)
+            profile.duration_ms = round((time.perf_counter() - started_at) * 1000, 2)
+            # Serialização e gravação do perfil fora do event loop
+            await asyncio.to_thread(profiler_switch.finish, profile)
@@ -0,0 +1,158 @@
+"""
+Módulo de cotas por chave de API: limite de requisições e orçamento de custo.
+
+Cada chave tem dois token buckets em memória: um de requisições
+(requests_per_second, burst) e um de custo computacional (cost_per_minute,
+cost_burst), em que cada rota consome o custo de ROUTE_COSTS (uma renderização
+SVG custa mais que uma consulta de posições). A verificação não faz I/O; os
+buckets são por processo (com N workers, o limite efetivo do host é N vezes o
+configurado).
+"""
+import json
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Custo de cada rota no orçamento da chave (rotas não listadas custam DEFAULT_ROUTE_COST)
+ROUTE_COSTS: Dict[str, float] = {
+    "/api/v1/current_transits": 1,           # Consulta de posições
+    "/api/v1/natal_chart": 2,
+    "/api/v1/transits_to_natal": 3,
+    "/api/v1/svg_combined_chart": 6,
+    "/api/v1/svg_combined_chart_base64": 6,
+    "/api/v1/svg_chart": 10,                 # Renderização do Kerykeion
+    "/api/v1/svg_chart_base64": 10,
+    "/api/v1/chart_bundle": 12,
+    "/api/v1/svg_timelapse": 20,             # Busca em intervalo de datas
+    "/api/v1/jobs": 0,                       # Criação de job: cobrada em proporção ao trabalho (app.utils.jobs.job_cost)
+    "/api/v1/sky/stream": 5,                 # Por conexão ao feed do céu, não por mensagem
+    "/api/v1/sky/ws": 5,
+}
+ROUTE_COSTS.update(json.loads(os.getenv("ASTRO_ROUTE_COSTS", "{}")))
+DEFAULT_ROUTE_COST = 1
+
+# Limites padrão das chaves que não definem os próprios
+DEFAULT_LIMITS = {
+    "requests_per_second": float(os.getenv("ASTRO_KEY_RPS", "10")),
+    "burst": float(os.getenv("ASTRO_KEY_BURST", "20")),
+    "cost_per_minute": float(os.getenv("ASTRO_KEY_COST_PER_MINUTE", "600")),
+    "cost_burst": float(os.getenv("ASTRO_KEY_COST_BURST", "100")),
+}
+
+class TokenBucket:
+    """
+    Token bucket: `capacity` fichas, repostas a `rate` fichas por segundo.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Segundos até haver fichas para `amount` (limitado à capacidade, para que
+        um custo maior que o bucket cheio seja aceito e deixe saldo negativo).
+        """
+        missing = min(amount, self.capacity) - self.tokens
+        if missing <= 0:
+            return 0.0
+        return missing / self.rate if self.rate > 0 else math.inf
+
+class KeyQuota:
+    """
+    Cotas de uma chave: bucket de requisições e bucket de custo.
+    """
+
+    def __init__(self, requests_per_second: float, burst: float, cost_per_minute: float, cost_burst: float) -> None:
+        self.requests = TokenBucket(requests_per_second, burst)
+        self.cost = TokenBucket(cost_per_minute / 60, cost_burst)
+        self._lock = threading.Lock()
+
+    def charge(self, cost: float, requests: int = 1) -> Tuple[bool, float, Dict[str, str]]:
+        """
+        Consome `requests` requisições e `cost` do orçamento, se ambos estiverem disponíveis
+        (requests=0 cobra apenas o custo, ex: o trabalho de um job além da própria requisição).
+
+        Returns:
+            (aceita, segundos até poder tentar de novo, cabeçalhos de cota restante)
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.cost.refill(now)
+            wait = max(self.requests.wait_time(requests), self.cost.wait_time(cost))
+            allowed = wait == 0.0
+            if allowed:
+                self.requests.tokens -= requests
+                self.cost.tokens -= cost
+            headers = {
+                "X-RateLimit-Limit": f"{self.requests.capacity:g}",
+                "X-RateLimit-Remaining": str(max(0, math.floor(self.requests.tokens))),
+                "X-Cost-Limit": f"{self.cost.capacity:g}",
+                "X-Cost-Remaining": str(max(0, math.floor(self.cost.tokens))),
+                "X-Request-Cost": f"{cost:g}",
+            }
+            return allowed, wait, headers
+
+    def refund(self, cost: float) -> None:
+        """
+        Devolve `cost` ao orçamento de custo (trabalho cobrado que não será executado).
+        """
+        with self._lock:
+            self.cost.refill(time.monotonic())
+            self.cost.tokens = min(self.cost.capacity, self.cost.tokens + cost)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.cost.refill(now)
+            return {
+                "requests_per_second": self.requests.rate,
+                "burst": self.requests.capacity,
+                "requests_remaining": round(self.requests.tokens, 2),
+                "cost_per_minute": round(self.cost.rate * 60, 2),
+                "cost_burst": self.cost.capacity,
+                "cost_remaining": round(self.cost.tokens, 2),
+            }
+
+def route_cost(path: Optional[str]) -> float:
+    return ROUTE_COSTS.get(path, DEFAULT_ROUTE_COST) if path else DEFAULT_ROUTE_COST
+
+class QuotaHeadersMiddleware:
+    """
+    Middleware ASGI que copia para a resposta os cabeçalhos de cota restante
+    registrados pela verificação da chave (scope['state']['quota_headers']).
+
+    Necessário porque rotas que retornam um Response próprio (SVG, imagens)
+    não recebem os cabeçalhos definidos por dependências.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_quota(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                quota_headers = scope.get("state", {}).get("quota_headers")
+                if quota_headers:
+                    existing = {name for name, _ in message.get("headers", [])}
+                    message["headers"] = [*message.get("headers", []), *(
+                        (name.lower().encode(), value.encode()) for name, value in quota_headers.items()
+                        if name.lower().encode() not in existing
+                    )]
+            await send(message)
+
+        await self.app(scope, receive, send_with_quota)
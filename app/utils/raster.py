@@ -0,0 +1,81 @@
+"""
+Módulo de rasterização de gráficos SVG para PNG e WebP.
+
+A conversão roda no pool de workers de renderização e o resultado é guardado
+em cache por (fingerprint do mapa, tema, formato, largura), de modo que
+miniaturas repetidas são servidas diretamente da memória.
+"""
+import io
+import os
+from typing import Callable, Optional
+
+from app.exceptions import AstroAPIException
+from app.utils.cache import make_cache
+from app.utils.metrics import stage_timer
+from app.utils.render_pool import raster_pool
+
+# Formatos raster suportados e seus media types
+RASTER_MEDIA_TYPES = {
+    "png": "image/png",
+    "webp": "image/webp",
+}
+
+# Cache das imagens raster já geradas
+raster_cache = make_cache("raster", max_items=int(os.getenv("ASTRO_RASTER_CACHE_SIZE", "256")))
+
+def rasterize_svg(svg_content: str, image_format: str, width: Optional[int] = None) -> bytes:
+    """
+    Converte um documento SVG em imagem PNG ou WebP.
+
+    Args:
+        svg_content: Documento SVG
+        image_format: 'png' ou 'webp'
+        width: Largura da imagem em pixels; None mantém o tamanho do SVG
+
+    Returns:
+        Bytes da imagem no formato pedido
+    """
+    try:
+        import resvg_py
+    except ImportError:
+        raise AstroAPIException(status_code=501, detail="Saída raster indisponível: instale o pacote 'resvg-py'")
+
+    with stage_timer("rasterize"):
+        png = bytes(resvg_py.svg_to_bytes(svg_string=svg_content, width=width))
+        if image_format == "png":
+            return png
+
+        try:
+            from PIL import Image
+        except ImportError:
+            raise AstroAPIException(status_code=501, detail="Saída WebP indisponível: instale o pacote 'Pillow'")
+
+        output = io.BytesIO()
+        Image.open(io.BytesIO(png)).save(output, format="WEBP")
+        return output.getvalue()
+
+async def render_raster(fingerprint: str, theme: Optional[str], image_format: str,
+                        width: Optional[int], svg_factory: Callable[[], str]) -> bytes:
+    """
+    Retorna a imagem raster de um gráfico, usando o cache quando possível.
+
+    Em caso de falta no cache, gera o SVG com svg_factory e o rasteriza, ambos
+    em um worker do pool de rasterização.
+
+    Args:
+        fingerprint: Chave que identifica os dados do mapa (ver chart_fingerprint)
+        theme: Tema visual do gráfico
+        image_format: 'png' ou 'webp'
+        width: Largura da imagem em pixels
+        svg_factory: Função sem argumentos que produz o SVG do gráfico
+
+    Returns:
+        Bytes da imagem
+    """
+    key = (fingerprint, theme, image_format, width)
+    with stage_timer("cache"):
+        image = await raster_cache.aget(key)
+    if image is None:
+        image = await raster_pool.run(lambda: rasterize_svg(svg_factory(), image_format, width))
+        await raster_cache.aset(key, image)
+    return image
@@ -0,0 +1,236 @@
+"""
+Módulo do pool de workers para renderizações pesadas (SVG e imagens raster).
+
+Executa as renderizações fora do event loop, em um número fixo de threads e
+com fila limitada, para que um pico de requisições de gráficos não bloqueie
+os demais endpoints. Com a fila cheia, a requisição falha imediatamente com
+429 e um Retry-After estimado a partir do tempo médio de renderização.
+"""
+import asyncio
+import contextvars
+from contextvars import ContextVar
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+from app.exceptions import AstroAPIException
+from app.utils.profiler import run_profiled
+
+# Prazo (time.monotonic) da requisição atual, definido pelo controle de admissão (app.utils.admission)
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+# Peso da última amostra nas médias móveis de espera e execução
+_EWMA_ALPHA = 0.2
+
+# Fragmentos em trânsito entre o worker e a resposta em RenderPool.stream; com a fila cheia
+# o worker espera o cliente, por no máximo STREAM_STALL_SECONDS antes de desistir
+STREAM_QUEUE_SIZE = int(os.getenv("ASTRO_STREAM_QUEUE_SIZE", "32"))
+STREAM_STALL_SECONDS = float(os.getenv("ASTRO_STREAM_STALL_SECONDS", "30"))
+
+# Marca de fim dos fragmentos em RenderPool.stream
+_STREAM_END = object()
+
+class RenderPool:
+    """
+    Pool com número fixo de workers e fila limitada para tarefas de renderização.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: Optional[int] = None) -> None:
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = self._new_executor()
+        self._lock = threading.Lock()
+        self._pending = 0  # Tarefas na fila ou em execução
+        self._running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.expired = 0  # Tarefas descartadas por prazo vencido antes de começar
+        self.avg_wait = 0.0
+        self.avg_run = 0.0
+
+    def _new_executor(self) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{self.name}-worker")
+
+    def _record(self, average: float, sample: float) -> float:
+        return sample if average == 0.0 else average + _EWMA_ALPHA * (sample - average)
+
+    def _execute(self, submitted_at: float, deadline: Optional[float], func: Callable[[], Any]) -> Any:
+        if deadline is not None and time.monotonic() >= deadline:
+            # Ninguém vai ler o resultado: a requisição já passou do prazo enquanto esperava na fila
+            with self._lock:
+                self.expired += 1
+            raise AstroAPIException(status_code=503, detail="Prazo da requisição esgotado na fila de renderização.",
+                                    headers={"Retry-After": str(self.retry_after())})
+        started_at = time.perf_counter()
+        with self._lock:
+            self._running += 1
+            self.avg_wait = self._record(self.avg_wait, started_at - submitted_at)
+        try:
+            return func()
+        finally:
+            with self._lock:
+                self._running -= 1
+                self.completed += 1
+                self.avg_run = self._record(self.avg_run, time.perf_counter() - started_at)
+
+    def _release(self, _future: Future) -> None:
+        # Chamado ao concluir ou cancelar a tarefa, inclusive se ela nunca começou
+        with self._lock:
+            self._pending -= 1
+
+    def retry_after(self) -> int:
+        """
+        Estima em segundos quando haverá espaço na fila, a partir do tempo médio de execução.
+        """
+        with self._lock:
+            queued = max(self._pending - self._running, 0)
+        return max(1, math.ceil(self.avg_run * (queued + 1) / self.max_workers))
+
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Executa func(*args, **kwargs) em um worker do pool e aguarda o resultado.
+
+        Raises:
+            AstroAPIException: 429 com Retry-After se a fila estiver cheia
+        """
+        with self._lock:
+            full = self.max_queue is not None and self._pending >= self.max_workers + self.max_queue
+            if full:
+                self.rejected += 1
+            else:
+                self._pending += 1
+        if full:
+            raise AstroAPIException(
+                status_code=429,
+                detail=f"Fila de renderização '{self.name}' cheia. Tente novamente em instantes.",
+                headers={"Retry-After": str(self.retry_after())}
+            )
+
+        # O contexto (ex: tempos por etapa e perfil da requisição) acompanha a tarefa até o worker
+        context = contextvars.copy_context()
+        task = partial(context.run, run_profiled, partial(func, *args, **kwargs))
+        future = self._executor.submit(self._execute, time.perf_counter(), request_deadline.get(), task)
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    async def stream(self, produce: Callable[[], Iterator[str]]) -> AsyncIterator[bytes]:
+        """
+        Executa o gerador produce() em um worker do pool e entrega cada fragmento, em UTF-8,
+        assim que é produzido, por uma fila limitada.
+
+        Aguarda o primeiro fragmento antes de retornar, para que os erros anteriores a ele
+        (fila cheia, prazo vencido, dados inválidos) sejam levantados antes do início da resposta.
+
+        Returns:
+            Iterador assíncrono dos fragmentos, para StreamingResponse
+
+        Raises:
+            AstroAPIException: 429 com Retry-After se a fila estiver cheia
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        closed = threading.Event()
+
+        def put(item: Any) -> None:
+            # Espera por espaço na fila (cliente lento) sem bloquear o event loop
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+            try:
+                future.result(STREAM_STALL_SECONDS)
+            except FutureTimeoutError:
+                future.cancel()
+                closed.set()
+
+        def produce_chunks() -> None:
+            try:
+                for chunk in produce():
+                    if closed.is_set():
+                        return
+                    put(chunk.encode("utf-8"))
+            finally:
+                if not closed.is_set():
+                    put(_STREAM_END)
+
+        def end_if_not_started(task: asyncio.Future) -> None:
+            # Tarefa recusada ou vencida antes de começar: nada foi enfileirado
+            if task.cancelled() or task.exception() is not None:
+                try:
+                    queue.put_nowait(_STREAM_END)
+                except asyncio.QueueFull:
+                    pass
+
+        task = asyncio.ensure_future(self.run(produce_chunks))
+        task.add_done_callback(end_if_not_started)
+        first = await queue.get()
+        if first is _STREAM_END:
+            # Sem fragmentos: levanta o erro da tarefa, se houver
+            await task
+            return _empty_stream()
+        return self._iter_stream(first, queue, task, closed)
+
+    @staticmethod
+    async def _iter_stream(first: bytes, queue: asyncio.Queue, task: asyncio.Future,
+                           closed: threading.Event) -> AsyncIterator[bytes]:
+        try:
+            yield first
+            while True:
+                item = await queue.get()
+                if item is _STREAM_END:
+                    break
+                yield item
+            # Erro no meio da geração: a resposta já começou e é interrompida
+            await task
+        finally:
+            # Cliente desconectado: libera o worker, que pode estar esperando espaço na fila
+            closed.set()
+            while not queue.empty():
+                queue.get_nowait()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Retorna ocupação da fila, contadores e tempos médios (ms) de espera e execução.
+        """
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queue_depth": max(self._pending - self._running, 0),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "expired": self.expired,
+                "avg_wait_ms": round(self.avg_wait * 1000, 2),
+                "avg_run_ms": round(self.avg_run * 1000, 2),
+            }
+
+    def shutdown(self) -> None:
+        # Um executor novo fica pronto para outro ciclo de vida no mesmo processo (ex: MCP em processo)
+        executor, self._executor = self._executor, self._new_executor()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+async def _empty_stream() -> AsyncIterator[bytes]:
+    return
+    yield
+
+_DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+# Pool das renderizações SVG do Kerykeion, dimensionado por variáveis de ambiente
+svg_pool = RenderPool(
+    "svg",
+    int(os.getenv("ASTRO_SVG_WORKERS", _DEFAULT_WORKERS)),
+    max_queue=int(os.getenv("ASTRO_SVG_QUEUE", "16"))
+)
+
+# Pool de rasterização (PNG/WebP), dimensionado por variáveis de ambiente
+raster_pool = RenderPool(
+    "raster",
+    int(os.getenv("ASTRO_RASTER_WORKERS", _DEFAULT_WORKERS)),
+    max_queue=int(os.getenv("ASTRO_RASTER_QUEUE", "16"))
+)
+
+# Pools expostos no endpoint de status
+render_pools = {pool.name: pool for pool in (svg_pool, raster_pool)}
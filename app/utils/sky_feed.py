@@ -0,0 +1,211 @@
+"""
+Módulo do feed do céu em tempo real (WebSocket e Server-Sent Events).
+
+Uma única tarefa por processo calcula, a cada ASTRO_SKY_TICK_SECONDS, as
+posições atuais dos planetas diretamente no Swiss Ephemeris (sem criar um
+AstrologicalSubject) e detecta mudanças de signo da Lua e aspectos entre os
+planetas que começam ou terminam. Cada mensagem é serializada uma única vez
+(texto JSON para WebSocket e bytes prontos para SSE) e distribuída a todos os
+assinantes.
+
+Cada assinante tem uma fila curta (ASTRO_SKY_SUBSCRIBER_BUFFER mensagens): um
+cliente lento que a deixa encher é desconectado, em vez de acumular mensagens
+na memória do servidor. A tarefa só roda enquanto houver assinantes.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import swisseph as swe
+
+from app.routers.transit_router import TRANSIT_ASPECT_TYPES
+from app.utils.svg_combined_chart import SIGN_SYMBOLS
+from app.utils.svg_timelapse import TIMELAPSE_PLANETS
+
+logger = logging.getLogger(__name__)
+
+SKY_TICK_SECONDS = float(os.getenv("ASTRO_SKY_TICK_SECONDS", "5"))
+SKY_SUBSCRIBER_BUFFER = int(os.getenv("ASTRO_SKY_SUBSCRIBER_BUFFER", "8"))
+
+# Aspectos maiores entre os planetas do céu atual (mesmas orbes dos trânsitos)
+SKY_ASPECTS = {name: TRANSIT_ASPECT_TYPES[name] for name in ("Conjunction", "Opposition", "Trine", "Square", "Sextile")}
+
+class FeedMessage:
+    """
+    Mensagem serializada uma vez: texto JSON (WebSocket) e evento SSE em bytes.
+    """
+
+    __slots__ = ("event", "text", "sse")
+
+    def __init__(self, event: str, payload: Dict[str, Any]) -> None:
+        self.event = event
+        self.text = json.dumps({"type": event, **payload}, ensure_ascii=False, separators=(",", ":"))
+        self.sse = f"event: {event}\ndata: {self.text}\n\n".encode("utf-8")
+
+class Subscriber:
+    """
+    Assinante do feed; `queue` recebe FeedMessage, ou None quando o assinante foi descartado.
+    """
+
+    def __init__(self, buffer: int) -> None:
+        self.queue: "asyncio.Queue[Optional[FeedMessage]]" = asyncio.Queue(maxsize=buffer + 1)
+        self.buffer = buffer
+        self.dropped = False
+
+def _sign(longitude: float) -> str:
+    return list(SIGN_SYMBOLS)[int(longitude // 30) % 12]
+
+def compute_sky(moment: datetime) -> Dict[str, Dict[str, Any]]:
+    """
+    Posições dos planetas no instante dado (UTC).
+
+    Returns:
+        {planeta: {longitude, sign, speed, retrograde}}
+    """
+    hours = moment.hour + moment.minute / 60 + (moment.second + moment.microsecond / 1e6) / 3600
+    julian_day = swe.julday(moment.year, moment.month, moment.day, hours)
+    planets = {}
+    for name, planet_id in TIMELAPSE_PLANETS.items():
+        position = swe.calc_ut(julian_day, planet_id, swe.FLG_SWIEPH | swe.FLG_SPEED)[0]
+        planets[name] = {
+            "longitude": round(position[0], 4), "sign": _sign(position[0]),
+            "speed": round(position[3], 4), "retrograde": position[3] < 0,
+        }
+    return planets
+
+def find_sky_aspects(planets: Dict[str, Dict[str, Any]]) -> Dict[Tuple[str, str, str], float]:
+    """
+    Aspectos maiores dentro da orbe entre os planetas do céu atual.
+
+    Returns:
+        {(planeta 1, planeta 2, aspecto): orbe}
+    """
+    names = list(planets)
+    aspects = {}
+    for index, first in enumerate(names):
+        for second in names[index + 1:]:
+            diff = abs(planets[first]["longitude"] - planets[second]["longitude"])
+            if diff > 180:
+                diff = 360 - diff
+            for aspect_name, (aspect_angle, max_orb) in SKY_ASPECTS.items():
+                orb = abs(diff - aspect_angle)
+                if orb <= max_orb:
+                    aspects[(first, second, aspect_name)] = round(orb, 4)
+    return aspects
+
+class SkyFeed:
+    """
+    Cálculo periódico do céu e distribuição das mensagens aos assinantes.
+    """
+
+    def __init__(self, tick_seconds: float = SKY_TICK_SECONDS, buffer: int = SKY_SUBSCRIBER_BUFFER) -> None:
+        self.tick_seconds = tick_seconds
+        self.buffer = buffer
+        self._subscribers: Set[Subscriber] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._latest: Optional[FeedMessage] = None
+        self._moon_sign: Optional[str] = None
+        self._aspects: Dict[Tuple[str, str, str], float] = {}
+        self.ticks = 0
+        self.messages = 0
+        self.dropped = 0
+
+    def subscribe(self) -> Subscriber:
+        """
+        Registra um assinante, que recebe de imediato as últimas posições calculadas.
+        """
+        subscriber = Subscriber(self.buffer)
+        if self._latest is not None:
+            subscriber.queue.put_nowait(self._latest)
+        self._subscribers.add(subscriber)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.discard(subscriber)
+        if not self._subscribers and self._task is not None:
+            # Sem assinantes, nada a calcular; a próxima assinatura reinicia a tarefa
+            self._task.cancel()
+            self._task = None
+            self._latest = None
+            self._moon_sign = None
+            self._aspects = {}
+
+    def publish(self, message: FeedMessage) -> None:
+        for subscriber in list(self._subscribers):
+            if subscriber.dropped:
+                continue
+            if subscriber.queue.qsize() >= subscriber.buffer:
+                # Cliente lento: descartado em vez de acumular mensagens
+                subscriber.dropped = True
+                self.dropped += 1
+                subscriber.queue.put_nowait(None)
+                continue
+            subscriber.queue.put_nowait(message)
+            self.messages += 1
+
+    def tick(self, moment: datetime) -> List[FeedMessage]:
+        """
+        Calcula o céu no instante dado e gera as mensagens do tick (posições e mudanças).
+        """
+        planets = compute_sky(moment)
+        timestamp = moment.isoformat(timespec="seconds").replace("+00:00", "Z")
+        messages = []
+
+        moon_sign = planets["Moon"]["sign"]
+        if self._moon_sign is not None and moon_sign != self._moon_sign:
+            messages.append(FeedMessage("moon_sign", {"ts": timestamp, "from": self._moon_sign, "to": moon_sign}))
+        self._moon_sign = moon_sign
+
+        aspects = find_sky_aspects(planets)
+        # Mudanças só em relação ao tick anterior desta execução (o estado é zerado sem assinantes)
+        if self._latest is not None:
+            for (first, second, aspect_name) in aspects.keys() - self._aspects.keys():
+                messages.append(FeedMessage("aspect", {"ts": timestamp, "change": "begin", "p1": first, "p2": second,
+                                                       "aspect": aspect_name, "orbit": aspects[(first, second, aspect_name)]}))
+            for (first, second, aspect_name) in self._aspects.keys() - aspects.keys():
+                messages.append(FeedMessage("aspect", {"ts": timestamp, "change": "end", "p1": first, "p2": second,
+                                                       "aspect": aspect_name}))
+        self._aspects = aspects
+
+        self._latest = FeedMessage("positions", {
+            "ts": timestamp, "planets": planets,
+            "aspects": [{"p1": first, "p2": second, "aspect": aspect_name, "orbit": orb}
+                        for (first, second, aspect_name), orb in sorted(aspects.items())],
+        })
+        self.ticks += 1
+        return [self._latest, *messages]
+
+    async def _run(self) -> None:
+        while True:
+            started_at = time.monotonic()
+            try:
+                for message in self.tick(datetime.now(timezone.utc)):
+                    self.publish(message)
+            except Exception as e:
+                logger.exception("Erro no cálculo do feed do céu", extra={"error": f"{type(e).__name__}: {e}"})
+            await asyncio.sleep(max(0.0, self.tick_seconds - (time.monotonic() - started_at)))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for subscriber in list(self._subscribers):
+            if not subscriber.dropped:
+                subscriber.dropped = True
+                subscriber.queue.put_nowait(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"subscribers": len(self._subscribers), "tick_seconds": self.tick_seconds, "buffer": self.buffer,
+                "ticks": self.ticks, "messages_sent": self.messages, "dropped_subscribers": self.dropped}
+
+sky_feed = SkyFeed()
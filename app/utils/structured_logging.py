@@ -0,0 +1,207 @@
+"""
+Módulo de logging estruturado e não bloqueante da API.
+
+Os registros são enfileirados (QueueHandler) e escritos em JSON, uma linha por
+registro, por uma thread em segundo plano (QueueListener); o event loop nunca
+espera pelo stdout. Cada registro leva o id da requisição, método, caminho,
+rota e os tempos por etapa medidos até o momento.
+
+Sob uma rajada de erros ou avisos iguais (ex: o mesmo tz_str inválido enviado
+por um cliente), apenas os primeiros de cada janela são registrados; os demais são
+contados e informados no próximo registro aceito ('suppressed'). Tracebacks
+são mantidos na primeira ocorrência da janela e, nas seguintes, por amostragem.
+
+Configuração por variáveis de ambiente:
+    ASTRO_LOG_LEVEL: nível mínimo (padrão INFO)
+    ASTRO_LOG_LIBRARY_LEVEL: nível mínimo dos loggers de bibliotecas, ex: os avisos
+        por requisição do Kerykeion (padrão WARNING)
+    ASTRO_LOG_QUEUE: tamanho máximo da fila; registros excedentes são descartados (padrão 10000)
+    ASTRO_LOG_RATE_WINDOW: janela do limite de erros repetidos, em segundos (padrão 60)
+    ASTRO_LOG_RATE_BURST: erros/avisos iguais registrados por janela (padrão 5)
+    ASTRO_LOG_TRACEBACK_SAMPLE: fração dos erros repetidos que mantém o traceback (padrão 0.1)
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional, Tuple
+
+LOG_LEVEL = os.getenv("ASTRO_LOG_LEVEL", "INFO").upper()
+LIBRARY_LOG_LEVEL = logging.getLevelName(os.getenv("ASTRO_LOG_LIBRARY_LEVEL", "WARNING").upper())
+LOG_QUEUE_SIZE = int(os.getenv("ASTRO_LOG_QUEUE", "10000"))
+RATE_WINDOW = float(os.getenv("ASTRO_LOG_RATE_WINDOW", "60"))
+RATE_BURST = int(os.getenv("ASTRO_LOG_RATE_BURST", "5"))
+TRACEBACK_SAMPLE = float(os.getenv("ASTRO_LOG_TRACEBACK_SAMPLE", "0.1"))
+# 'stderr' quando o stdout é reservado a outro protocolo (ex: API em processo no servidor MCP via stdio)
+LOG_STREAM = os.getenv("ASTRO_LOG_STREAM", "stdout")
+
+# Contexto da requisição atual (request_id, method, path, route e tempos por etapa),
+# preenchido pelo middleware de métricas e pela TimedRoute
+log_context: ContextVar[Optional[Dict[str, Any]]] = ContextVar("log_context", default=None)
+
+# Loggers da própria API; os demais seguem LIBRARY_LOG_LEVEL
+APP_LOGGERS = ("app", "__main__")
+
+# Atributos padrão de LogRecord; os demais vêm de extra={...} e entram no JSON
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formata o registro como um objeto JSON em uma única linha.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+        if record.exc_info:
+            entry["traceback"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class LibraryLevelFilter(logging.Filter):
+    """
+    Descarta registros de bibliotecas abaixo de LIBRARY_LOG_LEVEL (o Kerykeion,
+    por exemplo, registra no logger raiz a cada subject sem cidade).
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= LIBRARY_LOG_LEVEL or record.name.split(".", 1)[0] in APP_LOGGERS
+
+class RequestContextFilter(logging.Filter):
+    """
+    Copia o contexto da requisição atual para o registro, na thread que o emite.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = log_context.get()
+        if context is not None:
+            for key, value in context.items():
+                if key == "timings":
+                    record.timings_ms = {stage: round(seconds * 1000, 2) for stage, seconds in value.items()
+                                         if not stage.startswith("_")}
+                else:
+                    setattr(record, key, value)
+        return True
+
+class ErrorRateLimitFilter(logging.Filter):
+    """
+    Limita erros e avisos repetidos: por janela, no máximo `burst` registros com
+    a mesma mensagem e tipo de exceção. Nos registros aceitos após o primeiro, o
+    traceback é mantido apenas por amostragem.
+    """
+
+    def __init__(self, window: float = RATE_WINDOW, burst: int = RATE_BURST,
+                 traceback_sample: float = TRACEBACK_SAMPLE) -> None:
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self.traceback_sample = traceback_sample
+        # Chave -> [início da janela, registros aceitos, registros suprimidos]
+        self._windows: Dict[Tuple[Any, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            return True
+        exc_type = record.exc_info[0].__name__ if record.exc_info and record.exc_info[0] else None
+        key = (record.name, record.msg, exc_type)
+        now = time.monotonic()
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None or now - state[0] >= self.window:
+                if len(self._windows) > 10000:
+                    self._windows.clear()
+                suppressed = state[2] if state else 0
+                state = self._windows[key] = [now, 0, 0]
+            else:
+                suppressed = 0
+            if state[1] >= self.burst:
+                state[2] += 1
+                return False
+            state[1] += 1
+            first = state[1] == 1
+        if suppressed:
+            record.suppressed = suppressed
+        if record.exc_info and not first and random.random() >= self.traceback_sample:
+            record.exc_type = exc_type
+            record.exc_info = None
+        return True
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler que nunca bloqueia: com a fila cheia o registro é descartado e contado.
+
+    A formatação (inclusive do traceback) fica para a thread do QueueListener.
+    """
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Fila em memória: o registro não precisa ser serializável, só ter a mensagem resolvida
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_queue_handler: Optional[DroppingQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+def _start_listener() -> None:
+    global _listener
+    output = logging.StreamHandler(sys.stderr if LOG_STREAM == "stderr" else sys.stdout)
+    output.setFormatter(JSONFormatter())
+    _queue_handler.queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _listener = QueueListener(_queue_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+
+def _stop_listener() -> None:
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+def setup_logging() -> None:
+    """
+    Instala o pipeline de logging no logger raiz (uma vez por processo).
+
+    Após um fork (ex: workers do Gunicorn com preload_app), o filho recria a
+    fila e a thread de escrita, que não sobrevivem ao fork.
+    """
+    global _queue_handler
+    if _queue_handler is not None:
+        return
+    _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))  # Fila recriada em _start_listener
+    _queue_handler.addFilter(LibraryLevelFilter())
+    _queue_handler.addFilter(ErrorRateLimitFilter())
+    _queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [_queue_handler]
+    root.setLevel(LOG_LEVEL)
+
+    _start_listener()
+    os.register_at_fork(after_in_child=_start_listener)
+    atexit.register(_stop_listener)
+
+def dropped_records() -> int:
+    """
+    Registros descartados por fila cheia desde o início do processo.
+    """
+    return _queue_handler.dropped if _queue_handler is not None else 0
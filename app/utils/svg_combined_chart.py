@@ -5,9 +5,9 @@ Este módulo implementa uma solução personalizada para gerar SVGs que mostram
 visualmente os aspectos entre um mapa natal e os planetas em trânsito.
 """
 import math
-import svgwrite
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Any, Dict, Iterator, List, Tuple, Optional
+from xml.sax.saxutils import escape
 from kerykeion import AstrologicalSubject
 
 # Constantes para o desenho do SVG
@@ -45,6 +45,164 @@ SIGN_SYMBOLS = {
     "Lib": "♎", "Sco": "♏", "Sag": "♐", "Cap": "♑", "Aqu": "♒", "Pis": "♓"
 }
 
+# Cabeçalho e raiz do documento, idênticos aos emitidos pelo svgwrite.Drawing
+SVG_HEADER = (
+    '<?xml version="1.0" encoding="utf-8" ?>\n'
+    f'<svg baseProfile="full" height="{CHART_SIZE}" version="1.1" width="{CHART_SIZE}" '
+    'xmlns="http://www.w3.org/2000/svg" xmlns:ev="http://www.w3.org/2001/xml-events" '
+    'xmlns:xlink="http://www.w3.org/1999/xlink"><defs />'
+)
+SVG_FOOTER = "</svg>"
+
+# Estilos compartilhados do modo compacto: atributos repetidos viram classes CSS
+_COMPACT_CLASSES = {
+    "d": "stroke:black;stroke-width:1;stroke-dasharray:5,5",
+    "n": "fill:white;stroke:black;stroke-width:1",
+    "t": "fill:lightblue;stroke:blue;stroke-width:1",
+    "l": "font-size:10px;text-anchor:middle;dominant-baseline:middle",
+}
+
+def _aspect_line_style(aspect_name: str) -> Tuple[str, int, Optional[str]]:
+    """
+    Retorna (cor, espessura, tracejado) da linha de um aspecto.
+    """
+    color = ASPECT_COLORS.get(aspect_name, "#999999")  # Cinza como cor padrão
+    
+    # Definir estilo da linha com base no tipo de aspecto
+    stroke_width = 1
+    stroke_dasharray = None
+    
+    if aspect_name in ["Conjunção", "Oposição"]:
+        stroke_width = 2  # Linha mais grossa para aspectos maiores
+    elif aspect_name in ["Trígono", "Sextil"]:
+        stroke_dasharray = "5,3"  # Linha tracejada para aspectos harmônicos
+    elif aspect_name in ["Quadratura", "Quincúncio"]:
+        stroke_dasharray = "2,2"  # Linha pontilhada para aspectos tensos
+    
+    return color, stroke_width, stroke_dasharray
+
+# Classe CSS de cada aspecto no modo compacto
+ASPECT_CLASSES = {aspect_name: f"a{i}" for i, aspect_name in enumerate(ASPECT_COLORS)}
+
+def _build_compact_header() -> str:
+    """
+    Monta o cabeçalho do modo compacto: estilos compartilhados e os glifos de
+    planetas e signos declarados uma única vez como <symbol>.
+    """
+    css = [f".{name}{{{rules}}}" for name, rules in _COMPACT_CLASSES.items()]
+    for aspect_name, class_name in ASPECT_CLASSES.items():
+        color, stroke_width, stroke_dasharray = _aspect_line_style(aspect_name)
+        rules = f"stroke:{color};stroke-width:{stroke_width}"
+        if stroke_dasharray:
+            rules += f";stroke-dasharray:{stroke_dasharray}"
+        css.append(f".{class_name}{{{rules}}}")
+    
+    symbols = []
+    glyph_text = '<text dominant-baseline="middle" font-size="{size}" text-anchor="middle">{glyph}</text>'
+    for sign_name, glyph in SIGN_SYMBOLS.items():
+        symbols.append(f'<symbol id="s-{sign_name}" overflow="visible">'
+                       f'{glyph_text.format(size=24, glyph=glyph)}</symbol>')
+    for planet_name, glyph in PLANET_SYMBOLS.items():
+        symbol_id = planet_name.replace(" ", "_")
+        symbols.append(f'<symbol id="p-{symbol_id}" overflow="visible">'
+                       f'{glyph_text.format(size=16, glyph=glyph)}</symbol>')
+    
+    return (
+        f'<svg height="{CHART_SIZE}" width="{CHART_SIZE}" xmlns="http://www.w3.org/2000/svg" '
+        'xmlns:xlink="http://www.w3.org/1999/xlink">'
+        f'<defs><style>{"".join(css)}</style>{"".join(symbols)}</defs>'
+    )
+
+# Cabeçalho do modo compacto, montado uma vez na importação do módulo
+COMPACT_SVG_HEADER = _build_compact_header()
+
+# Entidades escapadas em valores de atributos (mesmas do ElementTree)
+_ATTR_ENTITIES = {'"': "&quot;", "\n": "&#10;", "\r": "&#13;", "\t": "&#09;"}
+
+class SVGStreamWriter:
+    """
+    Emissor SVG leve baseado em fragmentos de string.
+
+    Substitui a árvore de elementos do svgwrite: cada elemento é serializado
+    imediatamente como uma string já escapada e acumulado até o próximo
+    `flush()`, permitindo enviar o documento em partes enquanto ele é gerado.
+    Os atributos são emitidos em ordem alfabética, como no svgwrite, para
+    manter a saída byte a byte idêntica.
+
+    No modo compacto, números de ponto flutuante são arredondados para duas
+    casas decimais.
+    """
+
+    def __init__(self, compact: bool = False) -> None:
+        self.compact = compact
+        self._chunks: List[str] = []
+
+    def _format_value(self, value: Any) -> str:
+        if self.compact and isinstance(value, float):
+            return f"{value:.2f}".rstrip("0").rstrip(".")
+        return str(value)
+
+    def element(self, tag: str, text: Optional[str] = None, **attribs: Any) -> None:
+        """
+        Serializa um elemento SVG.
+
+        Args:
+            tag: Nome do elemento (ex: 'circle', 'text')
+            text: Conteúdo textual do elemento, se houver
+            **attribs: Atributos no estilo do svgwrite ('stroke_width' -> 'stroke-width')
+        """
+        parts = [f"<{tag}", self._attributes(attribs)]
+        if text is None:
+            parts.append(" />")
+        else:
+            parts.append(f">{escape(str(text))}</{tag}>")
+        self._chunks.append("".join(parts))
+
+    def _attributes(self, attribs: Dict[str, Any]) -> str:
+        parts = []
+        for key, value in sorted((k.rstrip("_").replace("_", "-"), v) for k, v in attribs.items()):
+            if value is None:
+                continue
+            value = self._format_value(value)
+            if value:
+                parts.append(f' {key}="{escape(value, _ATTR_ENTITIES)}"')
+        return "".join(parts)
+
+    def open_element(self, tag: str, text: Optional[str] = None, **attribs: Any) -> None:
+        """
+        Abre um elemento contêiner (ex: 'g') cujos filhos serão emitidos em seguida.
+        O conteúdo textual opcional é emitido logo após a tag de abertura.
+        """
+        self._chunks.append(f"<{tag}{self._attributes(attribs)}>")
+        if text is not None:
+            self._chunks.append(escape(str(text)))
+
+    def close_element(self, tag: str) -> None:
+        self._chunks.append(f"</{tag}>")
+
+    def rect(self, insert: Tuple[float, float], size: Tuple[float, float], **attribs: Any) -> None:
+        self.element("rect", x=insert[0], y=insert[1], width=size[0], height=size[1], **attribs)
+
+    def circle(self, center: Tuple[float, float], r: float, **attribs: Any) -> None:
+        self.element("circle", cx=center[0], cy=center[1], r=r, **attribs)
+
+    def line(self, start: Tuple[float, float], end: Tuple[float, float], **attribs: Any) -> None:
+        self.element("line", x1=start[0], y1=start[1], x2=end[0], y2=end[1], **attribs)
+
+    def text(self, text: str, insert: Tuple[float, float], **attribs: Any) -> None:
+        self.element("text", text, x=insert[0], y=insert[1], **attribs)
+
+    def use(self, href: str, insert: Tuple[float, float], **attribs: Any) -> None:
+        self.element("use", x=insert[0], y=insert[1], **{"xlink:href": href}, **attribs)
+
+    def flush(self) -> str:
+        """
+        Retorna os fragmentos acumulados desde a última chamada e esvazia o buffer.
+        """
+        chunk = "".join(self._chunks)
+        self._chunks.clear()
+        return chunk
+
 def calculate_point_on_circle(center_x: float, center_y: float, radius: float, angle_deg: float) -> Tuple[float, float]:
     """
     Calcula as coordenadas de um ponto em um círculo dado o ângulo em graus.
@@ -85,22 +243,25 @@ def draw_zodiac_wheel(dwg, center_x: float, center_y: float, radius: float):
     Desenha o círculo zodiacal com os 12 signos.
     
     Args:
-        dwg: Objeto SVG do svgwrite
+        dwg: Emissor SVGStreamWriter
         center_x: Coordenada X do centro do círculo
         center_y: Coordenada Y do centro do círculo
         radius: Raio do círculo zodiacal
     """
     # Desenhar círculo externo do zodíaco
-    dwg.add(dwg.circle(center=(center_x, center_y), r=radius, 
-                      fill='none', stroke='black', stroke_width=2))
+    dwg.circle(center=(center_x, center_y), r=radius, 
+                      fill='none', stroke='black', stroke_width=2)
     
     # Desenhar divisões dos signos (cada 30 graus)
     for i in range(12):
         angle_deg = i * 30
         start_point = calculate_point_on_circle(center_x, center_y, radius, angle_deg)
         end_point = (center_x, center_y)
-        dwg.add(dwg.line(start=start_point, end=end_point, 
-                        stroke='black', stroke_width=1, stroke_dasharray="5,5"))
+        if dwg.compact:
+            dwg.line(start=start_point, end=end_point, class_="d")
+        else:
+            dwg.line(start=start_point, end=end_point, 
+                            stroke='black', stroke_width=1, stroke_dasharray="5,5")
         
         # Adicionar símbolo do signo
         sign_angle = angle_deg + 15  # Centro do signo (15° dentro do setor de 30°)
@@ -108,8 +269,11 @@ def draw_zodiac_wheel(dwg, center_x: float, center_y: float, radius: float):
         sign_name = list(SIGN_SYMBOLS.keys())[i]
         sign_symbol = SIGN_SYMBOLS[sign_name]
         
-        dwg.add(dwg.text(sign_symbol, insert=sign_point, 
-                        font_size=24, text_anchor="middle", dominant_baseline="middle"))
+        if dwg.compact:
+            dwg.use(f"#s-{sign_name}", insert=sign_point)
+        else:
+            dwg.text(sign_symbol, insert=sign_point, 
+                            font_size=24, text_anchor="middle", dominant_baseline="middle")
 
 def draw_planet(dwg, center_x: float, center_y: float, radius: float, 
                planet, is_transit: bool = False):
@@ -117,7 +281,7 @@ def draw_planet(dwg, center_x: float, center_y: float, radius: float,
     Desenha um planeta no gráfico.
     
     Args:
-        dwg: Objeto SVG do svgwrite
+        dwg: Emissor SVGStreamWriter
         center_x: Coordenada X do centro do círculo
         center_y: Coordenada Y do centro do círculo
         radius: Raio para posicionar o planeta
@@ -131,23 +295,35 @@ def draw_planet(dwg, center_x: float, center_y: float, radius: float,
     color = "blue" if is_transit else "black"
     bg_color = "lightblue" if is_transit else "white"
     
-    # Desenhar círculo de fundo para o planeta
-    dwg.add(dwg.circle(center=position, r=12, 
-                      fill=bg_color, stroke=color, stroke_width=1))
-    
     # Adicionar símbolo do planeta
     planet_name = planet.name.split()[0]  # Pegar apenas a primeira palavra (ex: "Sun" de "Sun in Aries")
     symbol = PLANET_SYMBOLS.get(planet_name, "?")
+    label_position = calculate_point_on_circle(position[0], position[1], 20, angle)
+    
+    if dwg.compact:
+        # Glifo referenciado do <symbol> declarado no cabeçalho; a cor é herdada do <use>
+        fill = color if is_transit else None
+        dwg.circle(center=position, r=12, class_="t" if is_transit else "n")
+        if planet_name in PLANET_SYMBOLS:
+            dwg.use(f"#p-{planet_name}", insert=position, fill=fill)
+        else:
+            dwg.text(symbol, insert=position, font_size=16, text_anchor="middle",
+                     dominant_baseline="middle", fill=fill)
+        dwg.text(planet_name, insert=label_position, class_="l", fill=fill)
+        return position, planet_name
     
-    dwg.add(dwg.text(symbol, insert=position, 
+    # Desenhar círculo de fundo para o planeta
+    dwg.circle(center=position, r=12, 
+                      fill=bg_color, stroke=color, stroke_width=1)
+    
+    dwg.text(symbol, insert=position, 
                     font_size=16, text_anchor="middle", dominant_baseline="middle",
-                    fill=color))
+                    fill=color)
     
     # Adicionar pequeno texto com o nome do planeta para legenda
-    label_position = calculate_point_on_circle(position[0], position[1], 20, angle)
-    dwg.add(dwg.text(planet_name, insert=label_position, 
+    dwg.text(planet_name, insert=label_position, 
                     font_size=10, text_anchor="middle", dominant_baseline="middle",
-                    fill=color))
+                    fill=color)
     
     return position, planet_name
 
@@ -157,58 +333,54 @@ def draw_aspect_line(dwg, start_pos: Tuple[float, float], end_pos: Tuple[float,
     Desenha uma linha de aspecto entre dois planetas.
     
     Args:
-        dwg: Objeto SVG do svgwrite
+        dwg: Emissor SVGStreamWriter
         start_pos: Posição (x, y) do primeiro planeta
         end_pos: Posição (x, y) do segundo planeta
         aspect_name: Nome do aspecto (ex: "Conjunção", "Trígono")
     """
-    color = ASPECT_COLORS.get(aspect_name, "#999999")  # Cinza como cor padrão
-    
-    # Definir estilo da linha com base no tipo de aspecto
-    stroke_width = 1
-    stroke_dasharray = None
-    
-    if aspect_name in ["Conjunção", "Oposição"]:
-        stroke_width = 2  # Linha mais grossa para aspectos maiores
-    elif aspect_name in ["Trígono", "Sextil"]:
-        stroke_dasharray = "5,3"  # Linha tracejada para aspectos harmônicos
-    elif aspect_name in ["Quadratura", "Quincúncio"]:
-        stroke_dasharray = "2,2"  # Linha pontilhada para aspectos tensos
+    if dwg.compact and aspect_name in ASPECT_CLASSES:
+        dwg.line(start=start_pos, end=end_pos, class_=ASPECT_CLASSES[aspect_name])
+        return
     
-    # Desenhar a linha de aspecto
-    line = dwg.line(start=start_pos, end=end_pos, stroke=color, stroke_width=stroke_width)
-    if stroke_dasharray:
-        line.attribs["stroke-dasharray"] = stroke_dasharray
+    color, stroke_width, stroke_dasharray = _aspect_line_style(aspect_name)
     
-    dwg.add(line)
+    # Desenhar a linha de aspecto (stroke-dasharray só é emitido quando definido)
+    dwg.line(start=start_pos, end=end_pos, stroke=color, stroke_width=stroke_width,
+             stroke_dasharray=stroke_dasharray)
 
-def create_combined_chart_svg(natal_subject: AstrologicalSubject, 
-                             transit_subject: AstrologicalSubject,
-                             output_path: Path) -> str:
+def iter_combined_chart_svg(natal_subject: AstrologicalSubject,
+                            transit_subject: AstrologicalSubject,
+                            compact: bool = False) -> Iterator[str]:
     """
-    Cria um SVG combinado mostrando o mapa natal e os trânsitos com aspectos.
+    Gera o SVG combinado do mapa natal com trânsitos como uma sequência de fragmentos.
+    
+    Cada seção do gráfico (cabeçalho, roda zodiacal, planetas, aspectos e legenda)
+    é emitida assim que fica pronta, o que permite enviá-la com StreamingResponse
+    antes do fim da renderização.
     
     Args:
         natal_subject: Objeto AstrologicalSubject do mapa natal
         transit_subject: Objeto AstrologicalSubject dos trânsitos
-        output_path: Caminho para salvar o arquivo SVG
+        compact: Se True, emite a saída compacta (glifos como <symbol>/<use>,
+            estilos em classes CSS e coordenadas com duas casas decimais)
         
-    Returns:
-        Caminho do arquivo SVG gerado
+    Yields:
+        Fragmentos de texto SVG; a concatenação forma o documento completo
     """
-    # Criar o objeto SVG
-    dwg = svgwrite.Drawing(str(output_path), size=(CHART_SIZE, CHART_SIZE))
+    dwg = SVGStreamWriter(compact=compact)
+    yield COMPACT_SVG_HEADER if compact else SVG_HEADER
     
     # Adicionar retângulo de fundo branco para melhor visualização
-    dwg.add(dwg.rect(insert=(0, 0), size=(CHART_SIZE, CHART_SIZE), fill='white'))
+    dwg.rect(insert=(0, 0), size=(CHART_SIZE, CHART_SIZE), fill='white')
     
     # Adicionar título
     title = f"{natal_subject.name} - Mapa Natal com Trânsitos de {transit_subject.name}"
-    dwg.add(dwg.text(title, insert=(CHART_SIZE/2, 30), 
-                    font_size=20, text_anchor="middle", font_weight="bold"))
+    dwg.text(title, insert=(CHART_SIZE/2, 30), 
+                    font_size=20, text_anchor="middle", font_weight="bold")
     
     # Desenhar o círculo zodiacal
     draw_zodiac_wheel(dwg, CHART_CENTER, CHART_CENTER, ZODIAC_RADIUS)
+    yield dwg.flush()
     
     # Dicionário para armazenar posições dos planetas para desenhar aspectos depois
     planet_positions = {}
@@ -240,6 +412,7 @@ def create_combined_chart_svg(natal_subject: AstrologicalSubject,
             continue
         position, name = draw_planet(dwg, CHART_CENTER, CHART_CENTER, PLANET_RADIUS_TRANSIT, planet, is_transit=True)
         planet_positions[f"transit_{name}"] = position
+    yield dwg.flush()
     
     # Definir aspectos e suas orbes
     aspect_types = {
@@ -289,32 +462,67 @@ def create_combined_chart_svg(natal_subject: AstrologicalSubject,
                     if start_pos and end_pos:
                         draw_aspect_line(dwg, start_pos, end_pos, aspect_name)
     
+    yield dwg.flush()
+    
     # Adicionar legenda
     legend_y = CHART_SIZE - 120
-    dwg.add(dwg.text("Legenda:", insert=(50, legend_y), font_size=16, font_weight="bold"))
+    dwg.text("Legenda:", insert=(50, legend_y), font_size=16, font_weight="bold")
     
     # Legenda para planetas
-    dwg.add(dwg.text("Planetas Natais:", insert=(50, legend_y + 25), font_size=14))
-    dwg.add(dwg.circle(center=(70, legend_y + 45), r=8, fill="white", stroke="black"))
+    dwg.text("Planetas Natais:", insert=(50, legend_y + 25), font_size=14)
+    dwg.circle(center=(70, legend_y + 45), r=8, fill="white", stroke="black")
     
-    dwg.add(dwg.text("Planetas em Trânsito:", insert=(50, legend_y + 65), font_size=14))
-    dwg.add(dwg.circle(center=(70, legend_y + 85), r=8, fill="lightblue", stroke="blue"))
+    dwg.text("Planetas em Trânsito:", insert=(50, legend_y + 65), font_size=14)
+    dwg.circle(center=(70, legend_y + 85), r=8, fill="lightblue", stroke="blue")
     
     # Legenda para aspectos
     aspect_legend_x = 250
-    dwg.add(dwg.text("Aspectos:", insert=(aspect_legend_x, legend_y + 25), font_size=14))
+    dwg.text("Aspectos:", insert=(aspect_legend_x, legend_y + 25), font_size=14)
     
     y_offset = 45
     for aspect_name, color in list(ASPECT_COLORS.items())[:6]:  # Mostrar apenas os principais aspectos
-        dwg.add(dwg.line(start=(aspect_legend_x, legend_y + y_offset), 
+        dwg.line(start=(aspect_legend_x, legend_y + y_offset), 
                         end=(aspect_legend_x + 40, legend_y + y_offset), 
-                        stroke=color, stroke_width=2))
-        dwg.add(dwg.text(aspect_name, insert=(aspect_legend_x + 50, legend_y + y_offset + 5), 
-                        font_size=12))
+                        stroke=color, stroke_width=2)
+        dwg.text(aspect_name, insert=(aspect_legend_x + 50, legend_y + y_offset + 5), 
+                        font_size=12)
         y_offset += 20
     
-    # Salvar o SVG
-    dwg.save()
+    yield dwg.flush() + SVG_FOOTER
+
+def render_combined_chart_svg(natal_subject: AstrologicalSubject,
+                              transit_subject: AstrologicalSubject,
+                              compact: bool = False) -> str:
+    """
+    Renderiza o SVG combinado completo em memória.
+    
+    Args:
+        natal_subject: Objeto AstrologicalSubject do mapa natal
+        transit_subject: Objeto AstrologicalSubject dos trânsitos
+        compact: Se True, emite a saída compacta
+        
+    Returns:
+        Documento SVG como string
+    """
+    return "".join(iter_combined_chart_svg(natal_subject, transit_subject, compact))
+
+def create_combined_chart_svg(natal_subject: AstrologicalSubject, 
+                             transit_subject: AstrologicalSubject,
+                             output_path: Path) -> str:
+    """
+    Cria um SVG combinado mostrando o mapa natal e os trânsitos com aspectos.
+    
+    Args:
+        natal_subject: Objeto AstrologicalSubject do mapa natal
+        transit_subject: Objeto AstrologicalSubject dos trânsitos
+        output_path: Caminho para salvar o arquivo SVG
+        
+    Returns:
+        Caminho do arquivo SVG gerado
+    """
+    with open(output_path, "w", encoding="utf-8") as svg_file:
+        for chunk in iter_combined_chart_svg(natal_subject, transit_subject):
+            svg_file.write(chunk)
     
     return str(output_path)
 
@@ -0,0 +1,117 @@
+"""
+Módulo para geração de SVG animado (time-lapse) dos trânsitos sobre um mapa natal.
+
+A roda zodiacal e os planetas natais são emitidos uma única vez; apenas as
+posições dos planetas em trânsito são animadas com SMIL (<animateTransform>),
+de modo que um mês inteiro de céu cabe em um único documento.
+"""
+from typing import Dict, Iterator, List
+
+import swisseph as swe
+from kerykeion import AstrologicalSubject
+
+from app.utils.svg_combined_chart import (
+    CHART_CENTER, CHART_SIZE, COMPACT_SVG_HEADER, PLANET_RADIUS_NATAL, PLANET_RADIUS_TRANSIT,
+    PLANET_SYMBOLS, SVG_FOOTER, SVG_HEADER, ZODIAC_RADIUS, SVGStreamWriter,
+    calculate_point_on_circle, draw_planet, draw_zodiac_wheel
+)
+
+# Identificadores do Swiss Ephemeris dos planetas animados (mesma ordem do gráfico combinado)
+TIMELAPSE_PLANETS = {
+    "Sun": swe.SUN, "Moon": swe.MOON, "Mercury": swe.MERCURY, "Venus": swe.VENUS,
+    "Mars": swe.MARS, "Jupiter": swe.JUPITER, "Saturn": swe.SATURN,
+    "Uranus": swe.URANUS, "Neptune": swe.NEPTUNE, "Pluto": swe.PLUTO,
+}
+
+# Número máximo de quadros por animação
+MAX_TIMELAPSE_FRAMES = 1000
+
+def compute_transit_longitudes(start_julian_day: float, step_hours: float, frames: int) -> Dict[str, List[float]]:
+    """
+    Calcula as longitudes de todos os planetas em todos os quadros de uma vez.
+
+    Chama o Swiss Ephemeris diretamente para cada (planeta, quadro), sem criar
+    um AstrologicalSubject por quadro (casas, pontos e aspectos não são
+    necessários para a animação).
+
+    Args:
+        start_julian_day: Dia juliano (UT) do primeiro quadro
+        step_hours: Intervalo entre quadros em horas
+        frames: Número de quadros
+
+    Returns:
+        Dicionário {planeta: [longitude absoluta em cada quadro]}
+    """
+    julian_days = [start_julian_day + i * step_hours / 24 for i in range(frames)]
+    return {
+        planet_name: [swe.calc_ut(julian_day, planet_id, swe.FLG_SWIEPH)[0][0] for julian_day in julian_days]
+        for planet_name, planet_id in TIMELAPSE_PLANETS.items()
+    }
+
+def _frame_key_times(index: int, frames: int) -> str:
+    # Instantes (0-1) em que o rótulo do quadro aparece e some
+    start = index / frames
+    end = (index + 1) / frames
+    if index == 0:
+        return f"0;{end:.4f}"
+    return f"0;{start:.4f};{end:.4f}"
+
+def iter_timelapse_svg(natal_subject: AstrologicalSubject, longitudes: Dict[str, List[float]],
+                       frame_labels: List[str], frame_seconds: float = 0.2,
+                       compact: bool = True) -> Iterator[str]:
+    """
+    Gera o SVG animado dos trânsitos como uma sequência de fragmentos.
+
+    Args:
+        natal_subject: Objeto AstrologicalSubject do mapa natal
+        longitudes: Longitudes dos planetas em trânsito por quadro (ver compute_transit_longitudes)
+        frame_labels: Rótulo (data/hora) de cada quadro
+        frame_seconds: Duração de cada quadro em segundos
+        compact: Se True, usa a saída compacta do gráfico combinado
+
+    Yields:
+        Fragmentos de texto SVG; a concatenação forma o documento completo
+    """
+    frames = len(frame_labels)
+    duration = f"{frames * frame_seconds:g}s"
+    dwg = SVGStreamWriter(compact=compact)
+    yield COMPACT_SVG_HEADER if compact else SVG_HEADER
+
+    # Parte estática: fundo, título, roda zodiacal e planetas natais
+    dwg.rect(insert=(0, 0), size=(CHART_SIZE, CHART_SIZE), fill='white')
+    dwg.text(f"{natal_subject.name} - Trânsitos {frame_labels[0]} a {frame_labels[-1]}",
+             insert=(CHART_SIZE/2, 30), font_size=20, text_anchor="middle", font_weight="bold")
+    draw_zodiac_wheel(dwg, CHART_CENTER, CHART_CENTER, ZODIAC_RADIUS)
+    for planet_name in TIMELAPSE_PLANETS:
+        planet = getattr(natal_subject, planet_name.lower(), None)
+        if planet and hasattr(planet, 'abs_pos'):
+            draw_planet(dwg, CHART_CENTER, CHART_CENTER, PLANET_RADIUS_NATAL, planet, is_transit=False)
+    yield dwg.flush()
+
+    # Planetas em trânsito: desenhados na origem e deslocados quadro a quadro
+    for planet_name, planet_longitudes in longitudes.items():
+        points = [calculate_point_on_circle(CHART_CENTER, CHART_CENTER, PLANET_RADIUS_TRANSIT, longitude)
+                  for longitude in planet_longitudes]
+        values = ";".join(f"{x:.2f},{y:.2f}" for x, y in points)
+        dwg.open_element("g")
+        if dwg.compact:
+            dwg.circle(center=(0, 0), r=12, class_="t")
+            dwg.use(f"#p-{planet_name}", insert=(0, 0), fill="blue")
+        else:
+            dwg.circle(center=(0, 0), r=12, fill="lightblue", stroke="blue", stroke_width=1)
+            dwg.text(PLANET_SYMBOLS[planet_name], insert=(0, 0), font_size=16, text_anchor="middle",
+                     dominant_baseline="middle", fill="blue")
+        dwg.element("animateTransform", attributeName="transform", type="translate", values=values,
+                    dur=duration, repeatCount="indefinite", calcMode="linear")
+        dwg.close_element("g")
+        yield dwg.flush()
+
+    # Rótulo de data: um texto por quadro, visível apenas durante o seu intervalo
+    for index, label in enumerate(frame_labels):
+        dwg.open_element("text", label, x=CHART_SIZE/2, y=CHART_SIZE - 30, font_size=14,
+                         text_anchor="middle", visibility="hidden")
+        dwg.element("animate", attributeName="visibility", calcMode="discrete",
+                    values="visible;hidden" if index == 0 else "hidden;visible;hidden",
+                    keyTimes=_frame_key_times(index, frames), dur=duration, repeatCount="indefinite")
+        dwg.close_element("text")
+    yield dwg.flush() + SVG_FOOTER
@@ -0,0 +1,165 @@
+"""
+Módulo de captura de tráfego para replay (ver benchmarks/replay_traffic.py).
+
+Opcional: ativado com ASTRO_CAPTURE=1. Registra, para cada requisição às rotas
+/api/v1/*, o corpo anonimizado, o status, a duração e o tamanho da resposta em
+um arquivo JSONL (ASTRO_CAPTURE_PATH, padrão traffic_capture.jsonl). A escrita
+é feita por uma thread em segundo plano; com a fila cheia o registro é descartado.
+
+Anonimização dos corpos JSON:
+    - nomes viram um pseudônimo (hash com sal aleatório por processo, não reversível);
+    - latitude e longitude são arredondadas para 1 casa decimal (~11 km);
+    - o minuto de nascimento é zerado; cidade e país são removidos.
+Cabeçalhos (inclusive a chave de API) nunca são registrados, e parâmetros de
+query com nome de credencial (ex: 'api_key' das rotas de streaming) são removidos.
+"""
+import hashlib
+import json
+import os
+import queue
+import random
+import re
+import secrets
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode
+
+CAPTURE_ENABLED = os.getenv("ASTRO_CAPTURE", "0") == "1"
+CAPTURE_PATH = os.getenv("ASTRO_CAPTURE_PATH", "traffic_capture.jsonl")
+CAPTURE_SAMPLE = float(os.getenv("ASTRO_CAPTURE_SAMPLE", "1.0"))
+CAPTURE_PREFIX = "/api/v1/"
+
+# Campos removidos e campos pseudonimizados dos corpos capturados
+_DROPPED_FIELDS = {"city", "nation"}
+_NAME_FIELDS = {"name"}
+_COORDINATE_FIELDS = {"latitude", "longitude", "lat", "lng"}
+# Parâmetros de query removidos: chaves, tokens, segredos, senhas e assinaturas
+_CREDENTIAL_PARAM = re.compile(r"key|token|secret|passw|signature|auth|credential", re.IGNORECASE)
+
+_SALT = secrets.token_bytes(16)
+
+def _pseudonym(value: str) -> str:
+    return "anon-" + hashlib.blake2b(value.encode(), key=_SALT, digest_size=4).hexdigest()
+
+def anonymize(value: Any) -> Any:
+    """
+    Anonimiza recursivamente um corpo JSON de requisição, preservando a forma
+    e o custo computacional (mesmos tipos de gráfico, datas e fusos).
+    """
+    if isinstance(value, list):
+        return [anonymize(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    result = {}
+    for key, item in value.items():
+        if key in _DROPPED_FIELDS:
+            continue
+        if key in _NAME_FIELDS and isinstance(item, str):
+            result[key] = _pseudonym(item)
+        elif key in _COORDINATE_FIELDS and isinstance(item, (int, float)):
+            result[key] = round(item, 1)
+        elif key == "minute" and isinstance(item, int):
+            result[key] = 0
+        else:
+            result[key] = anonymize(item)
+    return result
+
+def redact_query(query_string: bytes) -> str:
+    """
+    Remove da query string os parâmetros cujo nome indica uma credencial.
+    """
+    if not query_string:
+        return ""
+    params = parse_qsl(query_string.decode("latin-1"), keep_blank_values=True)
+    return urlencode([(name, value) for name, value in params if not _CREDENTIAL_PARAM.search(name)])
+
+class CaptureWriter:
+    """
+    Escreve as linhas JSONL em uma thread própria, iniciada sob demanda
+    (também após um fork, como nos workers do Gunicorn).
+    """
+
+    def __init__(self, path: str, max_queue: int = 10000) -> None:
+        self.path = path
+        self.max_queue = max_queue
+        self.dropped = 0
+        self._queue: Optional[queue.Queue] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> queue.Queue:
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue(maxsize=self.max_queue)
+                    threading.Thread(target=self._run, args=(self._queue,), name="traffic-capture", daemon=True).start()
+                    self._pid = os.getpid()
+        return self._queue
+
+    def _run(self, lines: queue.Queue) -> None:
+        with open(self.path, "a", encoding="utf-8") as output:
+            while True:
+                output.write(lines.get())
+                # Agrupa as linhas já enfileiradas em uma única escrita
+                while not lines.empty():
+                    output.write(lines.get_nowait())
+                output.flush()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        try:
+            self._ensure_started().put_nowait(json.dumps(record, ensure_ascii=False) + "\n")
+        except queue.Full:
+            self.dropped += 1
+
+capture_writer = CaptureWriter(CAPTURE_PATH)
+
+class TrafficCaptureMiddleware:
+    """
+    Middleware ASGI que registra as requisições /api/v1/* no arquivo de captura.
+    """
+
+    def __init__(self, app: Any, writer: CaptureWriter = capture_writer, sample: float = CAPTURE_SAMPLE) -> None:
+        self.app = app
+        self.writer = writer
+        self.sample = sample
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(CAPTURE_PREFIX) or random.random() >= self.sample:
+            await self.app(scope, receive, send)
+            return
+
+        body_chunks: List[bytes] = []
+        response: Dict[str, Any] = {"status": None, "bytes": 0}
+        started_at = time.perf_counter()
+
+        async def capture_receive() -> Dict[str, Any]:
+            message = await receive()
+            if message["type"] == "http.request":
+                body_chunks.append(message.get("body", b""))
+            return message
+
+        async def capture_send(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            try:
+                body = anonymize(json.loads(b"".join(body_chunks))) if body_chunks and any(body_chunks) else None
+            except ValueError:
+                body = None  # Corpo não-JSON: registra apenas a rota e os tempos
+            self.writer.write({
+                "ts": round(time.time(), 3),
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": redact_query(scope.get("query_string", b"")),
+                "status": response["status"],
+                "duration_ms": round((time.perf_counter() - started_at) * 1000, 2),
+                "response_bytes": response["bytes"],
+                "body": body,
+            })
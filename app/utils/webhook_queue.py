@@ -0,0 +1,400 @@
+"""
+Módulo da fila de webhooks: spool durável em SQLite, consumo em lotes e
+despacho por tipo de evento.
+
+O endpoint /webhook autentica o parceiro, valida o envelope e grava o evento
+no spool (ASTRO_WEBHOOK_SPOOL), respondendo 202; com WEBHOOK_MAX_PENDING
+eventos aguardando, responde 503 em vez de crescer o spool. Cada evento tem uma chave de
+idempotência única por parceiro (cabeçalho Idempotency-Key, 'id' do evento ou
+hash do corpo): reenvios do parceiro dentro do período de retenção são
+ignorados, sem nova cobrança da cota, e ids iguais de parceiros diferentes não
+colidem.
+
+Um consumidor em segundo plano por worker retira lotes do spool, despacha cada
+evento ao handler registrado para o seu tipo (register_handler) e marca o
+resultado. Falhas são refeitas com espera exponencial até WEBHOOK_MAX_ATTEMPTS;
+eventos retirados por um processo que morreu voltam à fila após o prazo de
+concessão (WEBHOOK_LEASE_SECONDS), então um reinício não perde eventos. Durante
+um lote, a concessão dos eventos ainda não processados é renovada e cada evento
+executado é marcado como concluído ao terminar, de modo que um lote demorado
+nunca é retomado por outro worker; quando um handler adia um evento (servidor
+ocupado), o restante do lote é adiado de uma vez.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_SPOOL_PATH = os.getenv("ASTRO_WEBHOOK_SPOOL", "webhook_spool.sqlite3")
+WEBHOOK_BATCH_SIZE = int(os.getenv("ASTRO_WEBHOOK_BATCH_SIZE", "50"))
+WEBHOOK_POLL_SECONDS = float(os.getenv("ASTRO_WEBHOOK_POLL_SECONDS", "2"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("ASTRO_WEBHOOK_MAX_ATTEMPTS", "5"))
+WEBHOOK_LEASE_SECONDS = float(os.getenv("ASTRO_WEBHOOK_LEASE_SECONDS", "300"))
+# Limite de eventos aguardando processamento (pending + processing); acima dele o endpoint responde 503
+WEBHOOK_MAX_PENDING = int(os.getenv("ASTRO_WEBHOOK_MAX_PENDING", "10000"))
+# Eventos concluídos ficam no spool por este período para a deduplicação
+WEBHOOK_RETENTION_SECONDS = float(os.getenv("ASTRO_WEBHOOK_RETENTION_HOURS", "24")) * 3600
+
+# Campo do payload gravado no spool com o parceiro autenticado que enviou o evento
+PARTNER_FIELD = "_partner"
+
+# Handlers por tipo de evento: (modelo dos dados ou None, função)
+WebhookHandler = Callable[[Any], Any]
+webhook_handlers: Dict[str, Tuple[Optional[Type[BaseModel]], WebhookHandler]] = {}
+# Custo de cada tipo de evento na cota do parceiro (tipos não listados custam o da rota /webhook)
+webhook_event_costs: Dict[str, float] = {}
+
+def register_handler(event_type: str, model: Optional[Type[BaseModel]] = None,
+                     cost: Optional[float] = None) -> Callable[[WebhookHandler], WebhookHandler]:
+    """
+    Registra o handler de um tipo de evento.
+
+    Args:
+        event_type: Tipo do evento (campo 'event' do envelope)
+        model: Modelo pydantic dos dados do evento; validado no recebimento
+            (erro 422) e entregue já convertido ao handler
+        cost: Custo do evento na cota do parceiro, cobrado no recebimento
+            (ex: a soma das rotas cujo trabalho o handler executa)
+
+    O handler recebe os dados do evento e pode ser síncrono (executado em uma
+    thread) ou assíncrono. Para adiar o evento sem gastar uma tentativa (ex:
+    servidor ocupado), o handler levanta WebhookDeferred.
+    """
+    def decorator(handler: WebhookHandler) -> WebhookHandler:
+        webhook_handlers[event_type] = (model, handler)
+        if cost is not None:
+            webhook_event_costs[event_type] = cost
+        return handler
+    return decorator
+
+def partner_idempotency_key(partner: str, key: str) -> str:
+    """
+    Chave gravada no spool: a chave de idempotência do evento no escopo do parceiro.
+    """
+    return f"{partner}:{key}"
+
+class WebhookDeferred(Exception):
+    """Evento adiado pelo handler: volta à fila após `delay` segundos, sem contar como tentativa."""
+
+    def __init__(self, delay: float, reason: str = "") -> None:
+        super().__init__(reason)
+        self.delay = delay
+
+class WebhookSpool:
+    """
+    Spool de eventos em SQLite (modo WAL), compartilhado pelos workers do host.
+
+    Estados: pending -> processing -> done | dead (tentativas esgotadas).
+    """
+
+    def __init__(self, path: str = WEBHOOK_SPOOL_PATH) -> None:
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS webhook_events ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, idempotency_key TEXT NOT NULL UNIQUE, "
+                "event TEXT NOT NULL, payload TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'pending', "
+                "attempts INTEGER NOT NULL DEFAULT 0, received_at REAL NOT NULL, next_attempt_at REAL NOT NULL, "
+                "claimed_at REAL, finished_at REAL, last_error TEXT)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS webhook_events_pending ON webhook_events (status, next_attempt_at)"
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def enqueue(self, idempotency_key: str, event: str, payload: Dict[str, Any],
+                max_pending: Optional[int] = None) -> str:
+        """
+        Grava o evento no spool, se houver espaço.
+
+        Returns:
+            'created', 'duplicate' (a chave de idempotência já existia) ou
+            'full' (max_pending eventos aguardando processamento; padrão WEBHOOK_MAX_PENDING)
+        """
+        max_pending = WEBHOOK_MAX_PENDING if max_pending is None else max_pending
+        now = time.time()
+        connection = self._connection()
+        # Verificação e inserção na mesma transação, entre todos os workers do host
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            if connection.execute(
+                "SELECT 1 FROM webhook_events WHERE idempotency_key = ?", (idempotency_key,)
+            ).fetchone() is not None:
+                result = "duplicate"
+            elif connection.execute(
+                "SELECT COUNT(*) FROM webhook_events WHERE status IN ('pending', 'processing')"
+            ).fetchone()[0] >= max_pending:
+                result = "full"
+            else:
+                connection.execute(
+                    "INSERT INTO webhook_events (idempotency_key, event, payload, received_at, next_attempt_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (idempotency_key, event, json.dumps(payload, ensure_ascii=False), now, now)
+                )
+                result = "created"
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return result
+
+    def exists(self, idempotency_key: str) -> bool:
+        return self._connection().execute(
+            "SELECT 1 FROM webhook_events WHERE idempotency_key = ?", (idempotency_key,)
+        ).fetchone() is not None
+
+    def claim_batch(self, limit: int = WEBHOOK_BATCH_SIZE) -> List[Tuple[int, str, Dict[str, Any], int]]:
+        """
+        Retira um lote de eventos prontos (pendentes ou com a concessão vencida).
+
+        Returns:
+            Lista de (id, tipo, payload, tentativa atual)
+        """
+        now = time.time()
+        rows = self._connection().execute(
+            "UPDATE webhook_events SET status = 'processing', claimed_at = ?, attempts = attempts + 1 "
+            "WHERE id IN (SELECT id FROM webhook_events WHERE "
+            "(status = 'pending' AND next_attempt_at <= ?) OR (status = 'processing' AND claimed_at <= ?) "
+            "ORDER BY id LIMIT ?) RETURNING id, event, payload, attempts",
+            (now, now, now - WEBHOOK_LEASE_SECONDS, limit)
+        ).fetchall()
+        return sorted((row[0], row[1], json.loads(row[2]), row[3]) for row in rows)
+
+    def mark_done(self, event_ids: List[int]) -> None:
+        if event_ids:
+            # Lote inteiro em uma única transação
+            connection = self._connection()
+            connection.execute("BEGIN")
+            connection.executemany(
+                "UPDATE webhook_events SET status = 'done', finished_at = ?, last_error = NULL WHERE id = ?",
+                [(time.time(), event_id) for event_id in event_ids]
+            )
+            connection.execute("COMMIT")
+
+    def renew(self, event_ids: List[int]) -> None:
+        """
+        Renova a concessão dos eventos ainda em processamento por este consumidor.
+        """
+        if event_ids:
+            connection = self._connection()
+            connection.execute("BEGIN")
+            connection.executemany(
+                "UPDATE webhook_events SET claimed_at = ? WHERE id = ? AND status = 'processing'",
+                [(time.time(), event_id) for event_id in event_ids]
+            )
+            connection.execute("COMMIT")
+
+    def mark_failed(self, event_id: int, attempts: int, error: str) -> None:
+        """
+        Reagenda o evento com espera exponencial, ou o marca como 'dead' após WEBHOOK_MAX_ATTEMPTS.
+        """
+        now = time.time()
+        if attempts >= WEBHOOK_MAX_ATTEMPTS:
+            self._connection().execute(
+                "UPDATE webhook_events SET status = 'dead', finished_at = ?, last_error = ? WHERE id = ?",
+                (now, error, event_id)
+            )
+        else:
+            self._connection().execute(
+                "UPDATE webhook_events SET status = 'pending', next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (now + min(2 ** attempts, 300), error, event_id)
+            )
+
+    def defer(self, event_ids: List[int], delay: float) -> None:
+        """
+        Devolve os eventos à fila após `delay` segundos, desfazendo a tentativa contada ao retirá-los.
+        """
+        if event_ids:
+            connection = self._connection()
+            connection.execute("BEGIN")
+            connection.executemany(
+                "UPDATE webhook_events SET status = 'pending', attempts = attempts - 1, next_attempt_at = ? WHERE id = ?",
+                [(time.time() + delay, event_id) for event_id in event_ids]
+            )
+            connection.execute("COMMIT")
+
+    def purge(self, older_than: float = WEBHOOK_RETENTION_SECONDS) -> int:
+        """
+        Remove eventos concluídos (done/dead) há mais de `older_than` segundos.
+        """
+        cursor = self._connection().execute(
+            "DELETE FROM webhook_events WHERE status IN ('done', 'dead') AND finished_at < ?",
+            (time.time() - older_than,)
+        )
+        return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._connection().execute("SELECT status, COUNT(*) FROM webhook_events GROUP BY status").fetchall()
+        return {"pending": 0, "processing": 0, "done": 0, "dead": 0, **dict(rows)}
+
+webhook_spool = WebhookSpool()
+
+class WebhookDispatcher:
+    """
+    Consumidor do spool: retira lotes e despacha cada evento ao seu handler.
+
+    Acordado a cada novo evento recebido por este worker (enqueue) e, de
+    qualquer forma, a cada WEBHOOK_POLL_SECONDS, para pegar eventos de outros
+    workers e as novas tentativas.
+    """
+
+    def __init__(self, spool: WebhookSpool = webhook_spool) -> None:
+        self.spool = spool
+        self.received = 0
+        self.duplicates = 0
+        self.rejected_full = 0
+        self.dispatched = 0
+        self.failed = 0
+        self.ignored = 0
+        self.unauthenticated = 0
+        self.deferred = 0
+        self.batches = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def enqueue(self, idempotency_key: str, event: str, payload: Dict[str, Any]) -> str:
+        """
+        Grava o evento no spool (em uma thread) e acorda o consumidor.
+
+        Returns:
+            'created', 'duplicate' ou 'full' (ver WebhookSpool.enqueue)
+        """
+        result = await asyncio.to_thread(self.spool.enqueue, idempotency_key, event, payload)
+        if result == "created":
+            self.received += 1
+            if self._wakeup is not None:
+                self._wakeup.set()
+        elif result == "duplicate":
+            self.duplicates += 1
+        else:
+            self.rejected_full += 1
+        return result
+
+    async def is_duplicate(self, idempotency_key: str) -> bool:
+        """
+        Indica (consultando o spool em uma thread) se a chave já foi recebida; conta como duplicata.
+        """
+        duplicate = await asyncio.to_thread(self.spool.exists, idempotency_key)
+        if duplicate:
+            self.duplicates += 1
+        return duplicate
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        last_purge = 0.0
+        while True:
+            try:
+                batch = await asyncio.to_thread(self.spool.claim_batch)
+                if batch:
+                    self.batches += 1
+                    await self.dispatch_batch(batch)
+                if time.time() - last_purge > 3600:
+                    await asyncio.to_thread(self.spool.purge)
+                    last_purge = time.time()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception("Erro no consumidor de webhooks", extra={"error": f"{type(e).__name__}: {e}"})
+                batch = []
+            if len(batch) < WEBHOOK_BATCH_SIZE:
+                # Lote incompleto: a fila esvaziou, aguarda novos eventos ou o próximo ciclo
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=WEBHOOK_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def dispatch_batch(self, batch: List[Tuple[int, str, Dict[str, Any], int]]) -> None:
+        # Eventos sem execução (tipo sem handler ou sem parceiro) são concluídos juntos, de imediato
+        done = []
+        runnable = []
+        for event_id, event, payload, attempts in batch:
+            if event not in webhook_handlers:
+                # Tipo sem handler: apenas registrado
+                self.ignored += 1
+                done.append(event_id)
+            elif not payload.get(PARTNER_FIELD):
+                # Gravado sem parceiro autenticado (ex: spool anterior à autenticação): não executa
+                self.unauthenticated += 1
+                logger.warning("Webhook sem parceiro autenticado descartado", extra={"event": event})
+                done.append(event_id)
+            else:
+                runnable.append((event_id, event, payload, attempts))
+        await asyncio.to_thread(self.spool.mark_done, done)
+
+        renewed_at = time.monotonic()
+        for index, (event_id, event, payload, attempts) in enumerate(runnable):
+            if time.monotonic() - renewed_at > WEBHOOK_LEASE_SECONDS / 3:
+                # Lote demorado: renova a concessão para que outro worker não retome os mesmos eventos
+                await asyncio.to_thread(self.spool.renew, [item[0] for item in runnable[index:]])
+                renewed_at = time.monotonic()
+            model, handler = webhook_handlers[event]
+            try:
+                data = model.model_validate(payload.get("data", {})) if model else payload.get("data", {})
+                if asyncio.iscoroutinefunction(handler):
+                    await handler(data)
+                else:
+                    await asyncio.to_thread(handler, data)
+            except WebhookDeferred as deferred:
+                # Servidor ocupado: o restante do lote é adiado de uma vez, sem esperar evento a evento
+                remaining = [item[0] for item in runnable[index:]]
+                self.deferred += len(remaining)
+                logger.info("Webhooks adiados", extra={"event": event, "events": len(remaining),
+                                                        "delay_s": deferred.delay, "reason": str(deferred)})
+                await asyncio.to_thread(self.spool.defer, remaining, deferred.delay)
+                return
+            except Exception as e:
+                self.failed += 1
+                error = f"{type(e).__name__}: {e}"
+                logger.warning("Falha no handler de webhook", extra={"event": event, "attempt": attempts, "error": error})
+                await asyncio.to_thread(self.spool.mark_failed, event_id, attempts, error)
+                continue
+            self.dispatched += 1
+            # Concluído ao terminar: um lote interrompido não repete os eventos já executados
+            await asyncio.to_thread(self.spool.mark_done, [event_id])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "spool": self.spool.counts(),
+            "received": self.received,
+            "duplicates": self.duplicates,
+            "rejected_full": self.rejected_full,
+            "batches": self.batches,
+            "dispatched": self.dispatched,
+            "failed": self.failed,
+            "ignored": self.ignored,
+            "unauthenticated": self.unauthenticated,
+            "deferred": self.deferred,
+            "handlers": sorted(webhook_handlers),
+        }
+
+webhook_dispatcher = WebhookDispatcher()
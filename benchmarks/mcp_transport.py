@@ -0,0 +1,159 @@
+"""
+Latência das chamadas de ferramentas do servidor MCP: modo HTTP x modo em processo.
+
+Executa as mesmas requisições das ferramentas (make_api_request) nos dois modos
+de MCP/mcp-astrology-server.py e reporta, por ferramenta, p50/p95 e média:
+
+    http       API em um servidor uvicorn (iniciado pelo benchmark em uma porta
+               livre, ou o informado em --target), via loopback
+    inprocess  aplicação FastAPI importada e chamada via ASGI, sem rede
+
+As requisições se repetem com os mesmos dados, então a partir da segunda
+chamada os caches da API respondem e a diferença medida é essencialmente o
+custo do transporte (conexão, HTTP, compressão). As cotas da chave são
+ampliadas nos dois modos. Requer as dependências da API e do servidor MCP
+(MCP/requirements-mcp.txt).
+
+Uso (na raiz do repositório):
+    API_KEY_KERYKEION=testapikey python benchmarks/mcp_transport.py --calls 200
+    python benchmarks/mcp_transport.py --target http://127.0.0.1:8000 --json mcp_transport.json
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from replay_traffic import percentile
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+MCP_SERVER_PATH = ROOT_DIR / "MCP" / "mcp-astrology-server.py"
+
+NATAL = {"name": "Benchmark", "year": 1990, "month": 5, "day": 15, "hour": 14, "minute": 30,
+         "latitude": -23.5505, "longitude": -46.6333, "tz_str": "America/Sao_Paulo", "house_system": "placidus"}
+TRANSIT = {"year": 2025, "month": 6, "day": 2, "hour": 12, "minute": 0,
+           "latitude": -23.5505, "longitude": -46.6333, "tz_str": "America/Sao_Paulo", "house_system": "placidus"}
+
+# Ferramenta -> (endpoint, corpo), como em call_tool
+TOOL_CALLS: Dict[str, Tuple[str, Dict[str, Any]]] = {
+    "calculate_natal_chart": ("/api/v1/natal_chart", NATAL),
+    "get_current_transits": ("/api/v1/current_transits", TRANSIT),
+    "calculate_transits_to_natal": ("/api/v1/transits_to_natal", {"natal_data": NATAL, "transit_data": TRANSIT}),
+    "generate_svg_chart": ("/api/v1/svg_chart", {"natal_chart": NATAL, "chart_type": "natal"}),
+}
+
+def load_mcp_server() -> Any:
+    """
+    Importa MCP/mcp-astrology-server.py (nome de arquivo com hífen) como módulo.
+    """
+    spec = importlib.util.spec_from_file_location("mcp_astrology_server", MCP_SERVER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(port: int) -> subprocess.Popen:
+    """
+    Inicia a API com uvicorn (sem aquecimento) e aguarda a sonda de vida.
+    """
+    env = {**os.environ, "ASTRO_WARMUP": "0"}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health/live", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise SystemExit("A API não respondeu em 60s")
+
+async def measure(server: Any, transport: str, calls: int, warmup: int) -> Dict[str, Dict[str, float]]:
+    """
+    Executa as ferramentas `calls` vezes cada no modo indicado e retorna os tempos por ferramenta.
+    """
+    report = {}
+    async with server.api_client(transport):
+        for tool, (endpoint, body) in TOOL_CALLS.items():
+            for _ in range(warmup):
+                await server.make_api_request(endpoint, "POST", body)
+            latencies = []
+            for _ in range(calls):
+                started_at = time.perf_counter()
+                await server.make_api_request(endpoint, "POST", body)
+                latencies.append(time.perf_counter() - started_at)
+            latencies.sort()
+            report[tool] = {
+                "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+                "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+                "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+            }
+    return report
+
+def print_report(results: Dict[str, Dict[str, Dict[str, float]]]) -> None:
+    print(f"{'ferramenta':<30} {'modo':<10} {'p50 ms':>9} {'p95 ms':>9} {'média ms':>9}")
+    for tool in TOOL_CALLS:
+        for mode, report in results.items():
+            stats = report[tool]
+            print(f"{tool:<30} {mode:<10} {stats['p50_ms']:>9.3f} {stats['p95_ms']:>9.3f} {stats['mean_ms']:>9.3f}")
+        if {"http", "inprocess"} <= results.keys():
+            speedup = results["http"][tool]["mean_ms"] / max(results["inprocess"][tool]["mean_ms"], 1e-9)
+            print(f"{'':<30} {'ganho':<10} {speedup:>8.2f}x")
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Latência das ferramentas do servidor MCP: HTTP x em processo.")
+    parser.add_argument("--calls", type=int, default=100, help="Chamadas cronometradas por ferramenta e modo")
+    parser.add_argument("--warmup", type=int, default=3, help="Chamadas de aquecimento por ferramenta (não cronometradas)")
+    parser.add_argument("--target", help="URL de uma API já em execução para o modo HTTP (padrão: inicia um uvicorn)")
+    parser.add_argument("--json", type=Path, help="Grava o relatório em JSON")
+    args = parser.parse_args()
+
+    # A mesma chave vale para o servidor iniciado aqui e para a API em processo
+    api_key = os.getenv("API_KEY") or os.getenv("API_KEY_KERYKEION") or "testapikey"
+    os.environ.setdefault("API_KEY_KERYKEION", api_key)
+    os.environ.setdefault("ASTRO_WARMUP", "0")
+    # Cotas da chave folgadas: o benchmark mede latência, não o limite de requisições
+    for name, value in (("ASTRO_KEY_RPS", "100000"), ("ASTRO_KEY_BURST", "100000"),
+                        ("ASTRO_KEY_COST_PER_MINUTE", "10000000"), ("ASTRO_KEY_COST_BURST", "10000000")):
+        os.environ.setdefault(name, value)
+    server = load_mcp_server()
+    server.API_KEY = api_key
+
+    process: Optional[subprocess.Popen] = None
+    if args.target:
+        server.API_BASE_URL = args.target
+    else:
+        port = free_port()
+        process = start_server(port)
+        server.API_BASE_URL = f"http://127.0.0.1:{port}"
+    try:
+        results = {"http": asyncio.run(measure(server, "http", args.calls, args.warmup))}
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    results["inprocess"] = asyncio.run(measure(server, "inprocess", args.calls, args.warmup))
+
+    print_report(results)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2, ensure_ascii=False) + "\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+Replay de tráfego capturado (ASTRO_CAPTURE=1) contra a API, com percentis de latência.
+
+Dirige a aplicação em processo (ASGI, sem rede) ou um servidor já em execução
+e reporta, por endpoint, p50/p95/p99, vazão e taxa de erros. Serve para
+dimensionar capacidade e comparar versões com uma mistura realista de tráfego.
+
+Modos de carga:
+    --concurrency N   laço fechado: N clientes enviando uma requisição após a outra
+    --rate R          laço aberto: R requisições/s, sem esperar as respostas
+                      (com --poisson, chegadas exponenciais em vez de intervalos fixos)
+
+Uso (na raiz do repositório):
+    python benchmarks/replay_traffic.py traffic_capture.jsonl --concurrency 8
+    python benchmarks/replay_traffic.py traffic_capture.jsonl --rate 50 --duration 30
+    python benchmarks/replay_traffic.py traffic_capture.jsonl --target http://127.0.0.1:8000 --json resultado.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+# Adicionar o diretório raiz ao path para importar a aplicação no modo em processo
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+# Resultado de uma requisição: (endpoint, status ou None em falha de conexão, latência em s)
+Sample = Tuple[str, Optional[int], float]
+
+def load_capture(path: Path) -> List[Dict[str, Any]]:
+    """
+    Lê o arquivo JSONL de captura, ignorando linhas vazias ou inválidas.
+    """
+    records = []
+    with path.open(encoding="utf-8") as capture:
+        for line in capture:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    # Percentil pelo método do posto mais próximo
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize(samples: List[Sample], elapsed: float) -> Dict[str, Dict[str, Any]]:
+    """
+    Agrega as amostras por endpoint e no total.
+
+    Returns:
+        {endpoint: {requests, errors, error_rate, throughput_rps, p50_ms, p95_ms, p99_ms, status}}
+    """
+    groups: Dict[str, List[Sample]] = {}
+    for sample in samples:
+        groups.setdefault(sample[0], []).append(sample)
+    groups["TOTAL"] = samples
+
+    report = {}
+    for endpoint, group in groups.items():
+        latencies = sorted(latency for _, _, latency in group)
+        errors = sum(1 for _, status, _ in group if status is None or status >= 400)
+        statuses: Dict[str, int] = {}
+        for _, status, _ in group:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        report[endpoint] = {
+            "requests": len(group),
+            "errors": errors,
+            "error_rate": round(errors / len(group), 4) if group else 0.0,
+            "throughput_rps": round(len(group) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "status": statuses,
+        }
+    return report
+
+async def send(client: httpx.AsyncClient, record: Dict[str, Any], headers: Dict[str, str],
+               samples: List[Sample]) -> None:
+    endpoint = f"{record['method']} {record['path']}"
+    url = record["path"] + (f"?{record['query']}" if record.get("query") else "")
+    started_at = time.perf_counter()
+    try:
+        response = await client.request(record["method"], url, json=record.get("body"), headers=headers)
+        status: Optional[int] = response.status_code
+    except httpx.HTTPError:
+        status = None
+    samples.append((endpoint, status, time.perf_counter() - started_at))
+
+def request_stream(records: List[Dict[str, Any]], loops: int) -> Iterator[Dict[str, Any]]:
+    # Repete a captura na ordem original; loops=0 repete indefinidamente (limitado por --duration)
+    return itertools.chain.from_iterable(itertools.repeat(records, loops) if loops else itertools.repeat(records))
+
+async def run_closed_loop(client: httpx.AsyncClient, stream: Iterator[Dict[str, Any]], headers: Dict[str, str],
+                          concurrency: int, deadline: float, samples: List[Sample]) -> None:
+    async def worker() -> None:
+        for record in stream:
+            if time.perf_counter() >= deadline:
+                return
+            await send(client, record, headers, samples)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+async def run_open_loop(client: httpx.AsyncClient, stream: Iterator[Dict[str, Any]], headers: Dict[str, str],
+                        rate: float, poisson: bool, deadline: float, samples: List[Sample]) -> None:
+    tasks = set()
+    next_at = time.perf_counter()
+    for record in stream:
+        if next_at >= deadline:
+            break
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.create_task(send(client, record, headers, samples))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        next_at += random.expovariate(rate) if poisson else 1 / rate
+    if tasks:
+        await asyncio.gather(*tasks)
+
+def make_client(target: str, concurrency: int) -> httpx.AsyncClient:
+    """
+    Cria o cliente HTTP: 'inprocess' usa a aplicação via ASGI, sem rede; outro valor é a URL base.
+    """
+    timeout = httpx.Timeout(60.0)
+    if target == "inprocess":
+        from main import app
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://replay", timeout=timeout)
+    limits = httpx.Limits(max_connections=max(concurrency, 100), max_keepalive_connections=max(concurrency, 20))
+    return httpx.AsyncClient(base_url=target, timeout=timeout, limits=limits)
+
+def print_report(report: Dict[str, Dict[str, Any]], elapsed: float) -> None:
+    print(f"Duração: {elapsed:.2f}s")
+    print(f"{'endpoint':<44} {'reqs':>7} {'erros':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for endpoint, stats in sorted(report.items(), key=lambda item: (item[0] == "TOTAL", item[0])):
+        print(f"{endpoint:<44} {stats['requests']:>7} {stats['error_rate']:>7.1%} {stats['throughput_rps']:>8.2f} "
+              f"{stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+
+async def replay(args: argparse.Namespace) -> Dict[str, Any]:
+    records = load_capture(args.capture)
+    if not records:
+        raise SystemExit(f"Nenhuma requisição em {args.capture}")
+    headers = {"X-API-KEY": args.api_key} if args.api_key else {}
+    stream = request_stream(records, args.loops)
+    samples: List[Sample] = []
+
+    async with make_client(args.target, args.concurrency) as client:
+        started_at = time.perf_counter()
+        deadline = started_at + args.duration if args.duration else float("inf")
+        if args.rate:
+            await run_open_loop(client, stream, headers, args.rate, args.poisson, deadline, samples)
+        else:
+            await run_closed_loop(client, stream, headers, args.concurrency, deadline, samples)
+        elapsed = time.perf_counter() - started_at
+
+    report = summarize(samples, elapsed)
+    print_report(report, elapsed)
+    return {
+        "capture": str(args.capture),
+        "target": args.target,
+        "mode": f"open-loop {args.rate} req/s" if args.rate else f"closed-loop x{args.concurrency}",
+        "elapsed_s": round(elapsed, 3),
+        "endpoints": report,
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Replay de tráfego capturado contra a API de Astrologia.")
+    parser.add_argument("capture", type=Path, help="Arquivo JSONL gerado com ASTRO_CAPTURE=1")
+    parser.add_argument("--target", default="inprocess",
+                        help="'inprocess' (ASGI, sem rede) ou URL base de um servidor, ex: http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=4, help="Clientes simultâneos no laço fechado")
+    parser.add_argument("--rate", type=float, default=0.0, help="Requisições/s no laço aberto (0 = laço fechado)")
+    parser.add_argument("--poisson", action="store_true", help="Chegadas exponenciais no laço aberto")
+    parser.add_argument("--loops", type=int, default=1, help="Vezes que a captura é repetida (0 = até --duration)")
+    parser.add_argument("--duration", type=float, default=0.0, help="Limite de tempo em segundos (0 = sem limite)")
+    parser.add_argument("--api-key", default=os.getenv("API_KEY_KERYKEION"), help="Chave enviada em X-API-KEY")
+    parser.add_argument("--json", type=Path, help="Grava o relatório em JSON para comparar versões")
+    args = parser.parse_args()
+    if args.loops == 0 and not args.duration:
+        parser.error("--loops 0 exige --duration")
+
+    result = asyncio.run(replay(args))
+    if args.json:
+        args.json.write_text(json.dumps(result, indent=2, ensure_ascii=False) + "\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
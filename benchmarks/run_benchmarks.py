@@ -0,0 +1,234 @@
+"""
+Micro-benchmarks dos caminhos críticos da API, com baselines versionadas.
+
+Mede ops/s (melhor rodada, como o timeit, para reduzir o ruído da máquina) e o pico de memória alocada por operação
+(tracemalloc) sobre um corpus fixo de dados de nascimento, compara com
+benchmarks/baselines.json e termina com código 1 se alguma métrica piorar além
+do limite.
+
+Uso (na raiz do repositório):
+    python benchmarks/run_benchmarks.py                  # compara com as baselines
+    python benchmarks/run_benchmarks.py --filter svg     # apenas benchmarks com 'svg' no nome
+    python benchmarks/run_benchmarks.py --save           # grava os resultados como novas baselines
+
+As baselines dependem da máquina; regrave-as (--save) ao trocar o ambiente de referência.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from importlib.metadata import version
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+# Adicionar o diretório raiz ao path para importar módulos do app
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from app.models import HOUSE_SYSTEM_MAP, NatalChartRequest, TransitRequest
+from app.routers.natal_chart_router import build_natal_chart_response
+from app.routers.svg_chart_router import build_chart_svg
+from app.routers.transit_router import find_transit_aspects
+from app.utils.astro_helpers import PLANETS_MAP, create_subject, get_planet_data
+from app.utils.svg_combined_chart import render_combined_chart_svg
+from kerykeion import KerykeionChartSVG
+
+BASELINES_PATH = Path(__file__).resolve().parent / "baselines.json"
+
+# Corpus fixo: latitudes, fusos e épocas variados (abaixo do círculo polar, válido para todos os sistemas de casas)
+CORPUS = [
+    NatalChartRequest(name="Fortaleza", year=1997, month=10, day=13, hour=22, minute=0,
+                      latitude=-3.7172, longitude=-38.5247, tz_str="America/Fortaleza"),
+    NatalChartRequest(name="São Paulo", year=1985, month=3, day=21, hour=6, minute=30,
+                      latitude=-23.5505, longitude=-46.6333, tz_str="America/Sao_Paulo"),
+    NatalChartRequest(name="Lisboa", year=1960, month=7, day=4, hour=14, minute=15,
+                      latitude=38.7223, longitude=-9.1393, tz_str="Europe/Lisbon"),
+    NatalChartRequest(name="Oslo", year=2001, month=12, day=31, hour=23, minute=59,
+                      latitude=59.9139, longitude=10.7522, tz_str="Europe/Oslo"),
+    NatalChartRequest(name="Tóquio", year=1972, month=1, day=15, hour=3, minute=45,
+                      latitude=35.6762, longitude=139.6503, tz_str="Asia/Tokyo"),
+    NatalChartRequest(name="Sydney", year=2015, month=5, day=9, hour=18, minute=5,
+                      latitude=-33.8688, longitude=151.2093, tz_str="Australia/Sydney"),
+]
+
+TRANSIT = TransitRequest(name="Trânsito", year=2025, month=6, day=2, hour=12, minute=0,
+                         latitude=-3.7172, longitude=-38.5247, tz_str="America/Fortaleza")
+
+# Registro: nome -> função que prepara as operações (uma por item do corpus)
+BENCHMARKS: Dict[str, Callable[[], List[Callable[[], Any]]]] = {}
+
+def benchmark(name: str) -> Callable:
+    def decorator(setup: Callable[[], List[Callable[[], Any]]]) -> Callable:
+        BENCHMARKS[name] = setup
+        return setup
+    return decorator
+
+def _natal_subjects() -> List[Any]:
+    return [create_subject(request, request.name) for request in CORPUS]
+
+def _register_house_system_benchmarks() -> None:
+    for house_system in HOUSE_SYSTEM_MAP:
+        def setup(house_system: str = house_system) -> List[Callable[[], Any]]:
+            requests = [request.model_copy(update={"house_system": house_system}) for request in CORPUS]
+            return [lambda request=request: create_subject(request, request.name) for request in requests]
+        benchmark(f"create_subject[{house_system}]")(setup)
+
+_register_house_system_benchmarks()
+
+@benchmark("get_planet_data")
+def bench_get_planet_data() -> List[Callable[[], Any]]:
+    def all_planets(subject: Any) -> List[Any]:
+        return [get_planet_data(subject, k_name, api_name) for k_name, api_name in PLANETS_MAP.items()]
+    return [lambda subject=subject: all_planets(subject) for subject in _natal_subjects()]
+
+@benchmark("build_natal_chart_response")
+def bench_natal_response() -> List[Callable[[], Any]]:
+    return [lambda request=request, subject=subject: build_natal_chart_response(request, subject)
+            for request, subject in zip(CORPUS, _natal_subjects())]
+
+@benchmark("find_transit_aspects")
+def bench_transit_aspects() -> List[Callable[[], Any]]:
+    transit_subject = create_subject(TRANSIT, TRANSIT.name)
+    return [lambda subject=subject: find_transit_aspects(subject, transit_subject) for subject in _natal_subjects()]
+
+@benchmark("svg_combined_chart[full]")
+def bench_combined_full() -> List[Callable[[], Any]]:
+    transit_subject = create_subject(TRANSIT, TRANSIT.name)
+    return [lambda subject=subject: render_combined_chart_svg(subject, transit_subject) for subject in _natal_subjects()]
+
+@benchmark("svg_combined_chart[compact]")
+def bench_combined_compact() -> List[Callable[[], Any]]:
+    transit_subject = create_subject(TRANSIT, TRANSIT.name)
+    return [lambda subject=subject: render_combined_chart_svg(subject, transit_subject, compact=True)
+            for subject in _natal_subjects()]
+
+@benchmark("kerykeion_svg[natal]")
+def bench_kerykeion_natal() -> List[Callable[[], Any]]:
+    return [lambda subject=subject: build_chart_svg(subject, None, "natal", "Kerykeion") for subject in _natal_subjects()]
+
+@benchmark("kerykeion_svg[natal,compact]")
+def bench_kerykeion_natal_compact() -> List[Callable[[], Any]]:
+    return [lambda subject=subject: build_chart_svg(subject, None, "natal", "Kerykeion", minify=True,
+                                                    remove_css_variables=True)
+            for subject in _natal_subjects()]
+
+@benchmark("kerykeion_svg[transit]")
+def bench_kerykeion_transit() -> List[Callable[[], Any]]:
+    transit_subject = create_subject(TRANSIT, TRANSIT.name)
+    return [lambda subject=subject: build_chart_svg(subject, transit_subject, "transit", "Kerykeion")
+            for subject in _natal_subjects()]
+
+@benchmark("kerykeion_svg[natal,stock]")
+def bench_kerykeion_stock() -> List[Callable[[], Any]]:
+    # Caminho original do Kerykeion (lê temas e templates do disco a cada gráfico), para comparação
+    return [lambda subject=subject: KerykeionChartSVG(subject).makeTemplate() for subject in _natal_subjects()]
+
+def measure(ops: List[Callable[[], Any]], rounds: int, min_time: float) -> Dict[str, float]:
+    """
+    Executa as operações e retorna ops/s (melhor rodada) e o pico de memória por operação.
+
+    Args:
+        ops: Operações a medir (uma por item do corpus)
+        rounds: Número de rodadas cronometradas
+        min_time: Duração mínima de cada rodada em segundos
+
+    Returns:
+        Dicionário com ops_per_sec e peak_kib
+    """
+    for op in ops:  # Aquecimento
+        op()
+
+    rates = []
+    for _ in range(rounds):
+        count = 0
+        started_at = time.perf_counter()
+        while True:
+            for op in ops:
+                op()
+            count += len(ops)
+            elapsed = time.perf_counter() - started_at
+            if elapsed >= min_time:
+                break
+        rates.append(count / elapsed)
+
+    # Pico de memória alocada durante cada operação (maior valor do corpus)
+    tracemalloc.start()
+    peak = 0
+    for op in ops:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        op()
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    return {"ops_per_sec": round(max(rates), 2), "peak_kib": round(peak / 1024, 1)}
+
+def compare(name: str, result: Dict[str, float], baseline: Dict[str, float], threshold: float) -> List[str]:
+    """
+    Retorna as regressões de um benchmark: ops/s abaixo ou memória acima da baseline além do limite.
+    """
+    regressions = []
+    if result["ops_per_sec"] < baseline["ops_per_sec"] * (1 - threshold):
+        regressions.append(f"{name}: ops/s {result['ops_per_sec']:.2f} < baseline {baseline['ops_per_sec']:.2f}")
+    if result["peak_kib"] > baseline["peak_kib"] * (1 + threshold):
+        regressions.append(f"{name}: pico {result['peak_kib']:.1f} KiB > baseline {baseline['peak_kib']:.1f} KiB")
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks dos caminhos críticos da API de Astrologia.")
+    parser.add_argument("--filter", default="", help="Executa apenas benchmarks cujo nome contém este texto")
+    parser.add_argument("--rounds", type=int, default=5, help="Rodadas cronometradas por benchmark")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Duração mínima de cada rodada (s)")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Piora relativa tolerada antes de falhar (0.25 = 25%%)")
+    parser.add_argument("--save", action="store_true", help="Grava os resultados em benchmarks/baselines.json")
+    args = parser.parse_args()
+
+    # Avisos por subject do Kerykeion distorcem as medições
+    logging.disable(logging.WARNING)
+
+    stored = json.loads(BASELINES_PATH.read_text()) if BASELINES_PATH.exists() else {}
+    baselines = stored.get("benchmarks", {})
+    results: Dict[str, Dict[str, float]] = {}
+    regressions: List[str] = []
+
+    print(f"{'benchmark':<34} {'ops/s':>10} {'baseline':>10} {'Δ':>8} {'pico KiB':>10}")
+    for name, setup in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        result = results[name] = measure(setup(), args.rounds, args.min_time)
+        baseline = baselines.get(name)
+        if baseline:
+            delta = f"{(result['ops_per_sec'] / baseline['ops_per_sec'] - 1) * 100:+.1f}%"
+            regressions += compare(name, result, baseline, args.threshold)
+        print(f"{name:<34} {result['ops_per_sec']:>10.2f} "
+              f"{baseline['ops_per_sec'] if baseline else '-':>10} {delta if baseline else 'novo':>8} "
+              f"{result['peak_kib']:>10.1f}")
+
+    if args.save:
+        stored = {
+            "environment": {
+                "python": platform.python_version(),
+                "kerykeion": version("kerykeion"),
+                "machine": platform.machine(),
+                "cpu_count": os.cpu_count(),
+            },
+            "benchmarks": {**baselines, **results},
+        }
+        BASELINES_PATH.write_text(json.dumps(stored, indent=2, ensure_ascii=False) + "\n")
+        print(f"Baselines gravadas em {BASELINES_PATH.relative_to(ROOT_DIR)}")
+        return 0
+
+    if regressions:
+        print("\nRegressões acima do limite:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
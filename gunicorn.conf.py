@@ -0,0 +1,24 @@
+"""
+Configuração do Gunicorn para executar a API com vários workers Uvicorn.
+
+Com preload_app o processo pai importa a aplicação (FastAPI, Kerykeion, Swiss
+Ephemeris e os temas/templates do registro chart_assets) uma única vez, e os
+workers herdam essa memória por copy-on-write após o fork. Os caches de SVG e
+raster usam o backend compartilhado (SQLite em um diretório privado do usuário
+em /dev/shm), visível a todos os workers do host; defina ASTRO_RELEASE a cada
+deploy para que as entradas da versão anterior não sejam servidas. O switch e
+os perfis do profiler (/api/v1/admin/profiling) ficam no mesmo diretório e
+valem para todos os workers. Cada worker faz o próprio aquecimento no lifespan.
+
+Uso: gunicorn main:app -c gunicorn.conf.py
+"""
+import os
+
+# Deve ser definido antes do preload: os caches são criados na importação da aplicação
+os.environ.setdefault("ASTRO_CACHE_BACKEND", "shared")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
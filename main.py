@@ -1,30 +1,76 @@
+import time
+_import_started_at = time.perf_counter()
+
+from app.utils.structured_logging import setup_logging
+setup_logging()
+
 from fastapi import FastAPI
-from app.routers import natal_chart_router, transit_router, svg_chart_router, webhook_router
+from app.routers import natal_chart_router, transit_router, svg_chart_router, svg_combined_chart_router, chart_bundle_router, status_router, webhook_router, admin_router, jobs_router, sky_router
 from app.exceptions import add_exception_handlers
-import uvicorn
-import os
+from app.startup import lifespan, startup_state
+from app import precompute  # Registra os handlers de webhook que pré-calculam os gráficos
+from app.security import api_key_client
+from app.utils.admission import AdmissionMiddleware
+from app.utils.compression import CompressionMiddleware
+from app.utils.metrics import metrics_middleware
+from app.utils.profiler import ProfilerMiddleware
+from app.utils.quotas import QuotaHeadersMiddleware
+from app.utils.traffic_capture import CAPTURE_ENABLED, TrafficCaptureMiddleware
 from dotenv import load_dotenv
 
+# Tempo de importação da API (FastAPI, Kerykeion, Swiss Ephemeris e routers)
+startup_state.record("import", time.perf_counter() - _import_started_at)
+
 # Carregar variáveis de ambiente do arquivo .env
 # Isso é útil se você tiver chaves de API ou configurações sensíveis
 # Por exemplo, API_KEY_KERYKEION="SUA_CHAVE_AQUI" no .env
+# (as chaves são carregadas em app.security; veja também API_KEYS_FILE)
 load_dotenv()
-os.environ["API_KEY_KERYKEION"] = "testapikey"
 
 app = FastAPI(
     title="API de Astrologia",
     description="Uma API para cálculos astrológicos, incluindo mapas natais, trânsitos e geração de gráficos SVG.",
     version="0.1.0",
+    lifespan=lifespan,
     #openapi_tags=openapi_tags # Se precisar de metadados de tags
 )
 
 add_exception_handlers(app)
 
+# Controle de admissão: concorrência global, prazos e respostas da cache sob sobrecarga
+# (registrado antes das métricas para ficar por dentro delas e aparecer no Server-Timing)
+app.add_middleware(AdmissionMiddleware, identify=api_key_client)
+
+# Compressão gzip/br/zstd conforme Accept-Encoding, com cache das variantes comprimidas
+# (por fora da admissão, para comprimir também as respostas servidas da cache sob sobrecarga)
+app.add_middleware(CompressionMiddleware)
+
+# Tempos por etapa: histogramas em /metrics e cabeçalho Server-Timing
+app.middleware("http")(metrics_middleware)
+
+# Cabeçalhos de cota restante por chave de API (X-RateLimit-*, X-Cost-*)
+app.add_middleware(QuotaHeadersMiddleware)
+
+# Profiler sob demanda (ligado por /api/v1/admin/profiling); desligado, apenas repassa a requisição
+app.add_middleware(ProfilerMiddleware)
+
+# Captura de tráfego anonimizado para replay (opcional: ASTRO_CAPTURE=1, ver benchmarks/replay_traffic.py)
+if CAPTURE_ENABLED:
+    app.add_middleware(TrafficCaptureMiddleware)
+
 # Incluir os routers
 app.include_router(natal_chart_router.router)
 app.include_router(transit_router.router)
 app.include_router(svg_chart_router.router) # Adicionando o router SVG
+app.include_router(svg_combined_chart_router.router)
+app.include_router(chart_bundle_router.router)
+app.include_router(status_router.router)
+app.include_router(status_router.health_router)
+app.include_router(status_router.metrics_router)
 app.include_router(webhook_router.router)
+app.include_router(admin_router.router)
+app.include_router(jobs_router.router)
+app.include_router(sky_router.router)
 
 @app.get("/", tags=["Root"], summary="Endpoint raiz da API")
 async def read_root():
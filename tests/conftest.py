@@ -0,0 +1,76 @@
+"""
+Configuração comum dos testes: variáveis de ambiente definidas antes de importar a aplicação.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+_TMP_DIR = tempfile.mkdtemp(prefix="astro_api_tests_")
+
+os.environ.setdefault("API_KEY_KERYKEION", "testapikey")
+os.environ.setdefault("API_KEY_ADMIN", "testadminkey")
+os.environ.setdefault("ASTRO_WARMUP", "0")
+os.environ.setdefault("ASTRO_CACHE_BACKEND", "memory")
+os.environ.setdefault("ASTRO_WEBHOOK_SPOOL", os.path.join(_TMP_DIR, "webhook_spool.sqlite3"))
+os.environ.setdefault("ASTRO_JOBS_DIR", os.path.join(_TMP_DIR, "jobs_data"))
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+API_KEY = os.environ["API_KEY_KERYKEION"]
+ADMIN_KEY = os.environ["API_KEY_ADMIN"]
+
+NATAL_CHART = {
+    "name": "Teste", "year": 1990, "month": 5, "day": 15, "hour": 14, "minute": 30,
+    "latitude": -23.5505, "longitude": -46.6333, "tz_str": "America/Sao_Paulo", "house_system": "placidus",
+}
+
+@pytest.fixture(scope="session")
+def app():
+    from main import app as api_app
+    return api_app
+
+@pytest.fixture
+def client(app):
+    from fastapi.testclient import TestClient
+    return TestClient(app)
+
+@pytest.fixture
+def make_api_key():
+    """
+    Registra chaves de API temporárias, com limites próprios, e as remove ao fim do teste.
+    """
+    from app.security import ApiKeyEntry, _digest, api_key_registry
+    from app.utils.quotas import DEFAULT_LIMITS, KeyQuota
+
+    created = []
+
+    def factory(name: str, **limits) -> str:
+        api_key = f"{name}-key"
+        entry = ApiKeyEntry(name, _digest(api_key), KeyQuota(**{**DEFAULT_LIMITS, **limits}))
+        api_key_registry._by_digest[entry.digest] = entry
+        created.append(entry.digest)
+        return api_key
+
+    yield factory
+    for digest in created:
+        api_key_registry._by_digest.pop(digest, None)
+
+@pytest.fixture
+def saturate():
+    """
+    Função que ocupa todas as vagas do controle de admissão (modo degradado); restaurado ao fim do teste.
+    """
+    from app.utils.admission import admission_controller, stale_response_cache
+
+    stale_response_cache.clear()
+    active = admission_controller.active
+
+    def factory() -> None:
+        admission_controller.active = admission_controller.max_concurrency
+
+    yield factory
+    admission_controller.active = active
+    stale_response_cache.clear()
@@ -0,0 +1,73 @@
+"""
+Modo degradado do controle de admissão: respostas da cache separadas por cliente e restritas às rotas de gráficos.
+"""
+from conftest import ADMIN_KEY, NATAL_CHART
+
+# Prazo curto: sem resposta da cache, a requisição é descartada (503) em vez de aguardar uma vaga
+SHORT_DEADLINE = {"X-Request-Deadline-Ms": "50"}
+
+def test_stale_response_served_to_same_client(client, make_api_key, saturate):
+    api_key = make_api_key("cliente-a")
+    fresh = client.post("/api/v1/natal_chart", json=NATAL_CHART, headers={"X-API-KEY": api_key})
+    assert fresh.status_code == 200
+
+    saturate()
+    stale = client.post("/api/v1/natal_chart", json=NATAL_CHART, headers={"X-API-KEY": api_key, **SHORT_DEADLINE})
+    assert stale.status_code == 200
+    assert stale.headers["x-served-stale"] == "1"
+    assert stale.headers["warning"].startswith("110")
+    assert stale.content == fresh.content
+
+def test_stale_response_not_shared_between_clients(client, make_api_key, saturate):
+    owner = make_api_key("cliente-a")
+    other = make_api_key("cliente-b")
+    assert client.post("/api/v1/natal_chart", json=NATAL_CHART, headers={"X-API-KEY": owner}).status_code == 200
+
+    saturate()
+    response = client.post("/api/v1/natal_chart", json=NATAL_CHART, headers={"X-API-KEY": other, **SHORT_DEADLINE})
+    assert response.status_code == 503
+    assert "x-served-stale" not in response.headers
+
+def test_stale_response_requires_valid_key(client, make_api_key, saturate):
+    api_key = make_api_key("cliente-a")
+    assert client.post("/api/v1/natal_chart", json=NATAL_CHART, headers={"X-API-KEY": api_key}).status_code == 200
+
+    saturate()
+    response = client.post("/api/v1/natal_chart", json=NATAL_CHART, headers={"X-API-KEY": "invalida", **SHORT_DEADLINE})
+    assert response.status_code == 503
+
+def test_admin_routes_never_served_stale(client, make_api_key, saturate):
+    api_key = make_api_key("cliente-a")
+    admin = client.get("/api/v1/admin/api_keys", headers={"X-ADMIN-KEY": ADMIN_KEY, "X-API-KEY": api_key})
+    assert admin.status_code == 200
+
+    saturate()
+    response = client.get("/api/v1/admin/api_keys", headers={"X-API-KEY": api_key, **SHORT_DEADLINE})
+    assert response.status_code == 503
+    assert "x-served-stale" not in response.headers
+
+def test_job_routes_never_served_stale(client, make_api_key, saturate):
+    from app.utils.admission import STALE_ROUTES
+
+    assert not any(route.startswith(("/api/v1/jobs", "/api/v1/admin", "/api/v1/status")) for route in STALE_ROUTES)
+    api_key = make_api_key("cliente-a")
+    assert client.get("/api/v1/status/admission", headers={"X-API-KEY": api_key}).status_code == 200
+
+    saturate()
+    response = client.get("/api/v1/status/admission", headers={"X-API-KEY": api_key, **SHORT_DEADLINE})
+    assert response.status_code == 503
+
+def test_oversized_body_on_cached_route_is_rejected(client, monkeypatch):
+    from app.utils import admission
+
+    monkeypatch.setattr(admission, "STALE_MAX_BODY_BYTES", 64)
+    response = client.post("/api/v1/natal_chart", json=NATAL_CHART, headers={"X-API-KEY": ADMIN_KEY})
+    assert response.status_code == 413
+
+def test_non_finite_deadline_header_is_ignored():
+    from app.utils.admission import ROUTE_DEADLINES_MS, deadline_for
+
+    default = deadline_for("/api/v1/natal_chart", None, 0.0)
+    assert default == ROUTE_DEADLINES_MS["/api/v1/natal_chart"] / 1000
+    for value in (b"nan", b"inf", b"-inf", b"abc"):
+        assert deadline_for("/api/v1/natal_chart", value, 0.0) == default
@@ -0,0 +1,84 @@
+"""
+Cache compartilhado entre workers: valores sem pickle, chaves por versão e diretório privado.
+"""
+import os
+
+import pytest
+
+from app.models import NatalChartResponse
+from app.utils import cache as cache_module
+from app.utils.cache import SharedCache, _private_cache_dir
+
+def test_shared_cache_stores_bytes(tmp_path):
+    cache = SharedCache("svg", path=str(tmp_path / "cache.sqlite3"))
+    cache.set(("abc", "dark"), b"<svg/>")
+    assert cache.get(("abc", "dark")) == b"<svg/>"
+    assert cache.get(("abc", "light")) is None
+
+def test_shared_cache_rejects_arbitrary_objects(tmp_path):
+    cache = SharedCache("svg", path=str(tmp_path / "cache.sqlite3"))
+    with pytest.raises(TypeError):
+        cache.set("chave", {"objeto": "qualquer"})
+
+def test_shared_cache_stores_models_as_json(tmp_path, client, make_api_key):
+    from conftest import NATAL_CHART
+
+    response = client.post("/api/v1/natal_chart", json=NATAL_CHART, headers={"X-API-KEY": make_api_key("cliente-a")})
+    chart = NatalChartResponse.model_validate(response.json())
+    cache = SharedCache("natal", model=NatalChartResponse, path=str(tmp_path / "cache.sqlite3"))
+    cache.set("mapa", chart)
+
+    raw = cache._connection().execute("SELECT value FROM cache_entries").fetchone()[0]
+    assert raw.startswith(b"{")
+    assert cache.get("mapa") == chart
+
+def test_shared_cache_keys_are_namespaced_by_release(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.sqlite3")
+    SharedCache("svg", path=path).set("chave", b"antigo")
+
+    monkeypatch.setattr(cache_module, "CACHE_NAMESPACE", "nova-versao")
+    assert SharedCache("svg", path=path).get("chave") is None
+
+def test_private_cache_dir_is_user_only(tmp_path):
+    path = _private_cache_dir(str(tmp_path))
+    assert os.stat(path).st_mode & 0o777 == 0o700
+
+def test_private_cache_dir_refuses_open_permissions(tmp_path):
+    path = _private_cache_dir(str(tmp_path))
+    os.chmod(path, 0o777)
+    with pytest.raises(RuntimeError):
+        _private_cache_dir(str(tmp_path))
+
+def test_shared_cache_hit_does_not_rewrite_recent_access(tmp_path):
+    cache = SharedCache("svg", path=str(tmp_path / "cache.sqlite3"))
+    cache.set("chave", b"<svg/>")
+    accessed = cache._connection().execute("SELECT accessed FROM cache_entries").fetchone()[0]
+    assert cache.get("chave") == b"<svg/>"
+    assert cache._connection().execute("SELECT accessed FROM cache_entries").fetchone()[0] == accessed
+
+def test_shared_cache_async_access_runs_off_the_event_loop(tmp_path, monkeypatch):
+    import asyncio
+    import threading
+
+    cache = SharedCache("svg", path=str(tmp_path / "cache.sqlite3"))
+    threads = []
+    original_get = SharedCache.get
+
+    def recording_get(self, key):
+        threads.append(threading.get_ident())
+        return original_get(self, key)
+
+    monkeypatch.setattr(SharedCache, "get", recording_get)
+
+    async def scenario():
+        await cache.aset("chave", b"<svg/>")
+        return await cache.aget("chave"), threading.get_ident()
+
+    value, loop_thread = asyncio.run(scenario())
+    assert value == b"<svg/>"
+    assert threads and loop_thread not in threads
+
+def test_shared_cache_lru_index(tmp_path):
+    cache = SharedCache("svg", path=str(tmp_path / "cache.sqlite3"))
+    indexes = {row[1] for row in cache._connection().execute("PRAGMA index_list(cache_entries)")}
+    assert "cache_entries_accessed" in indexes
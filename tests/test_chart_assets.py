@@ -0,0 +1,26 @@
+"""
+Recursos pré-carregados dos gráficos: saída idêntica à do KerykeionChartSVG original.
+"""
+import pytest
+from kerykeion import AstrologicalSubject, KerykeionChartSVG
+
+from app.svg.chart_assets import PreloadedChartSVG
+
+@pytest.fixture(scope="module")
+def subjects():
+    natal = AstrologicalSubject("Teste", 1990, 5, 15, 14, 30, lng=-46.6333, lat=-23.5505,
+                                tz_str="America/Sao_Paulo", online=False)
+    transit = AstrologicalSubject("Transit", 2025, 6, 2, 12, 0, lng=-46.6333, lat=-23.5505,
+                                  tz_str="America/Sao_Paulo", online=False)
+    return natal, transit
+
+@pytest.mark.parametrize("chart_type", ["Natal", "Transit"])
+@pytest.mark.parametrize("method", ["makeTemplate", "makeWheelOnlyTemplate", "makeAspectGridOnlyTemplate"])
+@pytest.mark.parametrize("compact", [False, True])
+def test_preloaded_output_matches_kerykeion(subjects, chart_type, method, compact):
+    natal, transit = subjects
+    second = transit if chart_type == "Transit" else None
+    stock = KerykeionChartSVG(natal, chart_type=chart_type, second_obj=second, theme="dark")
+    preloaded = PreloadedChartSVG(natal, chart_type=chart_type, second_obj=second, theme="dark")
+    expected = getattr(stock, method)(minify=compact, remove_css_variables=compact)
+    assert getattr(preloaded, method)(minify=compact, remove_css_variables=compact) == expected
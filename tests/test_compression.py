@@ -0,0 +1,66 @@
+"""
+Compressão das respostas: codificadores, negociação e cache das variantes.
+"""
+import gzip
+
+import brotli
+import pytest
+import zstandard
+
+from conftest import API_KEY, NATAL_CHART
+
+from app.utils.compression import ENCODERS, compressed_cache, negotiate
+
+DECODERS = {
+    "gzip": gzip.decompress,
+    "br": brotli.decompress,
+    "zstd": lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data),
+}
+
+BODY = b'{"planets": [' + b", ".join(b'{"name": "Sun", "longitude": %d}' % i for i in range(500)) + b"]}"
+
+@pytest.mark.parametrize("encoding", ["gzip", "br", "zstd"])
+def test_encoder_round_trip(encoding):
+    compress, stream_factory = ENCODERS[encoding]
+    assert DECODERS[encoding](compress(BODY)) == BODY
+
+    stream = stream_factory()
+    chunks = [BODY[i:i + 4096] for i in range(0, len(BODY), 4096)]
+    # Cada bloco é descomprimível assim que enviado (flush), sem esperar o fim do corpo
+    first = stream.chunk(chunks[0])
+    assert first
+    compressed = first + b"".join(stream.chunk(chunk) for chunk in chunks[1:]) + stream.finish()
+    assert DECODERS[encoding](compressed) == BODY
+
+def test_negotiate():
+    assert negotiate("gzip, br, zstd") == "zstd"
+    assert negotiate("gzip, br;q=0.9") == "gzip"
+    assert negotiate("br;q=0.5, *;q=0.1") == "br"
+    assert negotiate("identity") is None
+    assert negotiate("gzip;q=0") is None
+    assert negotiate("") is None
+
+def test_only_chart_cache_bodies_are_cached(client):
+    compressed_cache.clear()
+    headers = {"X-API-KEY": API_KEY, "Accept-Encoding": "gzip"}
+
+    # Respostas avulsas não ocupam o cache
+    response = client.get("/openapi.json", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert compressed_cache.stats()["size"] == 0
+
+    response = client.post("/api/v1/natal_chart", json=NATAL_CHART, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert compressed_cache.stats()["size"] == 1
+
+    # Mesmo mapa repetido: a variante comprimida é reaproveitada
+    assert client.post("/api/v1/natal_chart", json=NATAL_CHART, headers=headers).content == response.content
+    assert compressed_cache.stats()["size"] == 1
+
+    response = client.post("/api/v1/svg_chart", json={"natal_chart": NATAL_CHART, "chart_type": "natal"}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert b"<svg" in response.content
+    assert compressed_cache.stats()["size"] == 2
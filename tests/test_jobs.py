@@ -0,0 +1,124 @@
+"""
+Jobs assíncronos: ciclo de vida, cancelamento, isolamento por chave e recuperação após reinício.
+"""
+import os
+import time
+
+from conftest import API_KEY, NATAL_CHART
+
+from app.models import ProgressionsJob
+from app.utils import jobs
+from app.utils.jobs import JobStore
+
+HEADERS = {"X-API-KEY": API_KEY}
+START = {"year": 2025, "month": 6, "day": 2, "hour": 12, "minute": 0,
+         "latitude": -23.5505, "longitude": -46.6333, "tz_str": "America/Sao_Paulo"}
+
+def _wait_for(client, job_id, statuses, headers=HEADERS, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/v1/jobs/{job_id}", headers=headers).json()
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.2)
+    raise AssertionError(f"Job {job_id} não chegou a {statuses}: {job}")
+
+def test_job_succeeds_and_results_are_paginated(client):
+    response = client.post("/api/v1/jobs", json={"type": "progressions", "natal_chart": NATAL_CHART, "years": 3},
+                           headers=HEADERS)
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+
+    job = _wait_for(client, job_id, {"succeeded", "failed"})
+    assert job["status"] == "succeeded"
+    assert job["result_count"] == 4
+
+    first = client.get(f"/api/v1/jobs/{job_id}/results?limit=3", headers=HEADERS).json()
+    assert [item["age"] for item in first["items"]] == [0, 1, 2]
+    assert first["next_offset"] == 3
+    second = client.get(f"/api/v1/jobs/{job_id}/results?offset=3&limit=3", headers=HEADERS).json()
+    assert [item["age"] for item in second["items"]] == [3]
+    assert second["next_offset"] is None
+    assert second["total"] == 4
+
+def test_queued_job_is_cancelled_before_running(client, make_api_key):
+    # Chave com orçamento para a varredura longa, que custa em proporção aos passos
+    headers = {"X-API-KEY": make_api_key("varredura", cost_burst=10_000)}
+    # O primeiro job ocupa o único processo do pool; o segundo fica na fila
+    long_scan = {"type": "transit_scan", "natal_chart": NATAL_CHART, "start": START, "days": 2000, "step_hours": 1}
+    running_id = client.post("/api/v1/jobs", json=long_scan, headers=headers).json()["id"]
+    queued_id = client.post("/api/v1/jobs", json={"type": "progressions", "natal_chart": NATAL_CHART, "years": 3},
+                            headers=headers).json()["id"]
+    try:
+        response = client.delete(f"/api/v1/jobs/{queued_id}", headers=headers)
+        assert response.status_code == 200
+        job = _wait_for(client, queued_id, {"succeeded", "failed", "cancelled"}, headers=headers)
+        assert job["status"] == "cancelled"
+        assert job["started_at"] is None
+        assert job["result_count"] == 0
+    finally:
+        client.delete(f"/api/v1/jobs/{running_id}", headers=headers)
+        _wait_for(client, running_id, {"succeeded", "failed", "cancelled"}, headers=headers)
+
+def test_jobs_of_another_key_are_not_found(client, make_api_key):
+    owner = {"X-API-KEY": make_api_key("dono-do-job")}
+    job_id = client.post("/api/v1/jobs", json={"type": "progressions", "natal_chart": NATAL_CHART, "years": 1},
+                         headers=owner).json()["id"]
+    try:
+        assert client.get(f"/api/v1/jobs/{job_id}", headers=HEADERS).status_code == 404
+        assert client.get(f"/api/v1/jobs/{job_id}/results", headers=HEADERS).status_code == 404
+        assert client.delete(f"/api/v1/jobs/{job_id}", headers=HEADERS).status_code == 404
+        assert client.get(f"/api/v1/jobs/{job_id}", headers=owner).status_code == 200
+    finally:
+        _wait_for(client, job_id, {"succeeded", "failed", "cancelled"}, headers=owner)
+
+def test_scan_over_max_steps_is_rejected(client):
+    scan = {"type": "transit_scan", "natal_chart": NATAL_CHART, "start": START, "days": 36500, "step_hours": 1}
+    response = client.post("/api/v1/jobs", json=scan, headers=HEADERS)
+    assert response.status_code == 422
+    assert str(jobs.MAX_SCAN_STEPS) in response.json()["detail"]
+
+def test_large_batch_exhausts_cost_budget(client, make_api_key):
+    headers = {"X-API-KEY": make_api_key("lote", cost_burst=100, cost_per_minute=0.001)}
+    batch = {"type": "batch_natal", "charts": [NATAL_CHART] * 60}
+    response = client.post("/api/v1/jobs", json=batch, headers=headers)
+    assert response.status_code == 202
+    try:
+        # 60 mapas custam 60 vezes o mapa natal: o orçamento da chave se esgota
+        assert client.post("/api/v1/natal_chart", json=NATAL_CHART, headers=headers).status_code == 429
+    finally:
+        # Sem orçamento para consultar o job pela API: cancelado direto no runner
+        job_id = response.json()["id"]
+        jobs.job_runner.cancel(job_id)
+        deadline = time.monotonic() + 120
+        while jobs.job_runner.store.read(job_id)["status"] not in jobs.TERMINAL_STATUSES and time.monotonic() < deadline:
+            time.sleep(0.2)
+
+def test_rejected_job_is_refunded(client, make_api_key, monkeypatch):
+    headers = {"X-API-KEY": make_api_key("lote", cost_burst=100, cost_per_minute=0.001)}
+    monkeypatch.setattr(jobs.job_runner, "max_pending", 0)
+    batch = {"type": "batch_natal", "charts": [NATAL_CHART] * 60}
+    assert client.post("/api/v1/jobs", json=batch, headers=headers).status_code == 429
+    assert client.post("/api/v1/natal_chart", json=NATAL_CHART, headers=headers).status_code == 200
+
+def test_recover_uses_server_token_not_pid(tmp_path, monkeypatch):
+    store = JobStore(str(tmp_path))
+    job = ProgressionsJob(type="progressions", natal_chart=NATAL_CHART, years=1)
+
+    # Servidor anterior com o mesmo PID (reinício de contêiner), mas outro token
+    monkeypatch.setattr(jobs, "_server_token", (os.getpid(), "0ld"))
+    orphan = store.create(job, "dono")
+    monkeypatch.setattr(jobs, "_server_token", (os.getpid(), "a11ce"))
+    store.heartbeat(jobs.server_token())
+    alive = store.create(job, "dono")
+
+    assert store.recover() == 1
+    assert store.read(orphan["id"])["status"] == "failed"
+    assert store.read(alive["id"])["status"] == "queued"
+
+    # Sem batimento recente, os jobs do servidor também são recuperados
+    stale = time.time() - jobs.JOB_SERVER_TIMEOUT - 1
+    os.utime(tmp_path / "servers" / "a11ce", (stale, stale))
+    assert store.recover() == 1
+    assert store.read(alive["id"])["status"] == "failed"
+    assert not (tmp_path / "servers" / "a11ce").exists()
@@ -0,0 +1,52 @@
+"""
+Servidor MCP: chave de API usada nas chamadas das ferramentas.
+"""
+import asyncio
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+from conftest import API_KEY, NATAL_CHART
+
+pytest.importorskip("mcp")
+
+MCP_SERVER_PATH = Path(__file__).resolve().parent.parent / "MCP" / "mcp-astrology-server.py"
+
+@pytest.fixture
+def mcp_server(monkeypatch):
+    monkeypatch.delenv("API_KEY", raising=False)
+    spec = importlib.util.spec_from_file_location("mcp_astrology_server", MCP_SERVER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_http_mode_requires_api_key(mcp_server):
+    assert mcp_server.API_KEY is None
+    with pytest.raises(RuntimeError):
+        mcp_server.resolve_api_key("http")
+    mcp_server.MCP_TRANSPORT = "http"
+    with pytest.raises(SystemExit):
+        asyncio.run(mcp_server.main())
+
+def test_inprocess_mode_falls_back_to_api_key(mcp_server):
+    assert mcp_server.resolve_api_key("inprocess") == API_KEY
+
+    async def call_tool():
+        async with mcp_server.api_client("inprocess"):
+            return await mcp_server.make_api_request("/api/v1/natal_chart", "POST", NATAL_CHART)
+
+    # Um segundo ciclo de vida da API no mesmo processo reaproveita os pools encerrados pelo primeiro
+    for _ in range(2):
+        assert "planets" in asyncio.run(call_tool())
+
+    async def render_pool_call():
+        from app.utils.render_pool import svg_pool
+        return await svg_pool.run(sum, [1, 2])
+
+    assert asyncio.run(render_pool_call()) == 3
+
+def test_http2_only_over_tls(mcp_server):
+    # O httpx só negocia HTTP/2 via ALPN (TLS)
+    assert not mcp_server.use_http2("http://localhost:8000")
+    assert mcp_server.use_http2("https://api.exemplo.com") == mcp_server.HTTP2_AVAILABLE
@@ -0,0 +1,15 @@
+"""
+Mapa natal: sistemas de casas aceitos pela API.
+"""
+import pytest
+
+from conftest import API_KEY, NATAL_CHART
+
+from app.models import HOUSE_SYSTEM_MAP
+
+@pytest.mark.parametrize("house_system", sorted(HOUSE_SYSTEM_MAP))
+def test_every_house_system_is_accepted(client, house_system):
+    response = client.post("/api/v1/natal_chart", json={**NATAL_CHART, "house_system": house_system},
+                           headers={"X-API-KEY": API_KEY})
+    assert response.status_code == 200
+    assert len(response.json()["houses"]) == 12
@@ -0,0 +1,159 @@
+"""
+Pré-cálculo por webhook: custo na cota do parceiro, execução só para parceiros autenticados e adiamento sob carga.
+"""
+import asyncio
+import json
+import uuid
+
+import pytest
+
+from conftest import NATAL_CHART
+from app.precompute import PRECOMPUTE_COST
+from app.utils.webhook_queue import (
+    PARTNER_FIELD, WebhookDeferred, WebhookDispatcher, WebhookSpool, register_handler, webhook_event_costs,
+    webhook_handlers
+)
+
+def _signup(natal: dict) -> bytes:
+    return json.dumps({"event": "user.signup", "id": str(uuid.uuid4()), "data": {"natal_chart": natal}}).encode()
+
+@pytest.fixture
+def spy_handler():
+    calls = []
+    register_handler("test.spy")(lambda data: calls.append(data))
+    yield calls
+    webhook_handlers.pop("test.spy", None)
+    webhook_event_costs.pop("test.spy", None)
+
+def test_precompute_event_charges_partner_cost(client, make_api_key):
+    api_key = make_api_key("parceiro", cost_burst=100)
+    response = client.post("/webhook/", content=_signup(NATAL_CHART), headers={"X-API-KEY": api_key})
+    assert response.status_code == 202
+    assert response.headers["x-cost-remaining"] == str(int(100 - PRECOMPUTE_COST))
+
+def test_precompute_event_rejected_without_budget(client, make_api_key):
+    api_key = make_api_key("parceiro", cost_burst=PRECOMPUTE_COST + 5, cost_per_minute=0.001)
+    assert client.post("/webhook/", content=_signup(NATAL_CHART), headers={"X-API-KEY": api_key}).status_code == 202
+    response = client.post("/webhook/", content=_signup(NATAL_CHART), headers={"X-API-KEY": api_key})
+    assert response.status_code == 429
+
+def test_precompute_event_refunded_when_spool_full(client, make_api_key, monkeypatch):
+    from app.utils import webhook_queue
+
+    api_key = make_api_key("parceiro", cost_burst=PRECOMPUTE_COST + 5, cost_per_minute=0.001)
+    monkeypatch.setattr(webhook_queue, "WEBHOOK_MAX_PENDING", 0)
+    assert client.post("/webhook/", content=_signup(NATAL_CHART), headers={"X-API-KEY": api_key}).status_code == 503
+    # O evento recusado não consumiu o orçamento de custo
+    monkeypatch.setattr(webhook_queue, "WEBHOOK_MAX_PENDING", 10_000)
+    assert client.post("/webhook/", content=_signup(NATAL_CHART), headers={"X-API-KEY": api_key}).status_code == 202
+
+def test_precompute_event_rejects_unknown_theme(client, make_api_key):
+    body = json.dumps({"event": "user.signup", "data": {"natal_chart": NATAL_CHART, "theme": "inexistente"}}).encode()
+    response = client.post("/webhook/", content=body, headers={"X-API-KEY": make_api_key("parceiro")})
+    assert response.status_code == 422
+
+def test_precompute_event_requires_partner(client):
+    response = client.post("/webhook/", content=_signup(NATAL_CHART), headers={"Content-Type": "application/json"})
+    assert response.status_code == 403
+
+def test_dispatcher_skips_events_without_partner(tmp_path, spy_handler):
+    spool = WebhookSpool(str(tmp_path / "spool.sqlite3"))
+    dispatcher = WebhookDispatcher(spool)
+    spool.enqueue("anonimo", "test.spy", {"event": "test.spy", "data": {"a": 1}})
+    spool.enqueue("parceiro", "test.spy", {"event": "test.spy", "data": {"a": 2}, PARTNER_FIELD: "parceiro"})
+
+    asyncio.run(dispatcher.dispatch_batch(spool.claim_batch()))
+    assert spy_handler == [{"a": 2}]
+    assert dispatcher.unauthenticated == 1
+    assert spool.counts()["done"] == 2
+
+def test_deferred_event_returns_to_queue_without_spending_attempt(tmp_path):
+    def busy(data):
+        raise WebhookDeferred(60, "servidor ocupado")
+
+    register_handler("test.busy")(busy)
+    try:
+        spool = WebhookSpool(str(tmp_path / "spool.sqlite3"))
+        dispatcher = WebhookDispatcher(spool)
+        spool.enqueue("evento", "test.busy", {"event": "test.busy", "data": {}, PARTNER_FIELD: "parceiro"})
+
+        asyncio.run(dispatcher.dispatch_batch(spool.claim_batch()))
+        assert dispatcher.deferred == 1
+        status, attempts, next_attempt_at = spool._connection().execute(
+            "SELECT status, attempts, next_attempt_at - received_at FROM webhook_events"
+        ).fetchone()
+        assert (status, attempts) == ("pending", 0)
+        assert next_attempt_at >= 59
+        assert spool.claim_batch() == []
+    finally:
+        webhook_handlers.pop("test.busy", None)
+
+def test_deferral_defers_rest_of_batch_at_once(tmp_path, spy_handler):
+    calls = []
+
+    def busy(data):
+        calls.append(data)
+        raise WebhookDeferred(60, "servidor ocupado")
+
+    register_handler("test.busy")(busy)
+    try:
+        spool = WebhookSpool(str(tmp_path / "spool.sqlite3"))
+        dispatcher = WebhookDispatcher(spool)
+        partner = {PARTNER_FIELD: "parceiro"}
+        spool.enqueue("feito", "test.spy", {"event": "test.spy", "data": {"a": 1}, **partner})
+        for index in range(3):
+            spool.enqueue(f"ocupado-{index}", "test.busy", {"event": "test.busy", "data": {}, **partner})
+        spool.enqueue("depois", "test.spy", {"event": "test.spy", "data": {"a": 2}, **partner})
+
+        asyncio.run(dispatcher.dispatch_batch(spool.claim_batch()))
+        # Apenas o primeiro evento ocupado chega ao handler; ele e os seguintes voltam juntos à fila
+        assert len(calls) == 1
+        assert spy_handler == [{"a": 1}]
+        assert dispatcher.deferred == 4
+        assert spool.counts() == {"pending": 4, "processing": 0, "done": 1, "dead": 0}
+    finally:
+        webhook_handlers.pop("test.busy", None)
+
+def test_long_batch_renews_lease_and_marks_done_per_event(tmp_path, spy_handler, monkeypatch):
+    from app.utils import webhook_queue
+
+    spool = WebhookSpool(str(tmp_path / "spool.sqlite3"))
+    dispatcher = WebhookDispatcher(spool)
+    for index in range(3):
+        spool.enqueue(f"evento-{index}", "test.spy", {"event": "test.spy", "data": {"i": index}, PARTNER_FIELD: "p"})
+    batch = spool.claim_batch()
+
+    statuses = []
+    original_renew = spool.renew
+
+    def renew(event_ids):
+        statuses.append(dict(spool._connection().execute("SELECT id, status FROM webhook_events").fetchall()))
+        original_renew(event_ids)
+
+    monkeypatch.setattr(spool, "renew", renew)
+    # Concessão curta: renovada antes de cada evento
+    monkeypatch.setattr(webhook_queue, "WEBHOOK_LEASE_SECONDS", 0)
+    asyncio.run(dispatcher.dispatch_batch(batch))
+
+    assert len(statuses) == 3
+    # Antes do terceiro evento, os dois primeiros já estão concluídos
+    assert sorted(statuses[2].values()) == ["done", "done", "processing"]
+    assert spool.counts()["done"] == 3
+
+def test_chart_bundle_served_from_chart_caches(client, monkeypatch):
+    from conftest import API_KEY
+    from app.utils import astro_helpers
+
+    headers = {"X-API-KEY": API_KEY}
+    natal = {**NATAL_CHART, "minute": 31}
+    svg = client.post("/api/v1/svg_chart", json={"natal_chart": natal, "chart_type": "natal"}, headers=headers)
+    assert client.post("/api/v1/natal_chart", json=natal, headers=headers).status_code == 200
+
+    # Caches aquecidas (como pelo pré-cálculo): o pacote não recalcula o subject
+    def fail(*args, **kwargs):
+        raise AssertionError("subject recalculado")
+
+    monkeypatch.setattr(astro_helpers, "AstrologicalSubject", fail)
+    response = client.post("/api/v1/chart_bundle", json={"natal_chart": natal, "svg_encoding": "raw"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["svg"] == svg.text
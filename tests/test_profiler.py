@@ -0,0 +1,61 @@
+"""
+Profiler sob demanda: switch e perfis compartilhados entre os workers.
+"""
+from conftest import ADMIN_KEY, API_KEY, NATAL_CHART
+
+from app.utils.profiler import ProfilerSwitch, SharedProfileStore, profiler_switch
+
+def _capture(switch: ProfilerSwitch, path: str) -> str:
+    profile = switch.begin("POST", path)
+    assert profile is not None
+    switch.finish(profile)
+    return profile.id
+
+def test_switch_and_profiles_are_shared_between_workers(tmp_path):
+    path = str(tmp_path / "profiler.sqlite3")
+    # Dois workers: cada um com seu switch, mesmo arquivo
+    first = ProfilerSwitch(SharedProfileStore(path=path), config_ttl=0)
+    second = ProfilerSwitch(SharedProfileStore(path=path), config_ttl=0)
+
+    first.configure(True, "cprofile", 0.0, limit=2)
+    # A configuração de outro worker chega na próxima releitura (run_refresh)
+    second.refresh()
+    assert second.enabled
+    assert second.config()["mode"] == "cprofile"
+
+    profile_id = _capture(second, "/api/v1/natal_chart")
+    assert first.get(profile_id) is not None
+    assert [summary["id"] for summary in first.list()] == [profile_id]
+    assert first.config()["limit"] == 1
+
+    # O limite conta as capturas de todos os workers
+    _capture(first, "/api/v1/svg_chart")
+    second.refresh()
+    assert not first.enabled and not second.enabled
+    assert second.begin("POST", "/api/v1/natal_chart") is None
+    assert len(second.list()) == 2
+
+def test_shared_store_keeps_most_recent(tmp_path):
+    switch = ProfilerSwitch(SharedProfileStore(keep=2, path=str(tmp_path / "profiler.sqlite3")), config_ttl=0)
+    switch.configure(True, "sampling", 0.0)
+    ids = [_capture(switch, f"/api/v1/route{index}") for index in range(3)]
+    assert [summary["id"] for summary in switch.list()] == ids[:0:-1]
+    assert switch.get(ids[0]) is None
+
+def test_admin_profiling_round_trip(client):
+    admin = {"X-ADMIN-KEY": ADMIN_KEY}
+    try:
+        response = client.put("/api/v1/admin/profiling", headers=admin,
+                              json={"enabled": True, "mode": "sampling", "sample_percent": 0, "limit": 1})
+        assert response.status_code == 200
+
+        response = client.post("/api/v1/natal_chart", json=NATAL_CHART, headers={"X-API-KEY": API_KEY, "X-Profile": "1"})
+        assert response.status_code == 200
+        profile_id = response.headers["x-profile-id"]
+
+        profiles = client.get("/api/v1/admin/profiles", headers=admin).json()
+        assert profiles[0]["id"] == profile_id
+        assert profiles[0]["pid"] is not None
+        assert client.get("/api/v1/admin/profiling", headers=admin).json()["enabled"] is False
+    finally:
+        profiler_switch.configure(False, "sampling", 0.0)
@@ -0,0 +1,52 @@
+"""
+Autenticação por chave de API e cotas por chave (requisições e custo).
+"""
+import pytest
+
+from conftest import API_KEY, NATAL_CHART
+
+SVG_REQUEST = {"natal_chart": NATAL_CHART, "chart_type": "natal"}
+
+def test_valid_key_is_accepted(client):
+    response = client.post("/api/v1/natal_chart", json=NATAL_CHART, headers={"X-API-KEY": API_KEY})
+    assert response.status_code == 200
+
+@pytest.mark.parametrize("headers, status_code", [({}, 401), ({"X-API-KEY": "chave-invalida"}, 403)])
+def test_missing_or_invalid_key_is_rejected(client, headers, status_code):
+    response = client.post("/api/v1/natal_chart", json=NATAL_CHART, headers=headers)
+    assert response.status_code == status_code
+    assert "x-ratelimit-remaining" not in response.headers
+
+def test_request_bucket_exhaustion_returns_429(client, make_api_key):
+    api_key = make_api_key("requests-quota", requests_per_second=0.01, burst=2)
+    headers = {"X-API-KEY": api_key}
+
+    statuses = [client.post("/api/v1/natal_chart", json=NATAL_CHART, headers=headers).status_code for _ in range(2)]
+    assert statuses == [200, 200]
+
+    response = client.post("/api/v1/natal_chart", json=NATAL_CHART, headers=headers)
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+    assert response.headers["x-ratelimit-remaining"] == "0"
+
+def test_cost_bucket_exhaustion_returns_429(client, make_api_key):
+    # Um gráfico SVG custa mais que a cota de custo restante após o primeiro
+    api_key = make_api_key("cost-quota", cost_per_minute=0.1, cost_burst=10)
+    headers = {"X-API-KEY": api_key}
+
+    assert client.post("/api/v1/svg_chart", json=SVG_REQUEST, headers=headers).status_code == 200
+    response = client.post("/api/v1/svg_chart", json=SVG_REQUEST, headers=headers)
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+
+@pytest.mark.parametrize("chart_format, media_type", [("svg", "image/svg+xml"), ("png", "image/png")])
+def test_quota_headers_on_raw_chart_responses(client, make_api_key, chart_format, media_type):
+    api_key = make_api_key(f"headers-{chart_format}", burst=5, cost_burst=100)
+    response = client.post("/api/v1/svg_chart", json={**SVG_REQUEST, "format": chart_format},
+                           headers={"X-API-KEY": api_key})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(media_type)
+    assert response.headers["x-ratelimit-limit"] == "5"
+    assert response.headers["x-ratelimit-remaining"] == "4"
+    assert response.headers["x-cost-limit"] == "100"
+    assert int(response.headers["x-cost-remaining"]) < 100
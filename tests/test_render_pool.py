@@ -0,0 +1,65 @@
+"""
+RenderPool.stream: fragmentos entregues à medida que o worker os produz.
+"""
+import asyncio
+import threading
+
+import pytest
+
+from app.exceptions import AstroAPIException
+from app.utils.render_pool import RenderPool
+
+def test_stream_delivers_chunks_before_producer_finishes():
+    pool = RenderPool("teste", 1, max_queue=0)
+    first_sent = threading.Event()
+
+    def produce():
+        yield "<svg>"
+        # Só continua depois que o consumidor recebeu o primeiro fragmento
+        assert first_sent.wait(5)
+        yield "</svg>"
+
+    async def consume():
+        chunks = []
+        async for chunk in await pool.stream(produce):
+            chunks.append(chunk)
+            first_sent.set()
+        return chunks
+
+    try:
+        assert asyncio.run(consume()) == [b"<svg>", b"</svg>"]
+    finally:
+        pool.shutdown()
+
+def test_stream_raises_before_first_chunk():
+    pool = RenderPool("teste", 1, max_queue=0)
+
+    def produce():
+        raise ValueError("dados inválidos")
+        yield ""
+
+    try:
+        with pytest.raises(ValueError):
+            asyncio.run(pool.stream(produce))
+    finally:
+        pool.shutdown()
+
+def test_stream_rejects_with_429_when_full():
+    pool = RenderPool("teste", 1, max_queue=0)
+    release = threading.Event()
+
+    async def scenario():
+        busy = asyncio.ensure_future(pool.run(release.wait, 5))
+        await asyncio.sleep(0.05)
+        try:
+            with pytest.raises(AstroAPIException) as error:
+                await pool.stream(lambda: iter(["<svg/>"]))
+            assert error.value.status_code == 429
+        finally:
+            release.set()
+            await busy
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        pool.shutdown()
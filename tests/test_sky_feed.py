@@ -0,0 +1,72 @@
+"""
+Feed do céu em tempo real: mudanças entre ticks, assinantes lentos e WebSocket.
+"""
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+from conftest import API_KEY
+
+from app.utils.sky_feed import FeedMessage, SkyFeed
+
+MOMENT = datetime(2025, 6, 2, 12, 0, tzinfo=timezone.utc)
+
+def _events(messages):
+    return [message.event for message in messages]
+
+def test_first_tick_of_each_run_has_no_changes():
+    async def scenario():
+        feed = SkyFeed(tick_seconds=3600)
+        subscriber = feed.subscribe()
+        assert _events(feed.tick(MOMENT)) == ["positions"]
+        feed.unsubscribe(subscriber)
+
+        # Nova execução: os aspectos já em orbe não são anunciados como novos
+        subscriber = feed.subscribe()
+        messages = feed.tick(MOMENT + timedelta(minutes=1))
+        feed.unsubscribe(subscriber)
+        return messages
+
+    assert _events(asyncio.run(scenario())) == ["positions"]
+
+def test_aspect_changes_between_ticks():
+    feed = SkyFeed()
+    feed.tick(MOMENT)
+    removed = next(iter(feed._aspects))
+    del feed._aspects[removed]
+    feed._aspects[("Sun", "Pluto", "Quincunx")] = 0.5
+
+    changes = [json.loads(message.text) for message in feed.tick(MOMENT) if message.event == "aspect"]
+    assert {(change["p1"], change["p2"], change["aspect"], change["change"]) for change in changes} == {
+        (*removed, "begin"), ("Sun", "Pluto", "Quincunx", "end"),
+    }
+
+def test_moon_sign_change():
+    feed = SkyFeed()
+    first_sign = json.loads(feed.tick(MOMENT)[0].text)["planets"]["Moon"]["sign"]
+    # A Lua muda de signo a cada ~2,5 dias
+    messages = feed.tick(MOMENT + timedelta(days=3))
+    change = next(json.loads(message.text) for message in messages if message.event == "moon_sign")
+    assert change["from"] == first_sign
+    assert change["to"] != first_sign
+
+def test_slow_subscriber_is_dropped():
+    async def scenario():
+        feed = SkyFeed(tick_seconds=3600, buffer=2)
+        subscriber = feed.subscribe()
+        for index in range(3):
+            feed.publish(FeedMessage("positions", {"index": index}))
+        feed.unsubscribe(subscriber)
+        return feed, subscriber
+
+    feed, subscriber = asyncio.run(scenario())
+    assert subscriber.dropped
+    assert feed.dropped == 1
+    queued = [subscriber.queue.get_nowait() for _ in range(subscriber.queue.qsize())]
+    assert queued[-1] is None
+
+def test_websocket_sends_positions(client):
+    with client.websocket_connect(f"/api/v1/sky/ws?api_key={API_KEY}") as websocket:
+        message = websocket.receive_json()
+    assert message["type"] == "positions"
+    assert "Moon" in message["planets"]
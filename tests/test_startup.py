@@ -0,0 +1,23 @@
+"""
+Aquecimento: prontidão só após um aquecimento bem-sucedido.
+"""
+import asyncio
+
+from app import startup
+from app.startup import StartupState
+
+def test_failed_warmup_leaves_worker_not_ready(client, monkeypatch):
+    state = StartupState()
+    monkeypatch.setattr(startup, "startup_state", state)
+    monkeypatch.setattr("app.routers.status_router.startup_state", state)
+
+    def broken():
+        raise RuntimeError("efemérides ausentes")
+
+    monkeypatch.setattr(startup, "run_warmup", broken)
+    asyncio.run(startup.warm_up())
+    assert state.ready is False
+
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert "efemérides ausentes" in response.json()["warmup_error"]
@@ -0,0 +1,39 @@
+"""
+Captura de tráfego: credenciais nunca são gravadas.
+"""
+import asyncio
+
+from app.utils.traffic_capture import TrafficCaptureMiddleware, redact_query
+
+class _MemoryWriter:
+    def __init__(self) -> None:
+        self.records = []
+
+    def write(self, record) -> None:
+        self.records.append(record)
+
+def test_redact_query_removes_credentials():
+    assert redact_query(b"api_key=segredo&theme=dark") == "theme=dark"
+    assert redact_query(b"token=a&access_token=b&X-Api-Key=c&signature=d&password=e") == ""
+    assert redact_query(b"") == ""
+
+def test_capture_record_has_no_api_key():
+    async def app(scope, receive, send):
+        await receive()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    writer = _MemoryWriter()
+    middleware = TrafficCaptureMiddleware(app, writer=writer, sample=1.0)
+    scope = {"type": "http", "method": "GET", "path": "/api/v1/sky/stream",
+             "query_string": b"api_key=userkey&x=1", "headers": [(b"x-api-key", b"userkey")]}
+    asyncio.run(middleware(scope, receive, send))
+
+    assert writer.records[0]["query"] == "x=1"
+    assert "userkey" not in repr(writer.records)
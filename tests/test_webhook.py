@@ -0,0 +1,87 @@
+"""
+Endpoint /webhook: autenticação do parceiro, limite do corpo e do spool.
+"""
+import json
+import time
+import uuid
+
+import pytest
+
+from app import security
+from app.utils import webhook_queue
+
+def _event(event_type: str = "partner.ping") -> bytes:
+    return json.dumps({"event": event_type, "id": str(uuid.uuid4()), "data": {}}).encode()
+
+def _signed_headers(secret: str, body: bytes, timestamp: int = None) -> dict:
+    timestamp = str(int(time.time()) if timestamp is None else timestamp)
+    return {"X-Webhook-Timestamp": timestamp,
+            "X-Webhook-Signature": security.webhook_signature(secret, timestamp, body),
+            "Content-Type": "application/json"}
+
+@pytest.fixture
+def webhook_secret(monkeypatch):
+    monkeypatch.setattr(security, "WEBHOOK_SECRET", "segredo-do-parceiro")
+    return "segredo-do-parceiro"
+
+def test_webhook_requires_credentials(client):
+    response = client.post("/webhook/", content=_event(), headers={"Content-Type": "application/json"})
+    assert response.status_code == 403
+
+def test_webhook_accepts_registry_api_key(client, make_api_key):
+    response = client.post("/webhook/", content=_event(), headers={"X-API-KEY": make_api_key("parceiro")})
+    assert response.status_code == 202
+    assert response.json()["status"] == "accepted"
+
+def test_webhook_accepts_valid_signature(client, webhook_secret):
+    body = _event()
+    response = client.post("/webhook/", content=body, headers=_signed_headers(webhook_secret, body))
+    assert response.status_code == 202
+
+def test_webhook_rejects_bad_or_expired_signature(client, webhook_secret):
+    body = _event()
+    assert client.post("/webhook/", content=body, headers=_signed_headers("outro-segredo", body)).status_code == 403
+    expired = _signed_headers(webhook_secret, body, timestamp=int(time.time()) - 3600)
+    assert client.post("/webhook/", content=body, headers=expired).status_code == 403
+    # Assinatura de outro corpo
+    assert client.post("/webhook/", content=_event(), headers=_signed_headers(webhook_secret, body)).status_code == 403
+
+def test_webhook_body_size_limit(client, make_api_key, monkeypatch):
+    from app.routers import webhook_router
+
+    monkeypatch.setattr(webhook_router, "WEBHOOK_MAX_BODY_BYTES", 256)
+    body = json.dumps({"event": "partner.ping", "data": {"x": "a" * 1024}}).encode()
+    response = client.post("/webhook/", content=body, headers={"X-API-KEY": make_api_key("parceiro")})
+    assert response.status_code == 413
+
+def test_webhook_spool_full(client, make_api_key, monkeypatch):
+    api_key = make_api_key("parceiro")
+    pending = webhook_queue.webhook_spool.counts()["pending"]
+    monkeypatch.setattr(webhook_queue, "WEBHOOK_MAX_PENDING", pending + 1)
+
+    assert client.post("/webhook/", content=_event(), headers={"X-API-KEY": api_key}).status_code == 202
+    response = client.post("/webhook/", content=_event(), headers={"X-API-KEY": api_key})
+    assert response.status_code == 503
+    assert "retry-after" in response.headers
+
+def test_webhook_charges_partner_quota(client, make_api_key):
+    api_key = make_api_key("parceiro", requests_per_second=0.001, burst=1)
+    assert client.post("/webhook/", content=_event(), headers={"X-API-KEY": api_key}).status_code == 202
+    response = client.post("/webhook/", content=_event(), headers={"X-API-KEY": api_key})
+    assert response.status_code == 429
+    assert "retry-after" in response.headers
+
+def test_idempotency_key_is_scoped_by_partner(client, make_api_key):
+    body = json.dumps({"event": "partner.ping", "id": f"evt-{uuid.uuid4()}", "data": {}}).encode()
+    first = client.post("/webhook/", content=body, headers={"X-API-KEY": make_api_key("parceiro-a")})
+    second = client.post("/webhook/", content=body, headers={"X-API-KEY": make_api_key("parceiro-b")})
+    assert first.json()["status"] == "accepted"
+    assert second.json()["status"] == "accepted"
+
+def test_duplicate_is_not_charged_again(client, make_api_key):
+    api_key = make_api_key("parceiro", requests_per_second=0.001, burst=1)
+    body = _event()
+    assert client.post("/webhook/", content=body, headers={"X-API-KEY": api_key}).json()["status"] == "accepted"
+    response = client.post("/webhook/", content=body, headers={"X-API-KEY": api_key})
+    assert response.status_code == 202
+    assert response.json()["status"] == "duplicate"